@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# Copyright (c) 2016 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from myhdl import Signal
+from myhdl import always
+from myhdl import always_comb
+from myhdl import modbv
+from myhdl import concat
+from myhdl import instances
+from Core.instructions import Opcodes
+
+# Index of the history table: the PC (bimodal), or the PC xor the global history (gshare).
+HISTORY_SCHEMES = ('BIMODAL', 'GSHARE')
+
+# 2-bit saturating counters: predict taken if >= WEAKLY_TAKEN.
+WEAKLY_NOT_TAKEN = 1
+WEAKLY_TAKEN     = 2
+STRONGLY_TAKEN   = 3
+
+
+class BranchPredictorIO:
+    """
+    Defines the IO port of the branch predictor.
+
+    :ivar if_pc:     PC at IF stage (lookup)
+    :ivar if_taken:  Prediction for the instruction at IF: taken
+    :ivar if_target: Prediction for the instruction at IF: target
+    :ivar if_index:  History table index of the lookup (registered with the instruction)
+    :ivar id_update: Update with the instruction at ID
+    :ivar id_pc:     PC of the instruction at ID
+    :ivar id_index:  History table index of the lookup of the instruction at ID
+    :ivar id_branch: The instruction is a conditional branch
+    :ivar id_jump:   The instruction is an unconditional jump (JAL)
+    :ivar id_taken:  The branch/jump is taken
+    :ivar id_target: Target of the branch/jump
+    """
+    def __init__(self, BHT_WIDTH=8):
+        """
+        Initializes the IO ports.
+
+        :param BHT_WIDTH: Address width of the history table
+        """
+        self.if_pc     = Signal(modbv(0)[32:])
+        self.if_taken  = Signal(False)
+        self.if_target = Signal(modbv(0)[32:])
+        self.if_index  = Signal(modbv(0)[BHT_WIDTH:])
+        self.id_update = Signal(False)
+        self.id_pc     = Signal(modbv(0)[32:])
+        self.id_index  = Signal(modbv(0)[BHT_WIDTH:])
+        self.id_branch = Signal(False)
+        self.id_jump   = Signal(False)
+        self.id_taken  = Signal(False)
+        self.id_target = Signal(modbv(0)[32:])
+
+
+def BranchPredictor(clk,
+                    rst,
+                    io,
+                    ENABLE=True,
+                    BTB_WIDTH=6,
+                    HISTORY='BIMODAL',
+                    BHT_WIDTH=8):
+    """
+    Dynamic branch predictor: a direct-mapped branch target buffer (BTB) and a
+    history table (BHT) of 2-bit saturating counters.
+
+    Lookup at IF: the PC hits in the BTB, and the instruction is a jump or its counter
+    predicts taken. Update at ID, with the resolved branch: the counter of conditional
+    branches, and the BTB entry of taken branches and jumps. Entries hit by other
+    instructions (stale code) are invalidated.
+
+    The tables are not reset (like the register file): an entry is valid if its
+    valid bit is set.
+
+    :param clk:       System clock
+    :param rst:       System reset
+    :param io:        IO bundle (BranchPredictorIO)
+    :param ENABLE:    Enable the predictor. Else, always predict not taken
+    :param BTB_WIDTH: Address width of the BTB (2**BTB_WIDTH entries)
+    :param HISTORY:   Index of the BHT: 'BIMODAL' or 'GSHARE'
+    :param BHT_WIDTH: Address width of the BHT (2**BHT_WIDTH counters). Global history length (gshare)
+    """
+    if ENABLE:
+        assert HISTORY in HISTORY_SCHEMES, "Error: Unsupported HISTORY. Supported values: {0}".format(HISTORY_SCHEMES)
+        assert 0 < BTB_WIDTH < 30, "Error: BTB_WIDTH must be a value in [1, 29]"
+        assert 1 < BHT_WIDTH < 30, "Error: BHT_WIDTH must be a value in [2, 29]"
+
+        # --------------------------------------------------------------------------
+        # BTB entry: valid, jump, tag (PC[31:BTB_WIDTH + 2]), target (word address)
+        TARGET_WIDTH = 30
+        TAG_WIDTH    = 30 - BTB_WIDTH
+        ENTRY_WIDTH  = 2 + TAG_WIDTH + TARGET_WIDTH
+        E_VALID      = ENTRY_WIDTH - 1
+        E_JUMP       = ENTRY_WIDTH - 2
+        # --------------------------------------------------------------------------
+        btb        = [Signal(modbv(0)[ENTRY_WIDTH:]) for _ in range(2**BTB_WIDTH)]
+        bht        = [Signal(modbv(WEAKLY_NOT_TAKEN)[2:]) for _ in range(2**BHT_WIDTH)]
+        btb_entry  = Signal(modbv(0)[ENTRY_WIDTH:])
+        if_counter = Signal(modbv(0)[2:])
+        id_counter = Signal(modbv(0)[2:])
+
+        if HISTORY == 'GSHARE':
+            ghr = Signal(modbv(0)[BHT_WIDTH:])
+
+            @always_comb
+            def index():
+                io.if_index.next = io.if_pc[BHT_WIDTH + 2:2] ^ ghr
+
+            @always(clk.posedge)
+            def update_history():
+                """
+                Global history: outcome of the last BHT_WIDTH conditional branches.
+                """
+                if rst:
+                    ghr.next = 0
+                elif io.id_update and io.id_branch:
+                    ghr.next = concat(ghr[BHT_WIDTH - 1:0], io.id_taken)
+        else:
+            @always_comb
+            def index():
+                io.if_index.next = io.if_pc[BHT_WIDTH + 2:2]
+
+        @always_comb
+        def read():
+            """
+            Asynchronous read of the tables.
+            """
+            btb_entry.next  = btb[io.if_pc[BTB_WIDTH + 2:2]]
+            if_counter.next = bht[io.if_index]
+            id_counter.next = bht[io.id_index]
+
+        @always_comb
+        def lookup():
+            hit               = btb_entry[E_VALID] and btb_entry[E_JUMP:TARGET_WIDTH] == io.if_pc[32:BTB_WIDTH + 2]
+            io.if_taken.next  = hit and (btb_entry[E_JUMP] or if_counter >= WEAKLY_TAKEN)
+            io.if_target.next = concat(btb_entry[TARGET_WIDTH:0], False, False)
+
+        @always(clk.posedge)
+        def update():
+            """
+            Synchronous update, with the instruction at ID.
+            """
+            if io.id_update:
+                if io.id_branch:
+                    if io.id_taken and id_counter != STRONGLY_TAKEN:
+                        bht[io.id_index].next = id_counter + 1
+                    elif not io.id_taken and id_counter != 0:
+                        bht[io.id_index].next = id_counter - 1
+                if io.id_taken:
+                    btb[io.id_pc[BTB_WIDTH + 2:2]].next = concat(True, io.id_jump, io.id_pc[32:BTB_WIDTH + 2], io.id_target[32:2])
+                elif not io.id_branch:
+                    btb[io.id_pc[BTB_WIDTH + 2:2]].next = 0
+    else:
+        @always_comb
+        def lookup():
+            io.if_taken.next  = False
+            io.if_target.next = io.if_pc
+            io.if_index.next  = 0
+
+    return instances()
+
+
+class ReturnAddressStackIO:
+    """
+    Defines the IO port of the return-address stack.
+
+    :ivar if_instruction: Instruction at IF stage (predecode)
+    :ivar if_return:      The instruction at IF is a return: predicted taken
+    :ivar if_target:      Predicted return address
+    :ivar id_update:      The instruction at ID leaves the stage
+    :ivar id_instruction: Instruction at ID stage
+    :ivar id_pc:          PC of the instruction at ID
+    """
+    def __init__(self):
+        """
+        Initializes the IO ports.
+        """
+        self.if_instruction = Signal(modbv(0)[32:])
+        self.if_return      = Signal(False)
+        self.if_target      = Signal(modbv(0)[32:])
+        self.id_update      = Signal(False)
+        self.id_instruction = Signal(modbv(0)[32:])
+        self.id_pc          = Signal(modbv(0)[32:])
+
+
+def ReturnAddressStack(clk,
+                       rst,
+                       io,
+                       ENABLE=True,
+                       DEPTH=8):
+    """
+    Return-address stack (RAS): a circular buffer of return addresses. An overflow
+    overwrites the oldest entry.
+
+    The link registers are x1 and x5. Calls (JAL/JALR with a link register as rd) push
+    PC + 4, and returns (JALR with a link register as rs1) pop. A JALR with different
+    link registers as rd and rs1 pops and pushes (coroutines), and with the same link
+    register only pushes.
+
+    The returns are predecoded at IF, and predicted with the top of the stack. The stack
+    is updated at ID, when the instruction leaves the stage: the operation of the
+    instruction at ID is forwarded to the prediction.
+
+    :param clk:    System clock
+    :param rst:    System reset
+    :param io:     IO bundle (ReturnAddressStackIO)
+    :param ENABLE: Enable the stack. Else, the returns are not predicted
+    :param DEPTH:  Number of entries (power of 2)
+    """
+    if ENABLE:
+        assert DEPTH > 1 and not (DEPTH & (DEPTH - 1)), "Error: DEPTH must be a power of 2 (> 1)"
+
+        # --------------------------------------------------------------------------
+        PTR_WIDTH = DEPTH.bit_length() - 1
+        # --------------------------------------------------------------------------
+        stack     = [Signal(modbv(0)[30:]) for _ in range(DEPTH)]
+        tos       = Signal(modbv(0)[PTR_WIDTH:])
+        tos_next  = Signal(modbv(0)[PTR_WIDTH:])
+        tos_prev  = Signal(modbv(0)[PTR_WIDTH:])
+        top       = Signal(modbv(0)[30:])
+        below     = Signal(modbv(0)[30:])
+        push      = Signal(False)
+        pop       = Signal(False)
+        link_addr = Signal(modbv(0)[30:])
+
+        @always_comb
+        def predecode():
+            rd_link  = io.if_instruction[12:7] == 1 or io.if_instruction[12:7] == 5
+            rs1_link = io.if_instruction[20:15] == 1 or io.if_instruction[20:15] == 5
+            jalr     = io.if_instruction[7:0] == Opcodes.RV32_JALR
+            same     = io.if_instruction[12:7] == io.if_instruction[20:15]
+            io.if_return.next = jalr and rs1_link and not (rd_link and same)
+
+        @always_comb
+        def decode():
+            rd_link  = io.id_instruction[12:7] == 1 or io.id_instruction[12:7] == 5
+            rs1_link = io.id_instruction[20:15] == 1 or io.id_instruction[20:15] == 5
+            jal      = io.id_instruction[7:0] == Opcodes.RV32_JAL
+            jalr     = io.id_instruction[7:0] == Opcodes.RV32_JALR
+            same     = io.id_instruction[12:7] == io.id_instruction[20:15]
+            push.next      = io.id_update and (jal or jalr) and rd_link
+            pop.next       = io.id_update and jalr and rs1_link and not (rd_link and same)
+            link_addr.next = io.id_pc[32:2] + 1
+
+        @always_comb
+        def pointers():
+            tos_next.next = tos + 1
+            tos_prev.next = tos - 1
+
+        @always_comb
+        def read():
+            """
+            Asynchronous read of the stack.
+            """
+            top.next   = stack[tos]
+            below.next = stack[tos_prev]
+
+        @always_comb
+        def lookup():
+            if push:
+                io.if_target.next = concat(link_addr, False, False)
+            elif pop:
+                io.if_target.next = concat(below, False, False)
+            else:
+                io.if_target.next = concat(top, False, False)
+
+        @always(clk.posedge)
+        def update():
+            if rst:
+                tos.next = 0
+            elif push and pop:
+                stack[tos].next = link_addr
+            elif push:
+                stack[tos_next].next = link_addr
+                tos.next             = tos_next
+            elif pop:
+                tos.next = tos_prev
+    else:
+        @always_comb
+        def lookup():
+            io.if_return.next = False
+            io.if_target.next = io.id_pc
+
+    return instances()
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -13,6 +13,10 @@
 from myhdl import always_comb
 from myhdl import modbv
 from myhdl import instances
+from Core.conversion import converting
+
+# Max width of the (history, access) index to fill the whole table at elaboration.
+PRECOMPUTE_WIDTH = 12
 
 # ******************************************************************************
 # This module is taken from the mor1kx project (mri1kx_cache_lru.v file)
@@ -97,6 +101,37 @@ def CacheLRU(current,
              lru_pre,
              lru_post,
              NUMWAYS=2):
+    """
+    The LRU module.
+
+    The simulation uses a lookup in the transition table of the LRU (see LRUTable).
+    The matrix is used only for conversion.
+
+    :param current:  The current LRU history
+    :param access:   0 if no access, or one-hot of the way that accesses
+    :param update:   The new LRU history after access
+    :param lru_pre:  LRU before the access (one hot of ways)
+    :param lru_post: LRU after the access (one hot of ways). None: not used
+    :param NUMWAYS:  Number of ways (must be greater than 1)
+    """
+    if not converting():
+        _table = lru_table(NUMWAYS)
+
+        if lru_post is not None:
+            @always_comb
+            def step_1():
+                update_value, pre_value, post_value = _table.lookup(int(current), int(access))
+                update.next   = update_value
+                lru_pre.next  = pre_value
+                lru_post.next = post_value
+        else:
+            @always_comb
+            def step_1():
+                update_value, pre_value, post_value = _table.lookup(int(current), int(access))
+                update.next  = update_value
+                lru_pre.next = pre_value
+
+        return step_1
 
     # **************************************************************************
     # <    0      1      2      3
@@ -329,6 +364,81 @@ def CacheLRU(current,
 
     return instances()
 
+
+def lru_matrix(current, access, NUMWAYS):
+    """
+    The matrix algorithm of CacheLRU, with integers.
+
+    :returns: (update, lru_pre, lru_post)
+    """
+    expand = [[True] * NUMWAYS for i in range(NUMWAYS)]
+    offset = 0
+    for i in range(0, NUMWAYS):
+        for j in range(i + 1, NUMWAYS):
+            expand[i][j] = bool((current >> (offset + j - i - 1)) & 1)
+        for j in range(0, i):
+            expand[i][j] = not expand[j][i]
+        offset = offset + NUMWAYS - i - 1
+
+    lru_pre = sum(1 << i for i in range(NUMWAYS) if all(expand[i]))
+
+    for i in range(0, NUMWAYS):
+        if (access >> i) & 1:
+            for j in range(0, NUMWAYS):
+                if i != j:
+                    expand[i][j] = False
+                    expand[j][i] = True
+
+    offset = 0
+    update = 0
+    for i in range(0, NUMWAYS):
+        for j in range(i + 1, NUMWAYS):
+            update |= expand[i][j] << (offset + j - i - 1)
+        offset = offset + NUMWAYS - i - 1
+
+    lru_post = sum(1 << i for i in range(NUMWAYS) if all(expand[i]))
+    return update, lru_pre, lru_post
+
+
+class LRUTable(object):
+    """
+    Transition table of the LRU: (history, access) -> (update, lru_pre, lru_post).
+
+    The table is filled at elaboration if the index is small (up to 4 ways).
+    Otherwise, the entries are computed on the first use: only the reachable
+    histories (a permutation of the ways) and accesses (0, or one-hot) are stored.
+
+    :ivar table: {(history << NUMWAYS) | access: (update, lru_pre, lru_post)}
+    """
+    def __init__(self, NUMWAYS):
+        self.NUMWAYS = NUMWAYS
+        self.table   = {}
+        width        = (NUMWAYS * (NUMWAYS - 1)) >> 1
+        if width + NUMWAYS <= PRECOMPUTE_WIDTH:
+            for index in range(2**(width + NUMWAYS)):
+                self.table[index] = lru_matrix(index >> NUMWAYS, index & (2**NUMWAYS - 1), NUMWAYS)
+
+    def lookup(self, current, access):
+        index = (current << self.NUMWAYS) | access
+        entry = self.table.get(index)
+        if entry is None:
+            entry = self.table[index] = lru_matrix(current, access, self.NUMWAYS)
+        return entry
+
+
+# The tables, shared by the LRU modules: {NUMWAYS: LRUTable}
+_tables = {}
+
+
+def lru_table(NUMWAYS):
+    """
+    The transition table for a number of ways.
+    """
+    if NUMWAYS not in _tables:
+        _tables[NUMWAYS] = LRUTable(NUMWAYS)
+    return _tables[NUMWAYS]
+
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 120
 # flycheck-flake8rc: ".flake8rc"
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# Copyright (c) 2016 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from myhdl import Signal
+from myhdl import always_comb
+from myhdl import modbv
+from Core.cache_lru import CacheLRU
+
+# Random replacement: Galois LFSR (x^8 + x^6 + x^5 + x^4 + 1), one per set.
+LFSR_WIDTH = 8
+LFSR_TAPS  = 0xB8
+
+
+def _log2(value):
+    return value.bit_length() - 1
+
+
+def CachePLRU(current,
+              access,
+              update,
+              lru_pre,
+              lru_post,
+              NUMWAYS=2):
+    """
+    Tree pseudo-LRU, with the interface of CacheLRU.
+
+    The history is a binary tree of NUMWAYS - 1 bits (node i: children 2i + 1 and
+    2i + 2; the ways are the leaves). Each bit points to the half with the victim:
+    0 the left one, 1 the right one. An access sets the bits in the path from the
+    way to the root, pointing away from it.
+
+    :param current:  The current history (NUMWAYS - 1 bits)
+    :param access:   0 if no access, or one-hot of the way that accesses
+    :param update:   The new history after access
+    :param lru_pre:  Victim before the access (one hot of ways)
+    :param lru_post: Victim after the access (one hot of ways). None: not used
+    :param NUMWAYS:  Number of ways (power of 2, greater than 1)
+    """
+    assert NUMWAYS > 1 and not (NUMWAYS & (NUMWAYS - 1)), "Error: NUMWAYS must be a power of 2 (> 1)"
+    LEVELS = _log2(NUMWAYS)
+    NODES  = NUMWAYS - 1
+    post   = lru_post if lru_post is not None else Signal(modbv(0)[NUMWAYS:])
+
+    @always_comb
+    def step_1():
+        # Victim before the access: follow the tree from the root.
+        node = 0
+        for level in range(LEVELS):
+            if current[node]:
+                node = 2 * node + 2
+            else:
+                node = 2 * node + 1
+        tmp0 = modbv(0)[NUMWAYS:]
+        tmp0[node - NODES] = True
+        lru_pre.next = tmp0
+
+        # Update: point away from the accessed way, from the leaf to the root.
+        tmp1 = modbv(0)[NODES:]
+        tmp1[:] = current
+        for i in range(NUMWAYS):
+            if access[i]:
+                node = i + NODES
+                for level in range(LEVELS):
+                    parent = (node - 1) >> 1
+                    tmp1[parent] = (node & 1) == 1
+                    node = parent
+        update.next = tmp1
+
+        # Victim after the access.
+        node = 0
+        for level in range(LEVELS):
+            if tmp1[node]:
+                node = 2 * node + 2
+            else:
+                node = 2 * node + 1
+        tmp2 = modbv(0)[NUMWAYS:]
+        tmp2[node - NODES] = True
+        post.next = tmp2
+
+    return step_1
+
+
+def CacheRandom(current,
+                access,
+                update,
+                lru_pre,
+                lru_post,
+                NUMWAYS=2):
+    """
+    Pseudo-random replacement, with the interface of CacheLRU.
+
+    The history is the state of a LFSR (LFSR_WIDTH bits): the victim is given by
+    its low bits, and each access advances it. A zero state (after a flush) is
+    replaced by 1.
+
+    :param current:  The current LFSR state
+    :param access:   0 if no access, or one-hot of the way that accesses
+    :param update:   The next LFSR state
+    :param lru_pre:  Victim before the access (one hot of ways)
+    :param lru_post: Victim after the access (one hot of ways). None: not used
+    :param NUMWAYS:  Number of ways (power of 2, greater than 1, up to 2**LFSR_WIDTH)
+    """
+    assert NUMWAYS > 1 and not (NUMWAYS & (NUMWAYS - 1)), "Error: NUMWAYS must be a power of 2 (> 1)"
+    assert NUMWAYS <= 2**LFSR_WIDTH, "Error: NUMWAYS must be <= 2**LFSR_WIDTH"
+    WAY_BITS = _log2(NUMWAYS)
+    post     = lru_post if lru_post is not None else Signal(modbv(0)[NUMWAYS:])
+
+    @always_comb
+    def step_1():
+        state = modbv(0)[LFSR_WIDTH:]
+        state[:] = current
+        if state == 0:
+            state[:] = 1
+        tmp0 = modbv(0)[NUMWAYS:]
+        tmp0[state[WAY_BITS:]] = True
+        lru_pre.next = tmp0
+
+        tmp1 = modbv(0)[LFSR_WIDTH:]
+        tmp1[:] = state
+        if access != 0:
+            tmp1[:] = state >> 1
+            if state[0]:
+                tmp1[:] = tmp1 ^ LFSR_TAPS
+        update.next = tmp1
+
+        tmp2 = modbv(0)[NUMWAYS:]
+        tmp2[tmp1[WAY_BITS:]] = True
+        post.next = tmp2
+
+    return step_1
+
+
+# Replacement policies of the caches: {REPLACEMENT: module}
+REPLACEMENT_POLICIES = {'LRU':    CacheLRU,
+                        'PLRU':   CachePLRU,
+                        'RANDOM': CacheRandom}
+
+
+def history_width(REPLACEMENT, NUMWAYS):
+    """
+    Width of the replacement history of a set.
+
+    :param REPLACEMENT: Replacement policy (see REPLACEMENT_POLICIES)
+    :param NUMWAYS:     Number of ways
+    """
+    assert REPLACEMENT in REPLACEMENT_POLICIES, "Error: Unsupported REPLACEMENT. Supported values: {0}".format(sorted(REPLACEMENT_POLICIES))
+    if REPLACEMENT == 'LRU':
+        return (NUMWAYS * (NUMWAYS - 1)) >> 1  # (N*(N-1))/2
+    if REPLACEMENT == 'PLRU':
+        return NUMWAYS - 1
+    return LFSR_WIDTH
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -28,15 +28,19 @@ class Consts:
     Y          = True
     N          = False
     # PC Select Signal
-    SZ_PC_SEL  = 2
+    SZ_PC_SEL  = 3
     PC_4       = 0
     PC_BRJMP   = 1
     PC_JALR    = 2
     PC_EXC     = 3
+    PC_PRED    = 4
+    PC_ID4     = 5
     _PC_4      = modbv(0)[SZ_PC_SEL:]
     _PC_BRJMP  = modbv(1)[SZ_PC_SEL:]
     _PC_JALR   = modbv(2)[SZ_PC_SEL:]
     _PC_EXC    = modbv(3)[SZ_PC_SEL:]
+    _PC_PRED   = modbv(4)[SZ_PC_SEL:]
+    _PC_ID4    = modbv(5)[SZ_PC_SEL:]
     # Branch type
     SZ_BR      = 4
     BR_X       = 0
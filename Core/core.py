@@ -39,10 +39,19 @@ def Core(clk_i,
          IC_BLOCK_WIDTH=3,
          IC_SET_WIDTH=8,
          IC_NUM_WAYS=2,
+         IC_REPLACEMENT='LRU',
+         IC_PIPELINED=False,
          DC_ENABLE=True,
          DC_BLOCK_WIDTH=3,
          DC_SET_WIDTH=8,
-         DC_NUM_WAYS=2):
+         DC_NUM_WAYS=2,
+         DC_REPLACEMENT='LRU',
+         DC_PIPELINED=False,
+         BP_ENABLE=False,
+         BP_BTB_WIDTH=6,
+         BP_HISTORY='BIMODAL',
+         BP_BHT_WIDTH=8,
+         BP_RAS_DEPTH=8):
     """
     Core top module.
     This module use interfaces, for use in an integrated SoC.
@@ -55,9 +64,18 @@ def Core(clk_i,
     :param IC_BLOCK_WIDTH: Number of bits needed to address the bytes in a line (I$)
     :param IC_SET_WIDTH:   Number of bits needed to address a cache line (I$)
     :param IC_NUM_WAYS:    Cache associativity (I$)
+    :param IC_REPLACEMENT: Replacement policy: 'LRU', 'PLRU' or 'RANDOM' (I$)
+    :param IC_PIPELINED:   Hit in the same cycle of the request (I$). Default: hit in the next cycle
     :param DC_BLOCK_WIDTH: Number of bits needed to address the bytes in a line (D$)
     :param DC_SET_WIDTH:   Number of bits needed to address a cache line (D$)
     :param DC_NUM_WAYS:    Cache associativity (D$)
+    :param DC_REPLACEMENT: Replacement policy: 'LRU', 'PLRU' or 'RANDOM' (D$)
+    :param DC_PIPELINED:   Hit in the same cycle of the request (D$). Default: hit in the next cycle
+    :param BP_ENABLE:      Enable the branch predictor. Default: predict not taken
+    :param BP_BTB_WIDTH:   Address width of the branch target buffer (2**BP_BTB_WIDTH entries)
+    :param BP_HISTORY:     Index of the branch history table: 'BIMODAL' or 'GSHARE'
+    :param BP_BHT_WIDTH:   Address width of the branch history table (2**BP_BHT_WIDTH counters)
+    :param BP_RAS_DEPTH:   Entries of the return-address stack (power of 2. 0: no stack)
     """
     ctrl_dpath   = CtrlIO()
     icache_flush = Signal(False)
@@ -68,14 +86,22 @@ def Core(clk_i,
     dpath = Datapath(clk_i,
                      rst_i,
                      ctrl_dpath,
-                     toHost)
+                     toHost,
+                     BP_ENABLE=BP_ENABLE,
+                     BP_BTB_WIDTH=BP_BTB_WIDTH,
+                     BP_HISTORY=BP_HISTORY,
+                     BP_BHT_WIDTH=BP_BHT_WIDTH,
+                     BP_RAS_DEPTH=BP_RAS_DEPTH)
     cpath = Ctrlpath(clk_i,
                      rst_i,
                      ctrl_dpath,
                      icache_flush,
                      dcache_flush,
                      cpu_intercon,
-                     mem_intercon)
+                     mem_intercon,
+                     IC_PIPELINED=IC_PIPELINED,
+                     DC_PIPELINED=DC_PIPELINED,
+                     BP_ENABLE=BP_ENABLE)
     icache = ICache(clk_i=clk_i,
                     rst_i=rst_i,
                     cpu=cpu_intercon,
@@ -86,7 +112,12 @@ def Core(clk_i,
                     BLOCK_WIDTH=IC_BLOCK_WIDTH,
                     SET_WIDTH=IC_SET_WIDTH,
                     WAYS=IC_NUM_WAYS,
-                    LIMIT_WIDTH=32)
+                    REPLACEMENT=IC_REPLACEMENT,
+                    PIPELINED=IC_PIPELINED,
+                    LIMIT_WIDTH=32,
+                    hit_event=ctrl_dpath.csr_counters.ic_hit,
+                    miss_event=ctrl_dpath.csr_counters.ic_miss,
+                    next_addr=ctrl_dpath.imem_pipeline.next_addr)
     dcache = DCache(clk_i=clk_i,
                     rst_i=rst_i,
                     cpu=mem_intercon,
@@ -97,7 +128,13 @@ def Core(clk_i,
                     BLOCK_WIDTH=DC_BLOCK_WIDTH,
                     SET_WIDTH=DC_SET_WIDTH,
                     WAYS=DC_NUM_WAYS,
-                    LIMIT_WIDTH=32)
+                    REPLACEMENT=DC_REPLACEMENT,
+                    PIPELINED=DC_PIPELINED,
+                    LIMIT_WIDTH=32,
+                    hit_event=ctrl_dpath.csr_counters.dc_hit,
+                    miss_event=ctrl_dpath.csr_counters.dc_miss,
+                    evict_event=ctrl_dpath.csr_counters.dc_evict,
+                    next_addr=ctrl_dpath.dmem_pipeline.next_addr)
 
     return dpath, cpath, icache, dcache
 
@@ -126,9 +163,18 @@ def CoreHDL(clk_i,
             IC_BLOCK_WIDTH=3,
             IC_SET_WIDTH=8,
             IC_NUM_WAYS=2,
+            IC_REPLACEMENT='LRU',
+            IC_PIPELINED=False,
             DC_BLOCK_WIDTH=3,
             DC_SET_WIDTH=8,
-            DC_NUM_WAYS=2):
+            DC_NUM_WAYS=2,
+            DC_REPLACEMENT='LRU',
+            DC_PIPELINED=False,
+            BP_ENABLE=False,
+            BP_BTB_WIDTH=6,
+            BP_HISTORY='BIMODAL',
+            BP_BHT_WIDTH=8,
+            BP_RAS_DEPTH=8):
     """
     Core top Module.
     This module use single ports for verilog translation and to avoid
@@ -145,9 +191,18 @@ def CoreHDL(clk_i,
                 IC_BLOCK_WIDTH=IC_BLOCK_WIDTH,
                 IC_SET_WIDTH=IC_SET_WIDTH,
                 IC_NUM_WAYS=IC_NUM_WAYS,
+                IC_REPLACEMENT=IC_REPLACEMENT,
+                IC_PIPELINED=IC_PIPELINED,
                 DC_BLOCK_WIDTH=DC_BLOCK_WIDTH,
                 DC_SET_WIDTH=DC_SET_WIDTH,
-                DC_NUM_WAYS=DC_NUM_WAYS)
+                DC_NUM_WAYS=DC_NUM_WAYS,
+                DC_REPLACEMENT=DC_REPLACEMENT,
+                DC_PIPELINED=DC_PIPELINED,
+                BP_ENABLE=BP_ENABLE,
+                BP_BTB_WIDTH=BP_BTB_WIDTH,
+                BP_HISTORY=BP_HISTORY,
+                BP_BHT_WIDTH=BP_BHT_WIDTH,
+                BP_RAS_DEPTH=BP_RAS_DEPTH)
 
     @always_comb
     def assign():
@@ -30,6 +30,7 @@ from Core.alu import ALUOp
 from Core.csr import CSRCMD
 from Core.csr import CSRExceptionCode
 from Core.csr import CSRModes
+from Core.csr import CSRCounterIO
 from Core.wishbone import WishboneMaster
 from Core.wishbone import WishboneMasterGenerator
 from Core.instructions import Opcodes
@@ -128,6 +129,128 @@ class CtrlSignals:
     REMU      = concat(N, N, N, N, N, N, Y, Consts._WB_ALU, CSRCMD._CSR_IDLE,  N, Consts.M_X,  Consts._MT_X,  ALUOp._OP_REMU,   Consts._IMM_X,  Consts._OP1_RS1,  Consts._OP2_RS2,  Consts._BR_N).__int__()
 
 
+class DecodeQualifier:
+    """
+    Selects between instructions with the same opcode and funct3 (see decode_key).
+    """
+    Q_NORMAL  = 0  # Bit 30 clear (ADD, SRL, SRLI). ECALL (PRIV)
+    Q_ALT     = 1  # Bit 30 set (SUB, SRA, SRAI). EBREAK (PRIV)
+    Q_MULDIV  = 2  # funct7 == MUL_DIV (OP). ERET (PRIV)
+    Q_INVALID = 3  # Not a 32-bit instruction, or unknown funct12 (PRIV)
+    Q_ECALL   = Q_NORMAL
+    Q_EBREAK  = Q_ALT
+    Q_ERET    = Q_MULDIV
+    SZ_Q      = 2
+
+
+_ANY    = None
+_BASE   = (DecodeQualifier.Q_NORMAL, DecodeQualifier.Q_ALT)
+_VALID  = (DecodeQualifier.Q_NORMAL, DecodeQualifier.Q_ALT, DecodeQualifier.Q_MULDIV)
+
+# Decoder: (control word, opcode, funct3, qualifiers). funct3: None for any value.
+# qualifiers: tuple of DecodeQualifier values. None: any valid qualifier.
+# Opcodes, funct3 and qualifiers not in the table decode to CtrlSignals.INVALID.
+DECODE_TABLE = [
+    (CtrlSignals.LUI,     Opcodes.RV32_LUI,    _ANY,                             _ANY),
+    (CtrlSignals.AUIPC,   Opcodes.RV32_AUIPC,  _ANY,                             _ANY),
+    (CtrlSignals.JAL,     Opcodes.RV32_JAL,    _ANY,                             _ANY),
+    (CtrlSignals.JALR,    Opcodes.RV32_JALR,   _ANY,                             _ANY),
+    (CtrlSignals.BEQ,     Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BEQ,         _ANY),
+    (CtrlSignals.BNE,     Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BNE,         _ANY),
+    (CtrlSignals.BLT,     Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BLT,         _ANY),
+    (CtrlSignals.BGE,     Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BGE,         _ANY),
+    (CtrlSignals.BLTU,    Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BLTU,        _ANY),
+    (CtrlSignals.BGEU,    Opcodes.RV32_BRANCH, BranchFunct3.RV32_F3_BGEU,        _ANY),
+    (CtrlSignals.LB,      Opcodes.RV32_LOAD,   LoadFunct3.RV32_F3_LB,            _ANY),
+    (CtrlSignals.LH,      Opcodes.RV32_LOAD,   LoadFunct3.RV32_F3_LH,            _ANY),
+    (CtrlSignals.LW,      Opcodes.RV32_LOAD,   LoadFunct3.RV32_F3_LW,            _ANY),
+    (CtrlSignals.LBU,     Opcodes.RV32_LOAD,   LoadFunct3.RV32_F3_LBU,           _ANY),
+    (CtrlSignals.LHU,     Opcodes.RV32_LOAD,   LoadFunct3.RV32_F3_LHU,           _ANY),
+    (CtrlSignals.SB,      Opcodes.RV32_STORE,  StoreFunct3.RV32_F3_SB,           _ANY),
+    (CtrlSignals.SH,      Opcodes.RV32_STORE,  StoreFunct3.RV32_F3_SH,           _ANY),
+    (CtrlSignals.SW,      Opcodes.RV32_STORE,  StoreFunct3.RV32_F3_SW,           _ANY),
+    (CtrlSignals.ADDI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_ADD_SUB, _ANY),
+    (CtrlSignals.SLTI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_SLT,     _ANY),
+    (CtrlSignals.SLTIU,   Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_SLTU,    _ANY),
+    (CtrlSignals.XORI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_XOR,     _ANY),
+    (CtrlSignals.ORI,     Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_OR,      _ANY),
+    (CtrlSignals.ANDI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_AND,     _ANY),
+    (CtrlSignals.SLLI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_SLL,     _ANY),
+    (CtrlSignals.SRLI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_SRL_SRA, (DecodeQualifier.Q_NORMAL,)),
+    (CtrlSignals.SRAI,    Opcodes.RV32_IMM,    ArithmeticFunct3.RV32_F3_SRL_SRA, (DecodeQualifier.Q_ALT,)),
+    (CtrlSignals.ADD,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_ADD_SUB, (DecodeQualifier.Q_NORMAL,)),
+    (CtrlSignals.SUB,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_ADD_SUB, (DecodeQualifier.Q_ALT,)),
+    (CtrlSignals.SLT,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_SLT,     _BASE),
+    (CtrlSignals.SLTU,    Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_SLTU,    _BASE),
+    (CtrlSignals.XOR,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_XOR,     _BASE),
+    (CtrlSignals.OR,      Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_OR,      _BASE),
+    (CtrlSignals.AND,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_AND,     _BASE),
+    (CtrlSignals.SLL,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_SLL,     _BASE),
+    (CtrlSignals.SRL,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_SRL_SRA, (DecodeQualifier.Q_NORMAL,)),
+    (CtrlSignals.SRA,     Opcodes.RV32_OP,     ArithmeticFunct3.RV32_F3_SRL_SRA, (DecodeQualifier.Q_ALT,)),
+    (CtrlSignals.MUL,     Opcodes.RV32_OP,     MulDivFunct.RV32_F3_MUL,          (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.MULH,    Opcodes.RV32_OP,     MulDivFunct.RV32_F3_MULH,         (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.MULHSU,  Opcodes.RV32_OP,     MulDivFunct.RV32_F3_MULHSU,       (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.MULHU,   Opcodes.RV32_OP,     MulDivFunct.RV32_F3_MULHU,        (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.DIV,     Opcodes.RV32_OP,     MulDivFunct.RV32_F3_DIV,          (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.DIVU,    Opcodes.RV32_OP,     MulDivFunct.RV32_F3_DIVU,         (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.REM,     Opcodes.RV32_OP,     MulDivFunct.RV32_F3_REM,          (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.REMU,    Opcodes.RV32_OP,     MulDivFunct.RV32_F3_REMU,         (DecodeQualifier.Q_MULDIV,)),
+    (CtrlSignals.FENCE,   Opcodes.RV32_FENCE,  FenceFunct3.RV32_F3_FENCE,        _ANY),
+    (CtrlSignals.FENCE_I, Opcodes.RV32_FENCE,  FenceFunct3.RV32_F3_FENCE_I,      _ANY),
+    (CtrlSignals.ECALL,   Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_PRIV,        (DecodeQualifier.Q_ECALL,)),
+    (CtrlSignals.EBREAK,  Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_PRIV,        (DecodeQualifier.Q_EBREAK,)),
+    (CtrlSignals.ERET,    Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_PRIV,        (DecodeQualifier.Q_ERET,)),
+    (CtrlSignals.CSRRW,   Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRW,       _ANY),
+    (CtrlSignals.CSRRS,   Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRS,       _ANY),
+    (CtrlSignals.CSRRC,   Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRC,       _ANY),
+    (CtrlSignals.CSRRWI,  Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRWI,      _ANY),
+    (CtrlSignals.CSRRSI,  Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRSI,      _ANY),
+    (CtrlSignals.CSRRCI,  Opcodes.RV32_SYSTEM, SystemFunct3.RV32_F3_CSRRCI,      _ANY),
+]
+
+
+def decode_key(instruction):
+    """
+    Index of an instruction in the decoder ROM: opcode[6:2], funct3 and the qualifier.
+    Same rules of Ctrlpath._decode_key.
+    """
+    opcode = instruction & 0x7F
+    funct3 = (instruction >> 12) & 0x07
+    if opcode & 0x03 != 0x03:
+        qualifier = DecodeQualifier.Q_INVALID
+    elif opcode == Opcodes.RV32_OP and (instruction >> 25) == MulDivFunct.RV32_F7_MUL_DIV:
+        qualifier = DecodeQualifier.Q_MULDIV
+    elif (opcode == Opcodes.RV32_OP or opcode == Opcodes.RV32_IMM) and (instruction >> 30) & 0x01:
+        qualifier = DecodeQualifier.Q_ALT
+    elif opcode == Opcodes.RV32_SYSTEM and funct3 == SystemFunct3.RV32_F3_PRIV:
+        qualifier = {PrivFunct12.RV32_F12_ECALL:  DecodeQualifier.Q_ECALL,
+                     PrivFunct12.RV32_F12_EBREAK: DecodeQualifier.Q_EBREAK,
+                     PrivFunct12.RV32_F12_ERET:   DecodeQualifier.Q_ERET}.get(instruction >> 20, DecodeQualifier.Q_INVALID)
+    else:
+        qualifier = DecodeQualifier.Q_NORMAL
+    return ((opcode >> 2) << 5) | (funct3 << 2) | qualifier
+
+
+def decode_rom(table=DECODE_TABLE):
+    """
+    Expand the decoder table: a control word for each index (see decode_key).
+    An index can be defined by a single row.
+    """
+    rom = [None] * 2**(5 + 3 + DecodeQualifier.SZ_Q)
+    for control, opcode, funct3, qualifiers in table:
+        assert opcode & 0x03 == 0x03, "Error: Invalid opcode {0:#09b}".format(opcode)
+        for f3 in (range(8) if funct3 is None else [funct3]):
+            for qualifier in (_VALID if qualifiers is None else qualifiers):
+                index = ((opcode >> 2) << 5) | (f3 << 2) | qualifier
+                assert rom[index] is None, "Error: Overlapping rows in the decoder table (index {0:#x})".format(index)
+                rom[index] = control
+    return tuple(CtrlSignals.INVALID if control is None else control for control in rom)
+
+
+DECODE_ROM = decode_rom()
+
+
 class CtrlIO:
     """
     IO interface between the cpath and the dpath.
@@ -140,6 +263,16 @@ class CtrlIO:
     :ivar pipeline_kill:      Kill the pipeline
     :ivar pc_select:          Select next PC
     :ivar id_next_pc:         The next PC, not registered
+    :ivar if_pred_taken:      Branch predictor: the instruction at IF is predicted taken
+    :ivar id_pred_taken:      The instruction at ID was predicted taken
+    :ivar id_pred_return:     The instruction at ID was predicted as a return (return-address stack)
+    :ivar id_pred_target_ok:  The predicted target is the branch/jump target (instruction at ID)
+    :ivar id_pred_return_ok:  The predicted target is the JALR target (instruction at ID)
+    :ivar id_advance:         The instruction at ID leaves the stage (not stalled nor killed)
+    :ivar id_pred_update:     Update the branch predictor with the instruction at ID
+    :ivar id_branch:          The instruction at ID is a conditional branch
+    :ivar id_jump:            The instruction at ID is a JAL
+    :ivar id_taken:           The branch/jump at ID is taken
     :ivar id_op1_select:      Data select for OP1 at ID stage
     :ivar id_op2_select:      Data select for OP2 at ID stage
     :ivar id_sel_imm:         Select the Immediate
@@ -170,9 +303,11 @@ class CtrlIO:
     :ivar csr_interrupt_code: Interrupt code: CSR at ID
     :ivar csr_exception:      Exception detected: CSR at MEM
     :ivar csr_exception_code: Exception code: CSR at MEM
+    :ivar csr_exception_int:  The exception is an interrupt: CSR at MEM
     :ivar csr_retire:         Increment instruction count: CSR at MEM
     :ivar imem_pipeline:      Instruction memory access request from dpath
     :ivar dmem_pipeline:      Data memory access request from dpath
+    :ivar csr_counters:       Performance counter events: CSR
     """
     def __init__(self):
         self.id_instruction     = Signal(modbv(0)[32:])
@@ -183,6 +318,16 @@ class CtrlIO:
         self.pipeline_kill      = Signal(False)
         self.pc_select          = Signal(modbv(0)[Consts.SZ_PC_SEL:])
         self.id_next_pc         = Signal(modbv(0)[32:])
+        self.if_pred_taken      = Signal(False)
+        self.id_pred_taken      = Signal(False)
+        self.id_pred_return     = Signal(False)
+        self.id_pred_target_ok  = Signal(False)
+        self.id_pred_return_ok  = Signal(False)
+        self.id_advance         = Signal(False)
+        self.id_pred_update     = Signal(False)
+        self.id_branch          = Signal(False)
+        self.id_jump            = Signal(False)
+        self.id_taken           = Signal(False)
         self.id_op1_select      = Signal(modbv(0)[Consts.SZ_OP1:])
         self.id_op2_select      = Signal(modbv(0)[Consts.SZ_OP2:])
         self.id_sel_imm         = Signal(modbv(0)[Consts.SZ_IMM:])
@@ -213,9 +358,11 @@ class CtrlIO:
         self.csr_interrupt_code = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
         self.csr_exception      = Signal(False)
         self.csr_exception_code = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
+        self.csr_exception_int  = Signal(False)
         self.csr_retire         = Signal(False)
         self.imem_pipeline      = MemDpathIO()
         self.dmem_pipeline      = MemDpathIO()
+        self.csr_counters       = CSRCounterIO()
 
 
 class MemDpathIO:
@@ -226,16 +373,18 @@ class MemDpathIO:
     :ivar wdata: Write data
     :ivar typ:   Data ype: byte, half-word, word
     :ivar fcn:   Access type: read or write
-    :ivar valid: The request is valid
-    :ivar rdata: Read data
+    :ivar valid:     The request is valid
+    :ivar rdata:     Read data
+    :ivar next_addr: Memory address in the next cycle (lookahead for the caches)
     """
     def __init__(self):
-        self.addr  = Signal(modbv(0)[32:])
-        self.wdata = Signal(modbv(0)[32:])
-        self.typ   = Signal(modbv(0)[3:])
-        self.fcn   = Signal(False)
-        self.valid = Signal(False)
-        self.rdata = Signal(modbv(0)[32:])
+        self.addr      = Signal(modbv(0)[32:])
+        self.wdata     = Signal(modbv(0)[32:])
+        self.typ       = Signal(modbv(0)[3:])
+        self.fcn       = Signal(False)
+        self.valid     = Signal(False)
+        self.rdata     = Signal(modbv(0)[32:])
+        self.next_addr = Signal(modbv(0)[32:])
 
 
 def Ctrlpath(clk,
@@ -244,7 +393,10 @@ def Ctrlpath(clk,
              icache_flush,
              dcache_flush,
              imem,
-             dmem):
+             dmem,
+             IC_PIPELINED=False,
+             DC_PIPELINED=False,
+             BP_ENABLE=False):
     """
     The decoder, exception, hazard detection, and control unit.
 
@@ -255,6 +407,9 @@ def Ctrlpath(clk,
     :param dcache_flush: Flush the D$
     :param imem:         Wishbone master (instruction port)
     :param dmem:         Wishbone master (data port)
+    :param IC_PIPELINED: The I$ hits in the cycle of the request
+    :param DC_PIPELINED: The D$ hits in the cycle of the request
+    :param BP_ENABLE:    The datapath has a branch predictor: follow and check its predictions
     """
     imem_m = WishboneMaster(imem)
     dmem_m = WishboneMaster(dmem)
@@ -285,6 +440,7 @@ def Ctrlpath(clk,
     ex_ecall              = Signal(False)
     ex_exception          = Signal(False)
     ex_exception_code     = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
+    ex_interrupt          = Signal(False)
     ex_mem_funct          = Signal(modbv(0)[Consts.SZ_M:])
     ex_mem_valid          = Signal(False)
     ex_csr_cmd            = Signal(modbv(0)[CSRCMD.SZ_CMD:])
@@ -297,6 +453,7 @@ def Ctrlpath(clk,
     mem_ecall_m           = Signal(False)
     mem_exception_ex      = Signal(False)
     mem_exception_code_ex = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
+    mem_interrupt_ex      = Signal(False)
     mem_exception         = Signal(False)
     mem_exception_code    = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
     mem_mem_funct         = Signal(modbv(0)[Consts.SZ_M:])
@@ -308,10 +465,14 @@ def Ctrlpath(clk,
 
     instruction_r         = Signal(modbv(0)[32:])
     cyc_ended             = Signal(False)
+    dmem_data             = Signal(modbv(0)[32:])
+    imem_stall            = Signal(False)
+    dmem_stall            = Signal(False)
 
     opcode                = Signal(modbv(0)[7:])
     funct3                = Signal(modbv(0)[3:])
     funct7                = Signal(modbv(0)[7:])
+    decode_index          = Signal(modbv(0)[5 + 3 + DecodeQualifier.SZ_Q:])
 
     @always_comb
     def _ctrl_assignment():
@@ -320,154 +481,36 @@ def Ctrlpath(clk,
         funct7.next = io.id_instruction[32:25]
 
     @always_comb
-    def _ctrl_signal_assignment():
-        if opcode == Opcodes.RV32_LUI:
-            control.next = CtrlSignals.LUI
-        elif opcode == Opcodes.RV32_AUIPC:
-            control.next = CtrlSignals.AUIPC
-        elif opcode == Opcodes.RV32_JAL:
-            control.next = CtrlSignals.JAL
-        elif opcode == Opcodes.RV32_JALR:
-            control.next = CtrlSignals.JALR
-        elif opcode == Opcodes.RV32_BRANCH:
-            if funct3 == BranchFunct3.RV32_F3_BEQ:
-                control.next = CtrlSignals.BEQ
-            elif funct3 == BranchFunct3.RV32_F3_BNE:
-                control.next = CtrlSignals.BNE
-            elif funct3 == BranchFunct3.RV32_F3_BLT:
-                control.next = CtrlSignals.BLT
-            elif funct3 == BranchFunct3.RV32_F3_BGE:
-                control.next = CtrlSignals.BGE
-            elif funct3 == BranchFunct3.RV32_F3_BLTU:
-                control.next = CtrlSignals.BLTU
-            elif funct3 == BranchFunct3.RV32_F3_BGEU:
-                control.next = CtrlSignals.BGEU
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_LOAD:
-            if funct3 == LoadFunct3.RV32_F3_LB:
-                control.next = CtrlSignals.LB
-            elif funct3 == LoadFunct3.RV32_F3_LH:
-                control.next = CtrlSignals.LH
-            elif funct3 == LoadFunct3.RV32_F3_LW:
-                control.next = CtrlSignals.LW
-            elif funct3 == LoadFunct3.RV32_F3_LBU:
-                control.next = CtrlSignals.LBU
-            elif funct3 == LoadFunct3.RV32_F3_LHU:
-                control.next = CtrlSignals.LHU
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_STORE:
-            if funct3 == StoreFunct3.RV32_F3_SB:
-                control.next = CtrlSignals.SB
-            elif funct3 == StoreFunct3.RV32_F3_SH:
-                control.next = CtrlSignals.SH
-            elif funct3 == StoreFunct3.RV32_F3_SW:
-                control.next = CtrlSignals.SW
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_IMM:
-            if funct3 == ArithmeticFunct3.RV32_F3_ADD_SUB:
-                control.next = CtrlSignals.ADDI
-            elif funct3 == ArithmeticFunct3.RV32_F3_SLT:
-                control.next = CtrlSignals.SLTI
-            elif funct3 == ArithmeticFunct3.RV32_F3_SLTU:
-                control.next = CtrlSignals.SLTIU
-            elif funct3 == ArithmeticFunct3.RV32_F3_XOR:
-                control.next = CtrlSignals.XORI
-            elif funct3 == ArithmeticFunct3.RV32_F3_OR:
-                control.next = CtrlSignals.ORI
-            elif funct3 == ArithmeticFunct3.RV32_F3_AND:
-                control.next = CtrlSignals.ANDI
-            elif funct3 == ArithmeticFunct3.RV32_F3_SLL:
-                control.next = CtrlSignals.SLLI
-            elif funct3 == ArithmeticFunct3.RV32_F3_SRL_SRA:
-                if io.id_instruction[30]:
-                    control.next = CtrlSignals.SRAI
-                else:
-                    control.next = CtrlSignals.SRLI
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_OP:
-            if funct7 != MulDivFunct.RV32_F7_MUL_DIV:
-                if funct3 == ArithmeticFunct3.RV32_F3_ADD_SUB:
-                    if io.id_instruction[30]:
-                        control.next = CtrlSignals.SUB
-                    else:
-                        control.next = CtrlSignals.ADD
-                elif funct3 == ArithmeticFunct3.RV32_F3_SLT:
-                    control.next = CtrlSignals.SLT
-                elif funct3 == ArithmeticFunct3.RV32_F3_SLTU:
-                    control.next = CtrlSignals.SLTU
-                elif funct3 == ArithmeticFunct3.RV32_F3_XOR:
-                    control.next = CtrlSignals.XOR
-                elif funct3 == ArithmeticFunct3.RV32_F3_OR:
-                    control.next = CtrlSignals.OR
-                elif funct3 == ArithmeticFunct3.RV32_F3_AND:
-                    control.next = CtrlSignals.AND
-                elif funct3 == ArithmeticFunct3.RV32_F3_SLL:
-                    control.next = CtrlSignals.SLL
-                elif funct3 == ArithmeticFunct3.RV32_F3_SRL_SRA:
-                    if io.id_instruction[30]:
-                        control.next = CtrlSignals.SRA
-                    else:
-                        control.next = CtrlSignals.SRL
-                else:
-                    control.next = CtrlSignals.INVALID
-            elif funct7 == MulDivFunct.RV32_F7_MUL_DIV:
-                if funct3 == MulDivFunct.RV32_F3_MUL:
-                    control.next = CtrlSignals.MUL
-                elif funct3 == MulDivFunct.RV32_F3_MULH:
-                    control.next = CtrlSignals.MULH
-                elif funct3 == MulDivFunct.RV32_F3_MULHSU:
-                    control.next = CtrlSignals.MULHSU
-                elif funct3 == MulDivFunct.RV32_F3_MULHU:
-                    control.next = CtrlSignals.MULHU
-                elif funct3 == MulDivFunct.RV32_F3_DIV:
-                    control.next = CtrlSignals.DIV
-                elif funct3 == MulDivFunct.RV32_F3_DIVU:
-                    control.next = CtrlSignals.DIVU
-                elif funct3 == MulDivFunct.RV32_F3_REM:
-                    control.next = CtrlSignals.REM
-                elif funct3 == MulDivFunct.RV32_F3_REMU:
-                    control.next = CtrlSignals.REMU
-                else:
-                    control.next = CtrlSignals.INVALID
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_FENCE:
-            if funct3 == FenceFunct3.RV32_F3_FENCE:
-                control.next = CtrlSignals.FENCE
-            elif funct3 == FenceFunct3.RV32_F3_FENCE_I:
-                control.next = CtrlSignals.FENCE_I
-            else:
-                control.next = CtrlSignals.INVALID
-        elif opcode == Opcodes.RV32_SYSTEM:
-            if funct3 == SystemFunct3.RV32_F3_PRIV:
-                if io.id_instruction[32:20] == PrivFunct12.RV32_F12_ECALL:
-                    control.next = CtrlSignals.ECALL
-                elif io.id_instruction[32:20] == PrivFunct12.RV32_F12_EBREAK:
-                    control.next = CtrlSignals.EBREAK
-                elif io.id_instruction[32:20] == PrivFunct12.RV32_F12_ERET:
-                    control.next = CtrlSignals.ERET
-                else:
-                    control.next = CtrlSignals.INVALID
-            elif funct3 == SystemFunct3.RV32_F3_CSRRW:
-                control.next = CtrlSignals.CSRRW
-            elif funct3 == SystemFunct3.RV32_F3_CSRRS:
-                control.next = CtrlSignals.CSRRS
-            elif funct3 == SystemFunct3.RV32_F3_CSRRC:
-                control.next = CtrlSignals.CSRRC
-            elif funct3 == SystemFunct3.RV32_F3_CSRRWI:
-                control.next = CtrlSignals.CSRRWI
-            elif funct3 == SystemFunct3.RV32_F3_CSRRSI:
-                control.next = CtrlSignals.CSRRSI
-            elif funct3 == SystemFunct3.RV32_F3_CSRRCI:
-                control.next = CtrlSignals.CSRRCI
+    def _decode_key():
+        """
+        Index of the instruction in the decoder ROM (check decode_key).
+        """
+        qualifier = modbv(0)[DecodeQualifier.SZ_Q:]
+        if io.id_instruction[2:0] != 0b11:
+            qualifier[:] = DecodeQualifier.Q_INVALID
+        elif opcode == Opcodes.RV32_OP and funct7 == MulDivFunct.RV32_F7_MUL_DIV:
+            qualifier[:] = DecodeQualifier.Q_MULDIV
+        elif (opcode == Opcodes.RV32_OP or opcode == Opcodes.RV32_IMM) and io.id_instruction[30]:
+            qualifier[:] = DecodeQualifier.Q_ALT
+        elif opcode == Opcodes.RV32_SYSTEM and funct3 == SystemFunct3.RV32_F3_PRIV:
+            if io.id_instruction[32:20] == PrivFunct12.RV32_F12_ECALL:
+                qualifier[:] = DecodeQualifier.Q_ECALL
+            elif io.id_instruction[32:20] == PrivFunct12.RV32_F12_EBREAK:
+                qualifier[:] = DecodeQualifier.Q_EBREAK
+            elif io.id_instruction[32:20] == PrivFunct12.RV32_F12_ERET:
+                qualifier[:] = DecodeQualifier.Q_ERET
             else:
-                control.next = CtrlSignals.INVALID
+                qualifier[:] = DecodeQualifier.Q_INVALID
         else:
-            control.next = CtrlSignals.INVALID
+            qualifier[:] = DecodeQualifier.Q_NORMAL
+        decode_index.next = concat(io.id_instruction[7:2], funct3, qualifier)
+
+    @always_comb
+    def _ctrl_signal_assignment():
+        """
+        Decoder: ROM generated from DECODE_TABLE.
+        """
+        control.next = DECODE_ROM[int(decode_index)]
 
     @always_comb
     def _assignments():
@@ -572,6 +615,7 @@ def Ctrlpath(clk,
         if rst:
             ex_exception.next      = False
             ex_exception_code.next = CSRExceptionCode.E_ILLEGAL_INST
+            ex_interrupt.next      = False
             ex_mem_funct.next      = Consts.M_X
             ex_mem_valid.next      = False
             ex_breakpoint.next     = False
@@ -582,6 +626,7 @@ def Ctrlpath(clk,
             if (io.pipeline_kill or io.id_kill or io.id_stall) and not io.full_stall:
                 ex_exception.next      = False
                 ex_exception_code.next = modbv(CSRExceptionCode.E_ILLEGAL_INST)[CSRExceptionCode.SZ_ECODE:]
+                ex_interrupt.next      = False
                 ex_mem_funct.next      = Consts.M_X
                 ex_breakpoint.next     = False
                 ex_eret.next           = False
@@ -598,6 +643,7 @@ def Ctrlpath(clk,
                                             (modbv(CSRExceptionCode.E_ILLEGAL_INST)[CSRExceptionCode.SZ_ECODE:] if id_illegal_inst else
                                              (modbv(CSRExceptionCode.E_BREAKPOINT)[CSRExceptionCode.SZ_ECODE:] if id_breakpoint else
                                               (modbv(CSRExceptionCode.E_ILLEGAL_INST)[CSRExceptionCode.SZ_ECODE:]))))))
+                ex_interrupt.next      = io.csr_interrupt
                 ex_mem_funct.next      = io.id_mem_funct
                 ex_mem_valid.next      = io.id_mem_valid
                 ex_breakpoint.next     = id_breakpoint
@@ -614,6 +660,7 @@ def Ctrlpath(clk,
             mem_mem_funct.next         = False
             mem_exception_ex.next      = False
             mem_exception_code_ex.next = modbv(CSRExceptionCode.E_ILLEGAL_INST)[CSRExceptionCode.SZ_ECODE:]
+            mem_interrupt_ex.next      = False
         else:
             mem_breakpoint.next        = (mem_breakpoint if io.full_stall else (N if io.pipeline_kill else ex_breakpoint))
             mem_eret.next              = (mem_eret if io.full_stall else (N if io.pipeline_kill else ex_eret))
@@ -621,6 +668,7 @@ def Ctrlpath(clk,
             mem_mem_funct.next         = (mem_mem_funct if io.full_stall else (Consts.M_RD if io.pipeline_kill else ex_mem_funct))
             mem_exception_ex.next      = (mem_exception_ex if io.full_stall else (N if io.pipeline_kill else ex_exception))
             mem_exception_code_ex.next = (mem_exception_code_ex if io.full_stall else (modbv(CSRExceptionCode.E_ILLEGAL_INST)[CSRExceptionCode.SZ_ECODE:] if io.pipeline_kill else ex_exception_code))
+            mem_interrupt_ex.next      = (mem_interrupt_ex if io.full_stall else (N if io.pipeline_kill else ex_interrupt))
 
     @always(clk.posedge)
     def _memwb_register():
@@ -662,17 +710,42 @@ def Ctrlpath(clk,
         id_ltu.next = io.id_op1 < io.id_op2
 
     @always_comb
-    def _pc_select():
-        io.pc_select.next = (modbv(Consts.PC_EXC)[Consts.SZ_PC_SEL:] if io.csr_exception or io.csr_eret else
-                                  (modbv(Consts.PC_BRJMP)[Consts.SZ_PC_SEL:] if ((id_br_type == Consts.BR_J) or
-                                                                                 (id_br_type == Consts.BR_NE and not id_eq) or
-                                                                                 (id_br_type == Consts.BR_EQ and id_eq) or
-                                                                                 (id_br_type == Consts.BR_LT and id_lt) or
-                                                                                 (id_br_type == Consts.BR_LTU and id_ltu) or
-                                                                                 (id_br_type == Consts.BR_GE and not id_lt) or
-                                                                                 (id_br_type == Consts.BR_GEU and not id_ltu)) else
-                                   (modbv(Consts.PC_JALR)[Consts.SZ_PC_SEL:] if id_br_type == Consts.BR_JR else
-                                    (modbv(Consts.PC_4)[Consts.SZ_PC_SEL:]))))
+    def _branch_resolve():
+        io.id_branch.next = id_br_type != Consts.BR_N and id_br_type != Consts.BR_J and id_br_type != Consts.BR_JR
+        io.id_jump.next   = id_br_type == Consts.BR_J
+        io.id_taken.next  = ((id_br_type == Consts.BR_J) or
+                             (id_br_type == Consts.BR_NE and not id_eq) or
+                             (id_br_type == Consts.BR_EQ and id_eq) or
+                             (id_br_type == Consts.BR_LT and id_lt) or
+                             (id_br_type == Consts.BR_LTU and id_ltu) or
+                             (id_br_type == Consts.BR_GE and not id_lt) or
+                             (id_br_type == Consts.BR_GEU and not id_ltu))
+
+    if BP_ENABLE:
+        @always_comb
+        def _pc_select():
+            """
+            Next PC. The branches and jumps are resolved at ID, and checked against the prediction
+            made at IF: a taken branch (or a return) with the right predicted target continues, and
+            the other mispredictions redirect the fetch (target, or the PC after a branch predicted
+            taken). Else, follow the prediction for the instruction at IF.
+            """
+            io.pc_select.next = (modbv(Consts.PC_EXC)[Consts.SZ_PC_SEL:] if io.csr_exception or io.csr_eret else
+                                 (modbv(Consts.PC_BRJMP)[Consts.SZ_PC_SEL:] if io.id_taken and not (io.id_pred_taken and io.id_pred_target_ok) else
+                                  (modbv(Consts.PC_JALR)[Consts.SZ_PC_SEL:] if id_br_type == Consts.BR_JR and not (io.id_pred_return and io.id_pred_return_ok) else
+                                   (modbv(Consts.PC_ID4)[Consts.SZ_PC_SEL:] if io.id_pred_taken and not io.id_taken and id_br_type != Consts.BR_JR else
+                                    (modbv(Consts.PC_PRED)[Consts.SZ_PC_SEL:] if io.if_pred_taken else
+                                     (modbv(Consts.PC_4)[Consts.SZ_PC_SEL:]))))))
+    else:
+        @always_comb
+        def _pc_select():
+            """
+            Next PC. The branches and jumps are resolved at ID.
+            """
+            io.pc_select.next = (modbv(Consts.PC_EXC)[Consts.SZ_PC_SEL:] if io.csr_exception or io.csr_eret else
+                                 (modbv(Consts.PC_BRJMP)[Consts.SZ_PC_SEL:] if io.id_taken else
+                                  (modbv(Consts.PC_JALR)[Consts.SZ_PC_SEL:] if id_br_type == Consts.BR_JR else
+                                   (modbv(Consts.PC_4)[Consts.SZ_PC_SEL:]))))
 
     @always_comb
     def _fwd_ctrl():
@@ -685,11 +758,13 @@ def Ctrlpath(clk,
                                         (modbv(Consts.FWD_WB)[Consts.SZ_FWD:] if io.id_rs2_addr != 0 and io.id_rs2_addr == io.wb_wb_addr and io.wb_wb_we else
                                          (modbv(Consts.FWD_N)[Consts.SZ_FWD:]))))
 
+    @always_comb
+    def _imem_stall():
+        imem_stall.next = io.imem_pipeline.valid and not cyc_ended and not imem_m.ack_i and not io.csr_exception
+
     @always_comb
     def _ctrl_pipeline():
-        imem_stall            = io.imem_pipeline.valid and not cyc_ended and not imem_m.ack_i and not io.csr_exception
-        dmem_stall            = io.dmem_pipeline.valid and not dmem_m.ack_i and not io.csr_exception
-        io.if_kill.next       = io.pc_select != Consts.PC_4
+        io.if_kill.next       = io.pc_select != Consts.PC_4 and io.pc_select != Consts.PC_PRED
         io.id_stall.next      = (((io.id_fwd1_select == Consts.FWD_EX or io.id_fwd2_select == Consts.FWD_EX) and
                                   ((ex_mem_funct == Consts.M_RD and ex_mem_valid) or ex_csr_cmd != CSRCMD.CSR_IDLE)) or
                                  (id_fence_i and (ex_mem_funct == Consts.M_WR or mem_mem_funct == Consts.M_WR or wb_mem_funct == Consts.M_WR)))
@@ -697,10 +772,36 @@ def Ctrlpath(clk,
         io.full_stall.next    = imem_stall or dmem_stall or io.ex_req_stall
         io.pipeline_kill.next = io.csr_exception or io.csr_eret
 
+    if BP_ENABLE:
+        @always_comb
+        def _predictor_update():
+            """
+            Train the branch predictor when the instruction leaves the ID stage: branches, jumps,
+            and instructions predicted taken by the BTB (stale entries).
+            """
+            id_advance             = not io.id_stall and not io.full_stall and not io.pipeline_kill
+            io.id_advance.next     = id_advance
+            io.id_pred_update.next = id_advance and (io.id_branch or io.id_jump or (io.id_pred_taken and not io.id_pred_return))
+
+    @always_comb
+    def _counter_events():
+        """
+        Events for the performance counters. Branches and jumps are counted when the
+        instruction leaves the ID stage.
+        """
+        id_advance                          = not io.id_stall and not io.full_stall and not io.pipeline_kill
+        io.csr_counters.load_use_stall.next = io.id_stall and not io.full_stall
+        io.csr_counters.imem_stall.next     = imem_stall
+        io.csr_counters.dmem_stall.next     = dmem_stall
+        io.csr_counters.ex_stall.next       = io.ex_req_stall
+        io.csr_counters.branch_taken.next   = id_advance and io.id_branch and io.id_taken
+        io.csr_counters.jump.next           = id_advance and (io.id_jump or id_br_type == Consts.BR_JR)
+
     @always_comb
     def _exc_detect():
         io.csr_exception.next      = mem_exception
         io.csr_exception_code.next = mem_exception_code
+        io.csr_exception_int.next  = mem_exception_ex and mem_interrupt_ex
 
     @always(clk.posedge)
     def reg_instruction():
@@ -710,20 +811,36 @@ def Ctrlpath(clk,
             if imem_m.cyc_o and imem_m.ack_i:
                 instruction_r.next = imem_m.dat_i
 
-    @always(clk.posedge)
-    def cyc_ended_assign():
-        """
-        Lock the instruction fetch until all the memory accesses ends.
-        This will re-align the i-port and the d-port (ACK signals), until the
-        next cache miss.
-        """
-        if rst:
-            cyc_ended.next = False
-        else:
-            if imem_m.cyc_o and imem_m.ack_i:
-                cyc_ended.next = io.full_stall
+    if IC_PIPELINED:
+        @always(clk.posedge)
+        def cyc_ended_assign():
+            """
+            Lock the instruction fetch until all the memory accesses ends.
+            This will re-align the i-port and the d-port (ACK signals): the fetched
+            instruction is kept until the pipeline advances.
+            """
+            if rst:
+                cyc_ended.next = False
             else:
+                if (imem_m.cyc_o and imem_m.ack_i) or cyc_ended:
+                    cyc_ended.next = io.full_stall
+                else:
+                    cyc_ended.next = False
+    else:
+        @always(clk.posedge)
+        def cyc_ended_assign():
+            """
+            Lock the instruction fetch until all the memory accesses ends.
+            This will re-align the i-port and the d-port (ACK signals), until the
+            next cache miss.
+            """
+            if rst:
                 cyc_ended.next = False
+            else:
+                if imem_m.cyc_o and imem_m.ack_i:
+                    cyc_ended.next = io.full_stall
+                else:
+                    cyc_ended.next = False
 
     @always_comb
     def _imem_assignment():
@@ -740,20 +857,20 @@ def Ctrlpath(clk,
     def _dmem_read_data():
         if io.dmem_pipeline.typ[2:0] == Consts.MT_B:
             if io.dmem_pipeline.addr[2:0] == 0:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[8:0].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[8:0]
+                io.dmem_pipeline.rdata.next = dmem_data[8:0].signed() if not io.dmem_pipeline.typ[2] else dmem_data[8:0]
             elif io.dmem_pipeline.addr[2:0] == 1:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[16:8].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[16:8]
+                io.dmem_pipeline.rdata.next = dmem_data[16:8].signed() if not io.dmem_pipeline.typ[2] else dmem_data[16:8]
             elif io.dmem_pipeline.addr[2:0] == 2:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[24:16].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[24:16]
+                io.dmem_pipeline.rdata.next = dmem_data[24:16].signed() if not io.dmem_pipeline.typ[2] else dmem_data[24:16]
             else:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[32:24].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[32:24]
+                io.dmem_pipeline.rdata.next = dmem_data[32:24].signed() if not io.dmem_pipeline.typ[2] else dmem_data[32:24]
         elif io.dmem_pipeline.typ[2:0] == Consts.MT_H:
             if not io.dmem_pipeline.addr[1]:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[16:0].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[16:0]
+                io.dmem_pipeline.rdata.next = dmem_data[16:0].signed() if not io.dmem_pipeline.typ[2] else dmem_data[16:0]
             else:
-                io.dmem_pipeline.rdata.next = dmem_m.dat_i[32:16].signed() if not io.dmem_pipeline.typ[2] else dmem_m.dat_i[32:16]
+                io.dmem_pipeline.rdata.next = dmem_data[32:16].signed() if not io.dmem_pipeline.typ[2] else dmem_data[32:16]
         else:
-            io.dmem_pipeline.rdata.next = dmem_m.dat_i
+            io.dmem_pipeline.rdata.next = dmem_data
 
     @always_comb
     def _dmem_write_data():
@@ -782,10 +899,6 @@ def Ctrlpath(clk,
     im_flagwrite = Signal(False)
     im_flagrmw   = Signal(False)
     imem_wbm     = WishboneMasterGenerator(clk, rst, imem_m, im_flagread, im_flagwrite, im_flagrmw).gen_wbm()  # NOQA for unused variable
-    dm_flagread  = Signal(False)
-    dm_flagwrite = Signal(False)
-    dm_flagrmw   = Signal(False)
-    dmem_wbm     = WishboneMasterGenerator(clk, rst, dmem_m, dm_flagread, dm_flagwrite, dm_flagrmw).gen_wbm()  # NOQA for unused variable
 
     @always_comb
     def iwbm_trigger():
@@ -793,11 +906,69 @@ def Ctrlpath(clk,
         im_flagwrite.next = False
         im_flagrmw.next   = False
 
-    @always_comb
-    def dwbm_trigger():
-        dm_flagread.next  = not io.dmem_pipeline.fcn and io.dmem_pipeline.valid and not io.csr_exception
-        dm_flagwrite.next = io.dmem_pipeline.fcn and io.dmem_pipeline.valid and not dmem_m.ack_i and not io.csr_exception
-        dm_flagrmw.next   = False
+    if DC_PIPELINED:
+        dmem_data_r = Signal(modbv(0)[32:])
+        dcyc_ended  = Signal(False)
+
+        @always(clk.posedge)
+        def reg_dmem_data():
+            if rst:
+                dmem_data_r.next = 0
+            else:
+                if dmem_m.cyc_o and dmem_m.ack_i:
+                    dmem_data_r.next = dmem_m.dat_i
+
+        @always(clk.posedge)
+        def dcyc_ended_assign():
+            """
+            Lock the data access until the pipeline advances: the access is not repeated
+            while the fetch stalls.
+            """
+            if rst:
+                dcyc_ended.next = False
+            else:
+                if (dmem_m.cyc_o and dmem_m.ack_i) or dcyc_ended:
+                    dcyc_ended.next = io.full_stall
+                else:
+                    dcyc_ended.next = False
+
+        @always_comb
+        def _dmem_data():
+            dmem_data.next = dmem_m.dat_i if not dcyc_ended else dmem_data_r
+
+        @always_comb
+        def _dmem_stall():
+            dmem_stall.next = io.dmem_pipeline.valid and not dcyc_ended and not dmem_m.ack_i and not io.csr_exception
+
+        @always_comb
+        def dwbm_request():
+            """
+            Data port: the request is presented in the first cycle of the MEM stage
+            (a hit is acknowledged in the same cycle).
+            """
+            request            = io.dmem_pipeline.valid and not dcyc_ended and not io.csr_exception
+            dmem_m.cyc_o.next  = request
+            dmem_m.stb_o.next  = request
+            dmem_m.we_o.next   = io.dmem_pipeline.fcn == Consts.M_WR
+    else:
+        dm_flagread  = Signal(False)
+        dm_flagwrite = Signal(False)
+        dm_flagrmw   = Signal(False)
+        dmem_wbm     = WishboneMasterGenerator(clk, rst, dmem_m, dm_flagread, dm_flagwrite, dm_flagrmw).gen_wbm()  # NOQA for unused variable
+
+        @always_comb
+        def _dmem_data():
+            dmem_data.next = dmem_m.dat_i
+
+        @always_comb
+        def _dmem_stall():
+            dmem_stall.next = io.dmem_pipeline.valid and not dmem_m.ack_i and not io.csr_exception
+
+        @always_comb
+        def dwbm_trigger():
+            dm_flagread.next  = not io.dmem_pipeline.fcn and io.dmem_pipeline.valid and not io.csr_exception
+            dm_flagwrite.next = io.dmem_pipeline.fcn and io.dmem_pipeline.valid and not dmem_m.ack_i and not io.csr_exception
+            dm_flagrmw.next   = False
 
     return instances()
 
@@ -26,6 +26,7 @@ from myhdl import always
 from myhdl import instances
 from myhdl import concat
 from Core.consts import Consts
+from Core.conversion import converting
 
 
 class CSRAddressMap:
@@ -65,6 +66,10 @@ class CSRAddressMap:
     CSR_ADDR_INSTRETHW = 0x982
     CSR_ADDR_TO_HOST   = 0x780
     CSR_ADDR_FROM_HOST = 0x781
+    CSR_ADDR_MHPMOVF   = 0x7C0
+    # Performance counters: counter N at base + N (N >= 3)
+    CSR_ADDR_HPMCOUNT  = 0xC00
+    CSR_ADDR_MHPMCOUNT = 0xB00
 
 
 class CSRExceptionCode:
@@ -89,6 +94,109 @@ class CSRExceptionCode:
     # Interrupt codes
     I_SOFTWARE             = 0
     I_TIMER                = 1
+    I_COUNTER              = 2
+
+
+class CSRCounterEvent:
+    """
+    Events for the hardware performance-monitoring counters.
+
+    The event N is counted by the hpmcounter(N + 3) register (read-only, user level),
+    or the mhpmcounter(N + 3) register (machine level).
+    """
+    N_EVENTS       = 11
+    FIRST_COUNTER  = 3
+    IC_HIT         = 0   # I$: tag lookup hit
+    IC_MISS        = 1   # I$: tag lookup miss (line refill)
+    DC_HIT         = 2   # D$: tag lookup hit (cached access)
+    DC_MISS        = 3   # D$: tag lookup miss (line refill)
+    DC_EVICT       = 4   # D$: dirty line written back on a miss
+    LOAD_USE_STALL = 5   # Cycles with the ID stage stalled (load-use, CSR-use, FENCE.I)
+    IMEM_STALL     = 6   # Cycles with the pipeline stalled by the instruction memory
+    DMEM_STALL     = 7   # Cycles with the pipeline stalled by the data memory
+    EX_STALL       = 8   # Cycles with the pipeline stalled by the MUL/DIV unit
+    BRANCH_TAKEN   = 9   # Taken branches
+    JUMP           = 10  # Jumps (JAL, JALR)
+
+
+class CSRAccess:
+    """
+    Access rights for the registers in the CSR table.
+
+    - RO: Read-only. Writes are ignored.
+    - RW: Register bank. The write port stores the data (with the write mask), and
+      loads the reset value.
+    - SE: Side effects. The write is handled by the register logic in the CSR module.
+
+    The priviledge level and the read-only region (0xC00-0xFFF) are checked from the
+    address, as defined by the spec.
+    """
+    RO = 0
+    RW = 1
+    SE = 2
+
+
+# Register table: address, register, access rights, reset value and write mask (RW only).
+# Several addresses can map to the same register (aliases). A new CSR is a new row:
+# the register name is the key in the register dictionary of the CSR module.
+CSR_TABLE = [
+    # Address                            Register        Access        Reset         Write mask
+    (CSRAddressMap.CSR_ADDR_CYCLE,       'cycle',        CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_TIME,        'time',         CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_INSTRET,     'instret',      CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_CYCLEH,      'cycleh',       CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_TIMEH,       'timeh',        CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_INSTRETH,    'instreth',     CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MCPUID,      'mcpuid',       CSRAccess.RO, None,         None),
+    (CSRAddressMap.CSR_ADDR_MIMPID,      'mimpid',       CSRAccess.RO, None,         None),
+    (CSRAddressMap.CSR_ADDR_MHARTID,     'mhartid',      CSRAccess.RO, None,         None),
+    (CSRAddressMap.CSR_ADDR_MSTATUS,     'mstatus',      CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MTVEC,       'mtvec',        CSRAccess.RW, Consts.MTVEC, 0xFFFFFFFC),
+    (CSRAddressMap.CSR_ADDR_MTDELEG,     'mtdeleg',      CSRAccess.RO, None,         None),
+    (CSRAddressMap.CSR_ADDR_MIE,         'mie',          CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MTIMECMP,    'mtimecmp',     CSRAccess.RW, 0,            0xFFFFFFFF),  # Also clears mip.MTIP
+    (CSRAddressMap.CSR_ADDR_MTIME,       'mtime',        CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MTIMEH,      'mtimeh',       CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MSCRATCH,    'mscratch',     CSRAccess.RW, 0,            0xFFFFFFFF),
+    (CSRAddressMap.CSR_ADDR_MEPC,        'mepc',         CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MCAUSE,      'mcause',       CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MBADADDR,    'mbadaddr',     CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_MIP,         'mip',          CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_CYCLEW,      'cycle',        CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_TIMEW,       'time',         CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_INSTRETW,    'instret',      CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_CYCLEHW,     'cycleh',       CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_TIMEHW,      'timeh',        CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_INSTRETHW,   'instreth',     CSRAccess.SE, None,         None),
+    (CSRAddressMap.CSR_ADDR_TO_HOST,     'mtohost',      CSRAccess.RW, 0,            0xFFFFFFFF),
+    (CSRAddressMap.CSR_ADDR_FROM_HOST,   'mfromhost',    CSRAccess.RW, 0,            0xFFFFFFFF),
+    (CSRAddressMap.CSR_ADDR_MHPMOVF,     'hpm_overflow', CSRAccess.SE, None,         None),
+]
+# Performance counters: hpmcounterN (user level, read-only) and mhpmcounterN (machine level).
+CSR_TABLE += [(CSRAddressMap.CSR_ADDR_HPMCOUNT + n, 'hpmcounter{0}'.format(n), CSRAccess.RO, None, None)
+              for n in range(CSRCounterEvent.FIRST_COUNTER, CSRCounterEvent.FIRST_COUNTER + CSRCounterEvent.N_EVENTS)]
+CSR_TABLE += [(CSRAddressMap.CSR_ADDR_MHPMCOUNT + n, 'hpmcounter{0}'.format(n), CSRAccess.SE, None, None)
+              for n in range(CSRCounterEvent.FIRST_COUNTER, CSRCounterEvent.FIRST_COUNTER + CSRCounterEvent.N_EVENTS)]
+
+
+def csr_map(table=CSR_TABLE):
+    """
+    Build the address map of the CSR table: address -> row.
+
+    :param table: List of (address, register, access, reset, mask) rows
+    :returns:     Dictionary, indexed by address
+    """
+    rows = {}
+    bank = set()
+    for row in table:
+        address, register, access = row[:3]
+        assert 0 <= address < (1 << CSRAddressMap.SZ_ADDR), "Error: invalid CSR address {0:#x}".format(address)
+        assert address not in rows, "Error: CSR address {0:#x} defined twice".format(address)
+        if access == CSRAccess.RW:
+            assert register not in bank, "Error: RW register '{0}' mapped to several addresses".format(register)
+            bank.add(register)
+        rows[address] = row
+    return rows
 
 
 class CSRCMD:
@@ -144,10 +252,11 @@ class CSRExceptionIO:
     """
     Defines the CSR IO port for exception signals.
 
-    :ivar interrupt:           Interrupt flag
+    :ivar interrupt:           Interrupt request (for the instruction at ID)
     :ivar interrupt_code:      Type of interrupt
     :ivar exception:           Exception flag, from the CU
     :ivar exception_code:      Type of exception, from the CU
+    :ivar exception_interrupt: The exception is an interrupt request, from the CU
     :ivar eret:                Execute an ERET instruction
     :ivar exception_load_addr: Memory address for LD/ST instruction
     :ivar exception_pc:        The PC for the faulty instruction
@@ -162,6 +271,7 @@ class CSRExceptionIO:
         self.interrupt_code      = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])  # O
         self.exception           = Signal(False)                                 # I: from Control Unit.
         self.exception_code      = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])  # I: from Control Unit.
+        self.exception_interrupt = Signal(False)                                 # I: from Control Unit.
         self.eret                = Signal(False)                                 # I: the current instruction (@MEM) is ERET.
         self.exception_load_addr = Signal(modbv(0)[32:])                         # I: Load address caused an exception.
         self.exception_pc        = Signal(modbv(0)[32:])                         # I
@@ -169,6 +279,88 @@ class CSRExceptionIO:
         self.epc                 = Signal(modbv(0)[32:])                         # O: Return address
 
 
+class CSRCounterIO:
+    """
+    Defines the CSR IO port for the performance counter events.
+    Each flag increments the counter of the event by one, in the current cycle.
+
+    :ivar ic_hit:         I$ hit
+    :ivar ic_miss:        I$ miss
+    :ivar dc_hit:         D$ hit
+    :ivar dc_miss:        D$ miss
+    :ivar dc_evict:       D$ eviction (dirty line)
+    :ivar load_use_stall: ID stage stalled
+    :ivar imem_stall:     Pipeline stalled by the instruction memory
+    :ivar dmem_stall:     Pipeline stalled by the data memory
+    :ivar ex_stall:       Pipeline stalled by the MUL/DIV unit
+    :ivar branch_taken:   Taken branch
+    :ivar jump:           Jump
+    """
+    def __init__(self):
+        """
+        Initializes the IO ports.
+        """
+        self.ic_hit         = Signal(False)  # I: from I$
+        self.ic_miss        = Signal(False)  # I: from I$
+        self.dc_hit         = Signal(False)  # I: from D$
+        self.dc_miss        = Signal(False)  # I: from D$
+        self.dc_evict       = Signal(False)  # I: from D$
+        self.load_use_stall = Signal(False)  # I: from Control Unit
+        self.imem_stall     = Signal(False)  # I: from Control Unit
+        self.dmem_stall     = Signal(False)  # I: from Control Unit
+        self.ex_stall       = Signal(False)  # I: from Control Unit
+        self.branch_taken   = Signal(False)  # I: from Control Unit
+        self.jump           = Signal(False)  # I: from Control Unit
+
+
+def CSRRegister(clk,
+                rst,
+                wen,
+                addr,
+                wdata,
+                register,
+                ADDRESS,
+                RESET,
+                MASK):
+    """
+    Write port for a register of the CSR bank (RW access).
+
+    :param clk:      System clock
+    :param rst:      System reset
+    :param wen:      Write enable (any CSR)
+    :param addr:     CSR address
+    :param wdata:    Write data
+    :param register: The register
+    :param ADDRESS:  Register address
+    :param RESET:    Reset value
+    :param MASK:     Write mask (writable bits)
+    """
+    @always(clk.posedge)
+    def _register():
+        if rst:
+            register.next = RESET
+        elif wen and addr == ADDRESS:
+            register.next = wdata & MASK
+
+    return _register
+
+
+def CSRReadPort(source,
+                bank):
+    """
+    Read port of a register, for conversion: connect the register to its entry of the
+    read bank (zero-extended to 32 bits).
+
+    :param source: The register
+    :param bank:   Entry of the read bank
+    """
+    @always_comb
+    def _port():
+        bank.next = source
+
+    return _port
+
+
 def CSR(clk,
         rst,
         rw,
@@ -177,7 +369,8 @@ def CSR(clk,
         prv,
         illegal_access,
         stall,
-        toHost):
+        toHost,
+        counters):
     """
     The Control and Status Registers (CSR)
 
@@ -189,7 +382,22 @@ def CSR(clk,
     :param prv:            Current priviledge mode (valid at MEM stage)
     :param illegal_access: The RW operation is invalid
     :param toHost:         Connected to the CSR's mtohost register. For simulation purposes.
+    :param counters:       IO bundle for the performance counter events
+
+    Performance counters: the event N (check CSRCounterEvent) increments the 32-bit
+    mhpmcounter(N + 3) register. The mhpmoverflow register has one bit per counter, set
+    when the counter wraps around. Any bit set is a pending counter interrupt (mip[11]),
+    enabled by mie[11]. Software clears the bits writing the mhpmoverflow register.
+
+    Register file: the address decode comes from CSR_TABLE. The RW registers are written
+    by a CSRRegister port. In simulation, the read is a lookup by address. For conversion,
+    each CSRReadPort connects a register to the read bank, and a single block compares
+    the address with every row and ORs the matching registers.
     """
+    N_EVENTS        = CSRCounterEvent.N_EVENTS
+    HPM_FIRST       = CSRCounterEvent.FIRST_COUNTER
+    HPM_MACHINE     = CSRAddressMap.CSR_ADDR_MHPMCOUNT >> 5
+
     # registers
     cycle_full      = Signal(modbv(0)[64:])
     cycle           = Signal(modbv(0)[32:])
@@ -222,6 +430,9 @@ def CSR(clk,
     mbadaddr        = Signal(modbv(0)[32:])
     mip             = Signal(modbv(0)[32:])
 
+    hpmcounter      = [Signal(modbv(0)[32:]) for _ in range(N_EVENTS)]
+    hpm_overflow    = Signal(modbv(0)[N_EVENTS:])
+
     # Connect this register to the IO for simulation purposes.
     # TODO: Remove this and use a debug interface.
     mtohost         = Signal(modbv(0)[32:])
@@ -248,6 +459,21 @@ def CSR(clk,
     interrupt_taken = Signal(False)
     interrupt_code  = Signal(modbv(0)[CSRExceptionCode.SZ_ECODE:])
     code_imem       = Signal(False)
+    mcie            = Signal(False)
+    mcip            = Signal(False)
+    events          = Signal(modbv(0)[N_EVENTS:])
+    hpm_index       = Signal(modbv(0)[5:])
+    hpm_valid       = Signal(False)
+    hpm_write       = Signal(False)
+
+    # Register file: name -> register, for the CSR table.
+    regs = dict(cycle=cycle, cycleh=cycleh, time=time, timeh=timeh, instret=instret, instreth=instreth,
+                mcpuid=mcpuid, mimpid=mimpid, mhartid=mhartid, mstatus=mstatus, mtvec=mtvec, mtdeleg=mtdeleg,
+                mie=mie, mtimecmp=mtimecmp, mtime=mtime, mtimeh=mtimeh, mscratch=mscratch, mepc=mepc,
+                mcause=mcause, mbadaddr=mbadaddr, mip=mip, mtohost=mtohost, mfromhost=mfromhost,
+                hpm_overflow=hpm_overflow)
+    regs.update(('hpmcounter{0}'.format(HPM_FIRST + i), hpmcounter[i]) for i in range(N_EVENTS))
+    rows = csr_map(CSR_TABLE)
 
     @always_comb
     def assigments():
@@ -263,22 +489,23 @@ def CSR(clk,
         instreth.next                  = instret_full[64:32]
         mtime.next                     = mtime_full[32:0]
         mtimeh.next                    = mtime_full[64:32]
-        exc_io.interrupt.next          = mint
-        exc_io.interrupt_code.next     = mecode
+        exc_io.interrupt.next          = interrupt_taken
+        exc_io.interrupt_code.next     = interrupt_code
         exc_io.exception_handler.next  = mtvec + (prv << 6)
         illegal_access.next            = illegal_region or (system_en and (not defined))
         exc_io.epc.next                = mepc
         ie.next                        = priv_stack[0]
         wen_internal.next              = system_wen and not stall
         uinterrupt.next                = 0
-        minterrupt.next                = mtie & mtimer_expired
+        minterrupt.next                = (mtie & mtip) | (mcie & mcip)
         mcpuid.next                    = (1 << 20) | (1 << 8)  # RV32I, support for U mode
         mimpid.next                    = 0x8000
         mhartid.next                   = 0
         mstatus.next                   = concat(modbv(0)[26:], priv_stack)
         mtdeleg.next                   = 0
-        mip.next                       = concat(mtip, modbv(0)[3:], msip, modbv(0)[3:])
-        mie.next                       = concat(mtie, modbv(0)[3:], msie, modbv(0)[3:])
+        mip.next                       = concat(mcip, modbv(0)[3:], mtip, modbv(0)[3:], msip, modbv(0)[3:])
+        mie.next                       = concat(mcie, modbv(0)[3:], mtie, modbv(0)[3:], msie, modbv(0)[3:])
+        mcip.next                      = hpm_overflow != 0
         mcause.next                    = concat(mint, modbv(0)[27:], mecode)
         code_imem.next                 = ((exc_io.exception_code == CSRExceptionCode.E_INST_ADDR_MISALIGNED) |
                                           (exc_io.exception_code == CSRExceptionCode.E_INST_ACCESS_FAULT))
@@ -305,6 +532,33 @@ def CSR(clk,
         illegal_region.next = ((system_wen & (rw.addr[12:10] == 0b11)) |  # Read only region
                                (system_en & (rw.addr[10:8] > prv)))  # Check priviledge level
 
+    @always_comb
+    def _hpm_events():
+        events.next = concat(counters.jump,
+                             counters.branch_taken,
+                             counters.ex_stall,
+                             counters.dmem_stall,
+                             counters.imem_stall,
+                             counters.load_use_stall,
+                             counters.dc_evict,
+                             counters.dc_miss,
+                             counters.dc_hit,
+                             counters.ic_miss,
+                             counters.ic_hit)
+
+    @always_comb
+    def _hpm_address():
+        """
+        Decode the address of the performance counters: hpmcounter3... (user level,
+        read-only) and mhpmcounter3... (machine level).
+        """
+        hpm_index.next = rw.addr[5:0] - HPM_FIRST
+        hpm_valid.next = rw.addr[5:0] >= HPM_FIRST and rw.addr[5:0] < HPM_FIRST + N_EVENTS
+
+    @always_comb
+    def _hpm_select():
+        hpm_write.next = hpm_valid and rw.addr[12:5] == HPM_MACHINE and wen_internal
+
     @always_comb
     def _wdata_aux():
         if system_wen and not stall:
@@ -319,13 +573,13 @@ def CSR(clk,
 
     @always_comb
     def _interrupt_code():
-        interrupt_code.next = CSRExceptionCode.I_TIMER
+        interrupt_code.next = CSRExceptionCode.I_TIMER if (mtie & mtip) else CSRExceptionCode.I_COUNTER
         if prv == CSRModes.PRV_U:
             interrupt_taken.next = (ie & uinterrupt) | minterrupt
         elif prv == CSRModes.PRV_M:
             interrupt_taken.next = ie & minterrupt
         else:
-            interrupt_taken.next = 1
+            interrupt_taken.next = minterrupt
 
     @always(clk.posedge)
     def _priv_stack():
@@ -363,15 +617,17 @@ def CSR(clk,
     @always(clk.posedge)
     def _mtie_msie():
         if rst:
+            mcie.next = 0
             mtie.next = 0
             msie.next = 0
         elif wen_internal & (rw.addr == CSRAddressMap.CSR_ADDR_MIE):
+            mcie.next = wdata_aux[11]
             mtie.next = wdata_aux[7]
             msie.next = wdata_aux[3]
 
     @always(clk.posedge)
     def _mepc():
-        if exc_io.exception | interrupt_taken:
+        if exc_io.exception:
             mepc.next = exc_io.exception_pc & ~0x03
         elif wen_internal & (rw.addr == CSRAddressMap.CSR_ADDR_MEPC):
             mepc.next = wdata_aux & ~0x03
@@ -384,12 +640,9 @@ def CSR(clk,
         elif wen_internal & (rw.addr == CSRAddressMap.CSR_ADDR_MCAUSE):
             mecode.next = wdata_aux[4:0]
             mint.next = wdata_aux[31]
-        elif interrupt_taken:
-            mecode.next = interrupt_code
-            mint.next = 1
         elif exc_io.exception:
             mecode.next = exc_io.exception_code
-            mint.next = 0
+            mint.next = exc_io.exception_interrupt
 
     @always(clk.posedge)
     def _mbadaddr():
@@ -398,109 +651,58 @@ def CSR(clk,
         elif wen_internal & (rw.addr == CSRAddressMap.CSR_ADDR_MBADADDR):
             mbadaddr.next = wdata_aux
 
-    @always_comb
-    def _read():
-        if rw.addr == CSRAddressMap.CSR_ADDR_CYCLE:
-            rw.rdata.next = cycle
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_TIME:
-            rw.rdata.next = time
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRET:
-            rw.rdata.next = instret
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEH:
-            rw.rdata.next = cycleh
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEH:
-            rw.rdata.next = timeh
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETH:
-            rw.rdata.next = instreth
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MCPUID:
-            rw.rdata.next = mcpuid
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MIMPID:
-            rw.rdata.next = mimpid
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MHARTID:
-            rw.rdata.next = mhartid
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MSTATUS:
-            rw.rdata.next = mstatus
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MTVEC:
-            rw.rdata.next = mtvec
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MTDELEG:
-            rw.rdata.next = mtdeleg
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MIE:
-            rw.rdata.next = mie
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MTIMECMP:
-            rw.rdata.next = mtimecmp
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MTIME:
-            rw.rdata.next = mtime
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MTIMEH:
-            rw.rdata.next = mtimeh
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MSCRATCH:
-            rw.rdata.next = mscratch
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MEPC:
-            rw.rdata.next = mepc
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MCAUSE:
-            rw.rdata.next = mcause
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MBADADDR:
-            rw.rdata.next = mbadaddr
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_MIP:
-            rw.rdata.next = mip
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEW:
-            rw.rdata.next = cycle
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEW:
-            rw.rdata.next = time
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETW:
-            rw.rdata.next = instret
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEHW:
-            rw.rdata.next = cycleh
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEHW:
-            rw.rdata.next = timeh
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETHW:
-            rw.rdata.next = instreth
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_TO_HOST:
-            rw.rdata.next = mtohost
-            defined.next = 1
-        elif rw.addr == CSRAddressMap.CSR_ADDR_FROM_HOST:
-            rw.rdata.next = mfromhost
-            defined.next = 1
-        else:
-            rw.rdata.next = 0
-            defined.next = 0
+    bank = [CSRRegister(clk, rst, wen_internal, rw.addr, wdata_aux, regs[register], address, reset, mask)  # noqa
+            for address, register, access, reset, mask in CSR_TABLE if access == CSRAccess.RW]
+
+    names = sorted(set(row[1] for row in CSR_TABLE))
+    if not converting():
+        # Address -> index of the register in read_sources. Zero: undefined address.
+        read_sources = [Signal(modbv(0)[32:])] + [regs[register] for register in names]
+        read_index   = [0] * (1 << CSRAddressMap.SZ_ADDR)
+        for address, row in rows.items():
+            read_index[address] = names.index(row[1]) + 1
+        read_index   = tuple(read_index)
+
+        @always_comb
+        def _read():
+            index         = read_index[int(rw.addr)]
+            rw.rdata.next = read_sources[index]
+            defined.next  = index != 0
+    else:
+        # Row -> address, and index of the register in read_bank.
+        read_bank    = [Signal(modbv(0)[32:]) for _ in names]
+        read_address = tuple(row[0] for row in CSR_TABLE)
+        read_index   = tuple(names.index(row[1]) for row in CSR_TABLE)
+        n_rows       = len(CSR_TABLE)
+        read_ports   = [CSRReadPort(regs[register], read_bank[ii]) for ii, register in enumerate(names)]  # noqa
+
+        @always_comb
+        def _read():
+            """
+            Compare the address with every row, and OR the matching registers (one-hot).
+            """
+            data = modbv(0)[32:]
+            hit  = False
+            for ii in range(n_rows):
+                address = read_address[ii]
+                index   = read_index[ii]
+                if rw.addr == address:
+                    data[:] = data | read_bank[index]
+                    hit     = True
+            rw.rdata.next = data
+            defined.next  = hit
 
     @always(clk.posedge)
-    def _write():
+    def _counters():
+        """
+        Counters: cycle, time, instret and mtime. A CSR write updates the low or the
+        high half of the 64-bit counter.
+        """
         if rst:
             cycle_full.next   = 0
             time_full.next    = 0
             instret_full.next = 0
             mtime_full.next   = 0
-            mtvec.next        = Consts.MTVEC
-            mtohost.next      = 0
-            mfromhost.next    = 0
         else:
             cycle_full.next = cycle_full + 1
             time_full.next  = time_full + 1
@@ -508,44 +710,43 @@ def CSR(clk,
             if retire:
                 instret_full.next = instret_full + 1
             if wen_internal:
-                if rw.addr == CSRAddressMap.CSR_ADDR_CYCLE:
+                if rw.addr == CSRAddressMap.CSR_ADDR_CYCLE or rw.addr == CSRAddressMap.CSR_ADDR_CYCLEW:
                     cycle_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_TIME:
-                    time_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRET:
-                    instret_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEH:
+                elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEH or rw.addr == CSRAddressMap.CSR_ADDR_CYCLEHW:
                     cycle_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEH:
+                elif rw.addr == CSRAddressMap.CSR_ADDR_TIME or rw.addr == CSRAddressMap.CSR_ADDR_TIMEW:
+                    time_full[32:0].next = wdata_aux
+                elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEH or rw.addr == CSRAddressMap.CSR_ADDR_TIMEHW:
                     time_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETH:
+                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRET or rw.addr == CSRAddressMap.CSR_ADDR_INSTRETW:
+                    instret_full[32:0].next = wdata_aux
+                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETH or rw.addr == CSRAddressMap.CSR_ADDR_INSTRETHW:
                     instret_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_MTVEC:
-                    mtvec.next = wdata_aux & ~0x03
-                elif rw.addr == CSRAddressMap.CSR_ADDR_MTIMECMP:
-                    mtimecmp.next = wdata_aux
                 elif rw.addr == CSRAddressMap.CSR_ADDR_MTIME:
                     mtime_full[32:0].next = wdata_aux
                 elif rw.addr == CSRAddressMap.CSR_ADDR_MTIMEH:
                     mtime_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_MSCRATCH:
-                    mscratch.next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEW:
-                    cycle_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEW:
-                    time_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETW:
-                    instret_full[32:0].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_CYCLEHW:
-                    cycle_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_TIMEHW:
-                    time_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_INSTRETHW:
-                    instret_full[64:32].next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_TO_HOST:
-                    mtohost.next = wdata_aux
-                elif rw.addr == CSRAddressMap.CSR_ADDR_FROM_HOST:
-                    mfromhost.next = wdata_aux
+
+    @always(clk.posedge)
+    def _hpmcounters():
+        """
+        Performance counters. A write has priority over the event. The overflow flag
+        is set when the counter wraps around.
+        """
+        if rst:
+            for i in range(N_EVENTS):
+                hpmcounter[i].next = 0
+            hpm_overflow.next = 0
+        else:
+            if wen_internal & (rw.addr == CSRAddressMap.CSR_ADDR_MHPMOVF):
+                hpm_overflow.next = wdata_aux[N_EVENTS:]
+            for i in range(N_EVENTS):
+                if hpm_write and hpm_index == i:
+                    hpmcounter[i].next = wdata_aux
+                elif events[i]:
+                    hpmcounter[i].next = hpmcounter[i] + 1
+                    if hpmcounter[i] == modbv(-1)[32:]:
+                        hpm_overflow.next[i] = True
 
     return instances()
 
@@ -28,7 +28,8 @@ from myhdl import concat
 from myhdl import instances
 from Core.ram_dp import RAM_DP
 from Core.ram_dp import RAMIOPort
-from Core.cache_lru import CacheLRU
+from Core.cache_replacement import REPLACEMENT_POLICIES
+from Core.cache_replacement import history_width
 from Core.wishbone import WishboneMaster
 from Core.wishbone import WishboneMasterGenerator
 from Core.wishbone import WishboneSlave
@@ -45,7 +46,13 @@ def DCache(clk_i,
            BLOCK_WIDTH=5,
            SET_WIDTH=9,
            WAYS=2,
-           LIMIT_WIDTH=32):
+           REPLACEMENT='LRU',
+           PIPELINED=False,
+           LIMIT_WIDTH=32,
+           hit_event=None,
+           miss_event=None,
+           evict_event=None,
+           next_addr=None):
     """
     The Instruction Cache module.
 
@@ -58,13 +65,23 @@ def DCache(clk_i,
     :param BLOCK_WIDTH: Address width for byte access inside a block line
     :param SET_WIDTH:   Address width for line access inside a block
     :param WAYS:        Number of ways for associative cache (Minimum: 2)
+    :param REPLACEMENT: Replacement policy: 'LRU', 'PLRU' (tree pseudo-LRU) or 'RANDOM' (LFSR)
+    :param PIPELINED:   Hit in the same cycle of the request: the memories are read one access ahead
     :param LIMIT_WIDTH: Maximum width for address
+    :param hit_event:   Optional output: a tag lookup hit (performance counter event)
+    :param miss_event:  Optional output: a tag lookup miss (performance counter event)
+    :param evict_event: Optional output: a dirty line is written back (performance counter event)
+    :param next_addr:   Pipelined mode: address of the request in the next cycle (a hint for the lookup)
     """
+    hit_event   = hit_event if hit_event is not None else Signal(False)
+    miss_event  = miss_event if miss_event is not None else Signal(False)
+    evict_event = evict_event if evict_event is not None else Signal(False)
     if ENABLE:
         assert D_WIDTH == 32, "Error: Unsupported D_WIDTH. Supported values: {32}"
         assert BLOCK_WIDTH > 0, "Error: BLOCK_WIDTH must be a value > 0"
         assert SET_WIDTH > 0, "Error: SET_WIDTH must be a value > 0"
         assert not (WAYS & (WAYS - 1)), "Error: WAYS must be a power of 2"
+        assert not PIPELINED or next_addr is not None, "Error: the pipelined mode needs next_addr"
 
         # --------------------------------------------------------------------------
         WAY_WIDTH            = BLOCK_WIDTH + SET_WIDTH  # cache mem address width
@@ -72,7 +89,7 @@ def DCache(clk_i,
         TAGMEM_WAY_WIDTH     = TAG_WIDTH + 2         # Add the valid and dirty bit
         TAGMEM_WAY_VALID     = TAGMEM_WAY_WIDTH - 2  # Valid bit index
         TAGMEM_WAY_DIRTY     = TAGMEM_WAY_WIDTH - 1  # Dirty bit index
-        TAG_LRU_WIDTH        = (WAYS * (WAYS - 1)) >> 1  # (N*(N-1))/2
+        TAG_LRU_WIDTH        = history_width(REPLACEMENT, WAYS)  # LRU: (N*(N-1))/2
         # --------------------------------------------------------------------------
         dc_states = enum('IDLE',
                          'SINGLE',
@@ -90,7 +107,8 @@ def DCache(clk_i,
         tag_lru_flush_port = RAMIOPort(A_WIDTH=SET_WIDTH, D_WIDTH=TAG_LRU_WIDTH)
         cache_read_port   = [RAMIOPort(A_WIDTH=WAY_WIDTH - 2, D_WIDTH=D_WIDTH) for _ in range(0, WAYS)]
         cache_update_port = [RAMIOPort(A_WIDTH=WAY_WIDTH - 2, D_WIDTH=D_WIDTH) for _ in range(0, WAYS)]
-        data_cache        = [cache_read_port[i].data_o for i in range(0, WAYS)]
+        data_ram          = [cache_read_port[i].data_o for i in range(0, WAYS)]
+        data_cache        = [Signal(modbv(0)[D_WIDTH:]) for _ in range(0, WAYS)]
         data_cache2       = [cache_update_port[i].data_o for i in range(0, WAYS)]
         tag_entry         = Signal(modbv(0)[TAG_WIDTH:])
 
@@ -130,6 +148,16 @@ def DCache(clk_i,
         evict             = Signal(False)
 
         use_cache         = Signal(False)
+        refilled          = Signal(False)
+
+        ram_addr          = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+        lookup_valid      = Signal(False)
+        read_hold         = Signal(False)
+        rw_we             = Signal(False)
+        wr_addr           = Signal(modbv(0)[SET_WIDTH:])
+        wr_we             = Signal(False)
+        store_we          = Signal(False)
+        store_data        = Signal(modbv(0)[D_WIDTH:])
 
         cpu_wbs   = WishboneSlave(cpu)
         mem_wbm   = WishboneMaster(mem)
@@ -162,25 +190,22 @@ def DCache(clk_i,
             elif state == dc_states.SINGLE:
                 if done:
                     n_state.next = dc_states.IDLE
-            elif state == dc_states.READ:
-                if not miss:
+            elif state == dc_states.READ or state == dc_states.WRITE:
+                if miss:
+                    if valid and dirty:
+                        # Cache miss. Line is valid but dirty: write back
+                        n_state.next = dc_states.EVICTING
+                    else:
+                        n_state.next = dc_states.FETCH
+                elif not read_hold:
                     # cache hit
                     n_state.next = dc_states.IDLE
-                elif valid and dirty:
-                    # cache is valid but dirty
-                    n_state.next = dc_states.EVICTING
-                else:
-                    # cache miss
-                    n_state.next = dc_states.FETCH
-            elif state == dc_states.WRITE:
-                if not miss:
-                    # Hit
-                    n_state.next = dc_states.IDLE
-                elif valid and dirty:
-                    # Cache miss. Line is valid but dirty: write back
-                    n_state.next = dc_states.EVICTING
-                else:
-                    n_state.next = dc_states.FETCH
+                elif invalidate:
+                    # flush request
+                    n_state.next = dc_states.FLUSH1
+                elif cpu_wbs.cyc_i and not use_cache:
+                    # uncached access
+                    n_state.next = dc_states.SINGLE
             elif state == dc_states.EVICTING:
                 if done:
                     n_state.next = dc_states.FETCH
@@ -210,6 +235,22 @@ def DCache(clk_i,
             else:
                 state.next = n_state
 
+        @always(clk_i.posedge)
+        def update_refilled():
+            """
+            After a refill, the access is repeated (and hits): do not count it.
+            """
+            if rst_i:
+                refilled.next = False
+            else:
+                refilled.next = state == dc_states.FETCH or (refilled and not lookup_valid)
+
+        @always_comb
+        def events():
+            hit_event.next   = lookup_valid and not miss and not refilled
+            miss_event.next  = miss
+            evict_event.next = miss and valid and dirty
+
         @always_comb
         def assignments():
             final_access.next = (dc_update_addr[BLOCK_WIDTH - 2:] == modbv(-1)[BLOCK_WIDTH - 2:]) and mem_wbm.ack_i and mem_wbm.cyc_o and mem_wbm.stb_o
@@ -270,7 +311,7 @@ def DCache(clk_i,
             Check for valid wishbone cycle, and full miss.
             """
             valid_access = cpu_wbs.cyc_i and cpu_wbs.stb_i and use_cache
-            miss.next    = miss_w_and and valid_access and not invalidate
+            miss.next    = miss_w_and and valid_access and not invalidate and lookup_valid
 
         @always_comb
         def get_valid_n_dirty():
@@ -283,26 +324,138 @@ def DCache(clk_i,
                     valid.next = tag_out[i][TAGMEM_WAY_VALID]
                     dirty.next = tag_out[i][TAGMEM_WAY_DIRTY]
 
+        @always_comb
+        def store_merge():
+            """
+            Store hit: merge the selected bytes with the cached word.
+            """
+            temp = data_cache[0]
+            for i in range(0, WAYS):
+                if not miss_w[i]:
+                    temp = data_cache[i]
+            store_data.next = concat(cpu_wbs.dat_i[32:24] if cpu_wbs.sel_i[3] else temp[32:24],
+                                     cpu_wbs.dat_i[24:16] if cpu_wbs.sel_i[2] else temp[24:16],
+                                     cpu_wbs.dat_i[16:8] if cpu_wbs.sel_i[1] else temp[16:8],
+                                     cpu_wbs.dat_i[8:0] if cpu_wbs.sel_i[0] else temp[8:0])
+            store_we.next   = lookup_valid and cpu_wbs.we_i and cpu_wbs.ack_o
+
         trwp_clk    = [tag_rw_port[i].clk for i in range(WAYS)]
         trwp_addr   = [tag_rw_port[i].addr for i in range(WAYS)]
         trwp_data_i = [tag_rw_port[i].data_i for i in range(WAYS)]
         trwp_data_o = [tag_rw_port[i].data_o for i in range(WAYS)]
         trwp_we     = [tag_rw_port[i].we for i in range(WAYS)]
 
+        if PIPELINED:
+            lookup_addr = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+            lookup_ok   = Signal(False)
+            match       = Signal(False)
+            fwd_valid   = Signal(False)
+            fwd_set     = Signal(modbv(0)[SET_WIDTH:])
+            fwd_tag     = [Signal(modbv(0)[TAGMEM_WAY_WIDTH:]) for _ in range(0, WAYS)]
+            fwd_lru     = Signal(modbv(0)[TAG_LRU_WIDTH:])
+            fwd_store   = Signal(False)
+            fwd_addr    = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+            fwd_data    = Signal(modbv(0)[D_WIDTH:])
+
+            @always_comb
+            def lookup_match():
+                """
+                The memories hold the lookup of 'lookup_addr' (word address). It is not valid
+                if the memories were written in the same cycle (refill, flush).
+                """
+                match.next = lookup_ok and lookup_addr == cpu_wbs.addr_i[LIMIT_WIDTH:2]
+
+            @always_comb
+            def lookup():
+                """
+                Hit in the cycle of the request: the lookup was done in the previous cycle, using
+                the address of the next request. Else, lookup the current request.
+                Tag and LRU updates use the second port of the memories.
+                """
+                valid_access      = cpu_wbs.cyc_i and cpu_wbs.stb_i and use_cache
+                lookup_valid.next = (state == dc_states.READ or state == dc_states.WRITE) and match and valid_access
+                read_hold.next    = True
+                rw_we.next        = False
+                wr_we.next        = flush_we or tag_we
+                if flush_we:
+                    wr_addr.next = flush_addr
+                else:
+                    wr_addr.next = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
+                if valid_access and not match:
+                    ram_addr.next = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+                else:
+                    ram_addr.next = next_addr[LIMIT_WIDTH:2]
+
+            @always_comb
+            def forward():
+                """
+                The memories return the old value in the cycle of a write: forward the last tag
+                update (dirty bit, LRU) and the last store hit to the lookup.
+                """
+                same_set  = fwd_valid and fwd_set == lookup_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]
+                same_word = fwd_store and fwd_addr == lookup_addr
+                for i in range(0, WAYS):
+                    tag_out[i].next    = fwd_tag[i] if same_set else trwp_data_o[i]
+                    data_cache[i].next = fwd_data if same_word else data_ram[i]
+                lru_out.next = fwd_lru if same_set else tag_lru_rw_port.data_o
+
+            @always(clk_i.posedge)
+            def update_lookup():
+                if rst_i:
+                    lookup_addr.next = 0
+                    lookup_ok.next   = False
+                    fwd_valid.next   = False
+                    fwd_set.next     = 0
+                    fwd_lru.next     = 0
+                    fwd_store.next   = False
+                    fwd_addr.next    = 0
+                    fwd_data.next    = 0
+                else:
+                    lookup_addr.next = ram_addr
+                    lookup_ok.next   = (state == dc_states.IDLE or state == dc_states.READ or state == dc_states.WRITE) and not miss
+                    fwd_valid.next   = tag_we
+                    fwd_set.next     = wr_addr
+                    fwd_lru.next     = lru_in
+                    fwd_store.next   = store_we
+                    fwd_addr.next    = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+                    fwd_data.next    = store_data
+                for i in range(0, WAYS):
+                    fwd_tag[i].next = tag_in[i]
+        else:
+            @always_comb
+            def lookup():
+                """
+                Lookup in the READ/WRITE states: the memories are read in the IDLE state.
+                """
+                ram_addr.next     = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+                lookup_valid.next = state == dc_states.READ or state == dc_states.WRITE
+                read_hold.next    = False
+                rw_we.next        = tag_we
+                wr_we.next        = flush_we
+                wr_addr.next      = flush_addr
+
+            @always_comb
+            def forward():
+                """
+                No forwarding: the memories are not read in the cycle of a write.
+                """
+                for i in range(0, WAYS):
+                    tag_out[i].next    = trwp_data_o[i]
+                    data_cache[i].next = data_ram[i]
+                lru_out.next = tag_lru_rw_port.data_o
+
         @always_comb
         def tag_rport():
             for i in range(WAYS):
                 trwp_clk[i].next    = clk_i
-                trwp_addr[i].next   = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
+                trwp_addr[i].next   = ram_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]
                 trwp_data_i[i].next = tag_in[i]
-                trwp_we[i].next     = tag_we
-                tag_out[i].next     = trwp_data_o[i]
+                trwp_we[i].next     = rw_we
             # LRU memory
             tag_lru_rw_port.clk.next    = clk_i
             tag_lru_rw_port.data_i.next = lru_in
-            lru_out.next                = tag_lru_rw_port.data_o
-            tag_lru_rw_port.addr.next   = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
-            tag_lru_rw_port.we.next     = tag_we
+            tag_lru_rw_port.addr.next   = ram_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]
+            tag_lru_rw_port.we.next     = rw_we
 
         @always_comb
         def tag_write():
@@ -311,7 +464,7 @@ def DCache(clk_i,
             tag_we.next = False
             lru_in.next = lru_out
 
-            if state == dc_states.READ or state == dc_states.WRITE:
+            if lookup_valid:
                 if miss:
                     for i in range(0, WAYS):
                         if lru_select[i]:
@@ -320,7 +473,7 @@ def DCache(clk_i,
                 else:
                     if cpu_wbs.ack_o and cpu_wbs.cyc_i:
                         for i in range(0, WAYS):
-                            if lru_select[i]:
+                            if not miss_w[i]:
                                 tag_in[i].next = tag_out[i] | (cpu_wbs.we_i << TAGMEM_WAY_DIRTY)  # TODO: Optimize
                         lru_in.next = update_lru
                         tag_we.next = True
@@ -330,7 +483,7 @@ def DCache(clk_i,
             n_flush_we.next   = False
             n_flush_addr.next = flush_addr
 
-            if state == dc_states.IDLE:
+            if state == dc_states.IDLE or ((state == dc_states.READ or state == dc_states.WRITE) and read_hold):
                 if invalidate:
                     n_flush_addr.next = modbv(-1)[SET_WIDTH:]
             elif state == dc_states.FLUSH1:
@@ -378,14 +531,14 @@ def DCache(clk_i,
         def tag_flush_port_assign():
             for i in range(WAYS):
                 tfp_clk[i].next    = clk_i
-                tfp_addr[i].next   = flush_addr
-                tfp_data_i[i].next = modbv(0)[TAGMEM_WAY_WIDTH:]
-                tfp_we[i].next     = flush_we
+                tfp_addr[i].next   = wr_addr
+                tfp_data_i[i].next = modbv(0)[TAGMEM_WAY_WIDTH:] if flush_we else tag_in[i]
+                tfp_we[i].next     = wr_we
             # connect to the LRU memory
             tag_lru_flush_port.clk.next    = clk_i
-            tag_lru_flush_port.addr.next   = flush_addr
-            tag_lru_flush_port.data_i.next = modbv(0)[TAG_LRU_WIDTH:]
-            tag_lru_flush_port.we.next     = flush_we
+            tag_lru_flush_port.addr.next   = wr_addr
+            tag_lru_flush_port.data_i.next = modbv(0)[TAG_LRU_WIDTH:] if flush_we else lru_in
+            tag_lru_flush_port.we.next     = wr_we
 
         @always_comb
         def cpu_data_assign():
@@ -415,14 +568,15 @@ def DCache(clk_i,
 
         @always_comb
         def cache_mem_rw():
+            """
+            Lookup port. Store hits are written here, or in the update port (pipelined mode: the
+            lookup port reads the next access).
+            """
             for i in range(0, WAYS):
                 crp_clk[i].next    = clk_i
-                crp_addr[i].next   = cpu_wbs.addr_i[WAY_WIDTH:2]
-                crp_data_i[i].next = concat(cpu_wbs.dat_i[32:24] if cpu_wbs.sel_i[3] else data_cache[i][32:24],
-                                            cpu_wbs.dat_i[24:16] if cpu_wbs.sel_i[2] else data_cache[i][24:16],
-                                            cpu_wbs.dat_i[16:8] if cpu_wbs.sel_i[1] else data_cache[i][16:8],
-                                            cpu_wbs.dat_i[8:0] if cpu_wbs.sel_i[0] else data_cache[i][8:0])
-                crp_we[i].next     = state == dc_states.WRITE and not miss_w[i] and cpu_wbs.ack_o and cpu_wbs.we_i  # TODO: check for not ACK or ACK?
+                crp_addr[i].next   = ram_addr[WAY_WIDTH - 2:]
+                crp_data_i[i].next = store_data
+                crp_we[i].next     = store_we and not miss_w[i] and not read_hold
 
         # To Verilog
         cup_clk    = [cache_update_port[i].clk for i in range(0, WAYS)]
@@ -434,14 +588,19 @@ def DCache(clk_i,
         def cache_mem_update():
             for i in range(0, WAYS):
                 cup_clk[i].next    = clk_i
-                cup_addr[i].next   = dc_update_addr[WAY_WIDTH - 2:]
-                cup_data_i[i].next = mem_wbm.dat_i
-                cup_we[i].next     = lru_select[i] and mem_wbm.ack_i and state == dc_states.FETCH
+                if store_we and read_hold:
+                    cup_addr[i].next   = cpu_wbs.addr_i[WAY_WIDTH:2]
+                    cup_data_i[i].next = store_data
+                    cup_we[i].next     = not miss_w[i]
+                else:
+                    cup_addr[i].next   = dc_update_addr[WAY_WIDTH - 2:]
+                    cup_data_i[i].next = mem_wbm.dat_i
+                    cup_we[i].next     = lru_select[i] and mem_wbm.ack_i and state == dc_states.FETCH
 
         @always_comb
         def wbs_cpu_flags():
             cpu_err.next  = mem_wbm.err_i
-            cpu_wait.next = miss_w_and or not (state == dc_states.READ or state == dc_states.WRITE) if use_cache else not mem_wbm.ack_i
+            cpu_wait.next = miss_w_and or not lookup_valid if use_cache else not mem_wbm.ack_i
             cpu_busy.next = False
 
         @always_comb
@@ -467,7 +626,7 @@ def DCache(clk_i,
         cache_mem = [RAM_DP(cache_read_port[i], cache_update_port[i], A_WIDTH=WAY_WIDTH - 2, D_WIDTH=D_WIDTH) for i in range(0, WAYS)]  # noqa
 
         # LRU unit
-        lru_m = CacheLRU(current_lru, access_lru,  update_lru,  lru_pre, None, NUMWAYS=WAYS)  # noqa
+        lru_m = REPLACEMENT_POLICIES[REPLACEMENT](current_lru, access_lru,  update_lru,  lru_pre, None, NUMWAYS=WAYS)  # noqa
 
         return instances()
     else:
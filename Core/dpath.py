@@ -37,6 +37,11 @@ from Core.csr import CSRCMD
 from Core.csr import CSRExceptionIO
 from Core.csr import CSRAddressMap
 from Core.imm_gen import IMMGen
+from Core.branch_predictor import BranchPredictor
+from Core.branch_predictor import BranchPredictorIO
+from Core.branch_predictor import ReturnAddressStack
+from Core.branch_predictor import ReturnAddressStackIO
+from Core.mux import Mux8
 from Core.mux import Mux4
 from Core.mux import Mux2
 
@@ -44,20 +49,38 @@ from Core.mux import Mux2
 def Datapath(clk,
              rst,
              ctrlIO,
-             toHost):
+             toHost,
+             BP_ENABLE=False,
+             BP_BTB_WIDTH=6,
+             BP_HISTORY='BIMODAL',
+             BP_BHT_WIDTH=8,
+             BP_RAS_DEPTH=8):
     """
     A 5-stage data path with data forwarding.
 
-    :param clk:    System clock
-    :param rst:    System reset
-    :param ctrlIO: IO bundle. Interface with the cpath module
-    :param toHost: Connected to the CSR's mtohost register. For simulation purposes.
+    :param clk:          System clock
+    :param rst:          System reset
+    :param ctrlIO:       IO bundle. Interface with the cpath module
+    :param toHost:       Connected to the CSR's mtohost register. For simulation purposes.
+    :param BP_ENABLE:    Enable the branch predictor
+    :param BP_BTB_WIDTH: Address width of the branch target buffer
+    :param BP_HISTORY:   Index of the branch history table: 'BIMODAL' or 'GSHARE'
+    :param BP_BHT_WIDTH: Address width of the branch history table
+    :param BP_RAS_DEPTH: Entries of the return-address stack (0: no stack)
     """
     a_pc             = Signal(modbv(0)[32:])
     if_pc            = Signal(modbv(0)[32:])
     if_instruction   = Signal(modbv(0)[32:])
     if_pc_next       = Signal(modbv(0)[32:])
+    bpIO             = BranchPredictorIO(BHT_WIDTH=BP_BHT_WIDTH)
+    rasIO            = ReturnAddressStackIO()
+    if_pred_target   = Signal(modbv(0)[32:])
     id_pc            = Signal(modbv(0)[32:])
+    id_pc_4          = Signal(modbv(0)[32:])
+    id_pred_taken    = Signal(False)
+    id_pred_return   = Signal(False)
+    id_pred_target   = Signal(modbv(0)[32:])
+    id_pred_index    = Signal(modbv(0)[BP_BHT_WIDTH:])
     id_instruction   = Signal(modbv(0)[32:])
     id_rf_portA      = RFReadPort()
     id_rf_portB      = RFReadPort()
@@ -117,12 +140,24 @@ def Datapath(clk,
 
     # A stage
     # ----------------------------------------------------------------------
-    pc_mux = Mux4(ctrlIO.pc_select,  # noqa
-                  if_pc_next,
-                  id_pc_brjmp,
-                  id_pc_jalr,
-                  exc_pc,
-                  a_pc)
+    if BP_ENABLE:
+        pc_mux = Mux8(ctrlIO.pc_select,  # noqa
+                      if_pc_next,
+                      id_pc_brjmp,
+                      id_pc_jalr,
+                      exc_pc,
+                      if_pred_target,
+                      id_pc_4,
+                      0x00000BAD,
+                      0x00000BAD,
+                      a_pc)
+    else:
+        pc_mux = Mux4(ctrlIO.pc_select,  # noqa
+                      if_pc_next,
+                      id_pc_brjmp,
+                      id_pc_jalr,
+                      exc_pc,
+                      a_pc)
 
     # IF stage
     # ----------------------------------------------------------------------
@@ -136,13 +171,37 @@ def Datapath(clk,
 
     @always_comb
     def _pc_next():
-        ctrlIO.imem_pipeline.addr.next  = if_pc
-        if_pc_next.next                 = if_pc + 4
-        if_instruction.next             = ctrlIO.imem_pipeline.rdata
-        ctrlIO.imem_pipeline.wdata.next = 0xDEADC0DE
-        ctrlIO.imem_pipeline.typ.next   = Consts.MT_W
-        ctrlIO.imem_pipeline.fcn.next   = Consts.M_RD
-        ctrlIO.imem_pipeline.valid.next = True
+        ctrlIO.imem_pipeline.addr.next      = if_pc
+        ctrlIO.imem_pipeline.next_addr.next = a_pc if (not ctrlIO.id_stall and not ctrlIO.full_stall) or ctrlIO.pipeline_kill else if_pc
+        if_pc_next.next                     = if_pc + 4
+        if_instruction.next                 = ctrlIO.imem_pipeline.rdata
+        ctrlIO.imem_pipeline.wdata.next     = 0xDEADC0DE
+        ctrlIO.imem_pipeline.typ.next       = Consts.MT_W
+        ctrlIO.imem_pipeline.fcn.next       = Consts.M_RD
+        ctrlIO.imem_pipeline.valid.next     = True
+
+    if BP_ENABLE:
+        predictor = BranchPredictor(clk,  # noqa
+                                    rst,
+                                    bpIO,
+                                    BTB_WIDTH=BP_BTB_WIDTH,
+                                    HISTORY=BP_HISTORY,
+                                    BHT_WIDTH=BP_BHT_WIDTH)
+        ras       = ReturnAddressStack(clk,  # noqa
+                                       rst,
+                                       rasIO,
+                                       ENABLE=BP_RAS_DEPTH > 0,
+                                       DEPTH=BP_RAS_DEPTH)
+
+        @always_comb
+        def _if_predictor():
+            """
+            Prediction for the instruction at IF: the return-address stack (returns), or the BTB.
+            """
+            bpIO.if_pc.next           = if_pc
+            rasIO.if_instruction.next = if_instruction
+            ctrlIO.if_pred_taken.next = bpIO.if_taken or rasIO.if_return
+            if_pred_target.next       = rasIO.if_target if rasIO.if_return else bpIO.if_target
 
     # ID stage
     # ----------------------------------------------------------------------
@@ -157,6 +216,27 @@ def Datapath(clk,
                                    (Consts.BUBBLE if ctrlIO.pipeline_kill or ctrlIO.if_kill else
                                     (if_instruction)))
 
+    if BP_ENABLE:
+        @always(clk.posedge)
+        def ifid_pred():
+            """
+            Prediction of the instruction at IF, for the check at ID.
+            """
+            if rst == 1:
+                id_pred_taken.next  = False
+                id_pred_return.next = False
+                id_pred_target.next = 0
+                id_pred_index.next  = 0
+            else:
+                id_pred_taken.next  = (id_pred_taken if ctrlIO.id_stall or ctrlIO.full_stall else
+                                       (False if ctrlIO.pipeline_kill or ctrlIO.if_kill else
+                                        (ctrlIO.if_pred_taken)))
+                id_pred_return.next = (id_pred_return if ctrlIO.id_stall or ctrlIO.full_stall else
+                                       (False if ctrlIO.pipeline_kill or ctrlIO.if_kill else
+                                        (rasIO.if_return)))
+                id_pred_target.next = (id_pred_target if ctrlIO.id_stall or ctrlIO.full_stall else (if_pred_target))
+                id_pred_index.next  = (id_pred_index if ctrlIO.id_stall or ctrlIO.full_stall else (bpIO.if_index))
+
     reg_file = RegisterFile(clk,  # noqa
                             id_rf_portA,
                             id_rf_portB,
@@ -217,6 +297,28 @@ def Datapath(clk,
         ctrlIO.id_op1.next             = id_op1
         ctrlIO.id_op2.next             = id_op2
 
+    if BP_ENABLE:
+        @always_comb
+        def _id_predictor():
+            """
+            Check the prediction of the instruction at ID, and train the predictor.
+            """
+            id_pc_4.next                  = id_pc + 4
+            ctrlIO.id_pred_taken.next     = id_pred_taken
+            ctrlIO.id_pred_return.next    = id_pred_return
+            ctrlIO.id_pred_target_ok.next = id_pred_target == id_pc_brjmp
+            ctrlIO.id_pred_return_ok.next = id_pred_target == id_pc_jalr
+            bpIO.id_update.next           = ctrlIO.id_pred_update
+            bpIO.id_pc.next               = id_pc
+            bpIO.id_index.next            = id_pred_index
+            bpIO.id_branch.next           = ctrlIO.id_branch
+            bpIO.id_jump.next             = ctrlIO.id_jump
+            bpIO.id_taken.next            = ctrlIO.id_taken
+            bpIO.id_target.next           = id_pc_brjmp
+            rasIO.id_update.next          = ctrlIO.id_advance
+            rasIO.id_instruction.next     = id_instruction
+            rasIO.id_pc.next              = id_pc
+
     # EX stage
     # ----------------------------------------------------------------------
     @always(clk.posedge)
@@ -313,7 +415,8 @@ def Datapath(clk,
               ctrlIO.csr_prv,
               ctrlIO.csr_illegal_access,
               ctrlIO.full_stall,
-              toHost)
+              toHost,
+              ctrlIO.csr_counters)
 
     mdata_mux = Mux4(mem_mem_data_sel,  # noqa
                      mem_alu_out,
@@ -334,9 +437,11 @@ def Datapath(clk,
         ctrlIO.dmem_pipeline.fcn.next       = mem_mem_funct
         ctrlIO.dmem_pipeline.typ.next       = mem_mem_type
         ctrlIO.dmem_pipeline.valid.next     = mem_mem_valid
+        ctrlIO.dmem_pipeline.next_addr.next = mem_alu_out if ctrlIO.full_stall else ex_data_out
         mem_mem_data.next                   = ctrlIO.dmem_pipeline.rdata
         csr_exc_io.exception.next           = ctrlIO.csr_exception
         csr_exc_io.exception_code.next      = ctrlIO.csr_exception_code
+        csr_exc_io.exception_interrupt.next = ctrlIO.csr_exception_int
         csr_exc_io.eret.next                = ctrlIO.csr_eret
         csr_exc_io.exception_load_addr.next = mem_alu_out
         csr_exc_io.exception_pc.next        = mem_pc
@@ -28,7 +28,8 @@ from myhdl import concat
 from myhdl import instances
 from Core.ram_dp import RAM_DP
 from Core.ram_dp import RAMIOPort
-from Core.cache_lru import CacheLRU
+from Core.cache_replacement import REPLACEMENT_POLICIES
+from Core.cache_replacement import history_width
 from Core.wishbone import WishboneMaster
 from Core.wishbone import WishboneMasterGenerator
 from Core.wishbone import WishboneSlave
@@ -45,7 +46,12 @@ def ICache(clk_i,
            BLOCK_WIDTH=5,
            SET_WIDTH=9,
            WAYS=2,
-           LIMIT_WIDTH=32):
+           REPLACEMENT='LRU',
+           PIPELINED=False,
+           LIMIT_WIDTH=32,
+           hit_event=None,
+           miss_event=None,
+           next_addr=None):
     """
     The Instruction Cache module.
 
@@ -58,8 +64,16 @@ def ICache(clk_i,
     :param BLOCK_WIDTH: Address width for byte access inside a block line
     :param SET_WIDTH:   Address width for line access inside a block
     :param WAYS:        Number of ways for associative cache (Minimum: 2)
+    :param REPLACEMENT: Replacement policy: 'LRU', 'PLRU' (tree pseudo-LRU) or 'RANDOM' (LFSR)
+    :param PIPELINED:   Hit in the same cycle of the request: the memories are read one word ahead
     :param LIMIT_WIDTH: Maximum width for address
+    :param hit_event:   Optional output: a tag lookup hit (performance counter event)
+    :param miss_event:  Optional output: a tag lookup miss (performance counter event)
+    :param next_addr:   Optional, pipelined mode: address of the request in the next cycle (a hint
+                        for the lookup). Else, the next word is read ahead
     """
+    hit_event  = hit_event if hit_event is not None else Signal(False)
+    miss_event = miss_event if miss_event is not None else Signal(False)
     if ENABLE:
         assert D_WIDTH == 32, "Error: Unsupported D_WIDTH. Supported values: {32}"
         assert BLOCK_WIDTH > 0, "Error: BLOCK_WIDTH must be a value > 0"
@@ -71,7 +85,7 @@ def ICache(clk_i,
         TAG_WIDTH            = LIMIT_WIDTH - WAY_WIDTH  # tag size
         TAGMEM_WAY_WIDTH     = TAG_WIDTH + 1         # Add the valid bit
         TAGMEM_WAY_VALID     = TAGMEM_WAY_WIDTH - 1  # Valid bit index
-        TAG_LRU_WIDTH        = (WAYS * (WAYS - 1)) >> 1  # (N*(N-1))/2
+        TAG_LRU_WIDTH        = history_width(REPLACEMENT, WAYS)  # LRU: (N*(N-1))/2
         # --------------------------------------------------------------------------
         ic_states = enum('IDLE',
                          'READ',
@@ -106,8 +120,10 @@ def ICache(clk_i,
         miss_w_and         = Signal(False)
         final_fetch        = Signal(False)
         final_flush        = Signal(False)
+        refilled           = Signal(False)
 
         lru_select         = Signal(modbv(0)[WAYS:])
+        refill_way         = Signal(modbv(0)[WAYS:])
         current_lru        = Signal(modbv(0)[TAG_LRU_WIDTH:])
         update_lru         = Signal(modbv(0)[TAG_LRU_WIDTH:])
         access_lru         = Signal(modbv(0)[WAYS:])
@@ -119,6 +135,13 @@ def ICache(clk_i,
         lru_out            = Signal(modbv(0)[TAG_LRU_WIDTH:])
         tag_we             = Signal(False)
 
+        ram_addr           = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+        lookup_valid       = Signal(False)
+        read_hold          = Signal(False)
+        rw_we              = Signal(False)
+        wr_addr            = Signal(modbv(0)[SET_WIDTH:])
+        wr_we              = Signal(False)
+
         refill_addr        = Signal(modbv(0)[LIMIT_WIDTH - 2:])
         refill_valid       = Signal(False)
         n_refill_addr      = Signal(modbv(0)[LIMIT_WIDTH - 2:])
@@ -133,7 +156,6 @@ def ICache(clk_i,
         def assignments():
             final_fetch.next        = (refill_addr[BLOCK_WIDTH - 2:] == modbv(-1)[BLOCK_WIDTH - 2:]) and mem_wbm.ack_i and mem_wbm.stb_o and mem_wbm.cyc_o
             lru_select.next         = lru_pre
-            current_lru.next        = lru_out
             access_lru.next         = ~miss_w
             busy.next               = state != ic_states.IDLE
             final_flush.next        = flush_addr == 0
@@ -168,7 +190,104 @@ def ICache(clk_i,
             Check for valid wishbone cycle, and full miss.
             """
             valid_read = cpu_wbs.cyc_i and cpu_wbs.stb_i and not cpu_wbs.we_i
-            miss.next  = miss_w_and and valid_read and not invalidate
+            miss.next  = miss_w_and and valid_read and not invalidate and lookup_valid
+
+        if PIPELINED:
+            lookup_addr = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+            lookup_ok   = Signal(False)
+            match       = Signal(False)
+            fwd_valid   = Signal(False)
+            fwd_set     = Signal(modbv(0)[SET_WIDTH:])
+            fwd_lru     = Signal(modbv(0)[TAG_LRU_WIDTH:])
+
+            @always_comb
+            def lookup_match():
+                """
+                The memories hold the lookup of 'lookup_addr' (word address). It is not valid
+                if the memories were written in the same cycle (refill, tag update, flush).
+                """
+                match.next = lookup_ok and lookup_addr == cpu_wbs.addr_i[LIMIT_WIDTH:2]
+
+            @always_comb
+            def lookup():
+                """
+                Hit in the cycle of the request: the lookup was done in the previous cycle.
+                Tag and LRU updates use the second port of the memories, and the last LRU update
+                is forwarded (the memory returns the old value in the cycle of the write).
+                """
+                valid_read        = cpu_wbs.cyc_i and cpu_wbs.stb_i and not cpu_wbs.we_i
+                lookup_valid.next = state == ic_states.READ and match and valid_read
+                read_hold.next    = True
+                rw_we.next        = False
+                wr_we.next        = flush_we or tag_we
+                if flush_we:
+                    wr_addr.next = flush_addr
+                else:
+                    wr_addr.next = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
+                if fwd_valid and fwd_set == lookup_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]:
+                    current_lru.next = fwd_lru
+                else:
+                    current_lru.next = lru_out
+
+            if next_addr is not None:
+                @always_comb
+                def lookahead():
+                    """
+                    Lookup the address of the next request (the hint), unless the current
+                    request must be looked up.
+                    """
+                    valid_read = cpu_wbs.cyc_i and cpu_wbs.stb_i and not cpu_wbs.we_i
+                    if valid_read and not match:
+                        ram_addr.next = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+                    else:
+                        ram_addr.next = next_addr[LIMIT_WIDTH:2]
+            else:
+                seq_addr   = Signal(modbv(0)[LIMIT_WIDTH - 2:])
+                next_match = Signal(False)
+
+                @always_comb
+                def seq_match():
+                    seq_addr.next   = cpu_wbs.addr_i[LIMIT_WIDTH:2] + 1
+                    next_match.next = lookup_ok and lookup_addr == seq_addr
+
+                @always_comb
+                def lookahead():
+                    """
+                    Read one word ahead: after a hit (and between requests) lookup the next word,
+                    so sequential requests hit every cycle. Else, lookup the current request.
+                    """
+                    if (lookup_valid and not miss_w_and) or (next_match and not cpu_wbs.cyc_i):
+                        ram_addr.next = seq_addr
+                    else:
+                        ram_addr.next = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+
+            @always(clk_i.posedge)
+            def update_lookup():
+                if rst_i:
+                    lookup_addr.next = 0
+                    lookup_ok.next   = False
+                    fwd_valid.next   = False
+                    fwd_set.next     = 0
+                    fwd_lru.next     = 0
+                else:
+                    lookup_addr.next = ram_addr
+                    lookup_ok.next   = state == ic_states.IDLE or (state == ic_states.READ and not miss)
+                    fwd_valid.next   = tag_we
+                    fwd_set.next     = wr_addr
+                    fwd_lru.next     = lru_in
+        else:
+            @always_comb
+            def lookup():
+                """
+                Lookup in the READ state: the memories are read in the IDLE state.
+                """
+                ram_addr.next     = cpu_wbs.addr_i[LIMIT_WIDTH:2]
+                lookup_valid.next = state == ic_states.READ
+                read_hold.next    = False
+                rw_we.next        = tag_we
+                wr_we.next        = flush_we
+                wr_addr.next      = flush_addr
+                current_lru.next  = lru_out
 
         trwp_clk    = [tag_rw_port[i].clk for i in range(WAYS)]
         trwp_addr   = [tag_rw_port[i].addr for i in range(WAYS)]
@@ -180,16 +299,16 @@ def ICache(clk_i,
         def tag_rport():
             for i in range(WAYS):
                 trwp_clk[i].next    = clk_i
-                trwp_addr[i].next   = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
+                trwp_addr[i].next   = ram_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]
                 trwp_data_i[i].next = tag_in[i]
-                trwp_we[i].next     = tag_we
+                trwp_we[i].next     = rw_we
                 tag_out[i].next     = trwp_data_o[i]
             # LRU memory
             tag_lru_rw_port.clk.next    = clk_i
             tag_lru_rw_port.data_i.next = lru_in
             lru_out.next                = tag_lru_rw_port.data_o
-            tag_lru_rw_port.addr.next   = cpu_wbs.addr_i[WAY_WIDTH:BLOCK_WIDTH]
-            tag_lru_rw_port.we.next     = tag_we
+            tag_lru_rw_port.addr.next   = ram_addr[WAY_WIDTH - 2:BLOCK_WIDTH - 2]
+            tag_lru_rw_port.we.next     = rw_we
 
         @always_comb
         def next_state_logic():
@@ -202,11 +321,14 @@ def ICache(clk_i,
                     # miss: refill line
                     n_state.next = ic_states.READ
             elif state == ic_states.READ:
-                if not miss:
+                if miss:
                     # miss: refill line
-                    n_state.next = ic_states.IDLE
-                else:
                     n_state.next = ic_states.FETCH
+                elif read_hold and invalidate:
+                    # cache flush
+                    n_state.next = ic_states.FLUSH
+                elif not read_hold:
+                    n_state.next = ic_states.IDLE
             elif state == ic_states.FETCH:
                 # fetch a line from memory
                 if final_fetch:
@@ -228,6 +350,21 @@ def ICache(clk_i,
             else:
                 state.next = n_state
 
+        @always(clk_i.posedge)
+        def update_refilled():
+            """
+            After a refill, the access is repeated (and hits): do not count it.
+            """
+            if rst_i:
+                refilled.next = False
+            else:
+                refilled.next = state == ic_states.FETCH or (refilled and not lookup_valid)
+
+        @always_comb
+        def events():
+            hit_event.next  = lookup_valid and not miss and not refilled
+            miss_event.next = miss
+
         @always_comb
         def fetch_fsm():
             n_refill_addr.next  = refill_addr
@@ -252,12 +389,19 @@ def ICache(clk_i,
 
         @always(clk_i.posedge)
         def update_fetch():
+            """
+            The victim way is selected at the miss, and held until the end of the refill:
+            the CPU address (and the LRU read) can change during the refill.
+            """
             if rst_i:
                 refill_addr.next  = 0
                 refill_valid.next = False
+                refill_way.next   = 0
             else:
                 refill_addr.next  = n_refill_addr
                 refill_valid.next = n_refill_valid
+                if state == ic_states.READ and miss:
+                    refill_way.next = lru_select
 
         @always_comb
         def tag_write():
@@ -275,7 +419,7 @@ def ICache(clk_i,
                         if lru_select[i]:
                             tag_in[i].next = concat(True, cpu_wbs.addr_i[LIMIT_WIDTH:WAY_WIDTH])
                     tag_we.next = True
-                else:
+                elif lookup_valid:
                     lru_in.next = update_lru
                     tag_we.next = True
 
@@ -284,7 +428,7 @@ def ICache(clk_i,
             n_flush_we.next   = False
             n_flush_addr.next = flush_addr
 
-            if state == ic_states.IDLE:
+            if state == ic_states.IDLE or (state == ic_states.READ and read_hold):
                 if invalidate:
                     n_flush_addr.next = modbv(-1)[SET_WIDTH:]
                     n_flush_we.next   = True
@@ -312,14 +456,14 @@ def ICache(clk_i,
         def tag_flush_port_assign():
             for i in range(WAYS):
                 tfp_clk[i].next    = clk_i
-                tfp_addr[i].next   = flush_addr
-                tfp_data_i[i].next = modbv(0)[TAGMEM_WAY_WIDTH:]
-                tfp_we[i].next     = flush_we
+                tfp_addr[i].next   = wr_addr
+                tfp_data_i[i].next = modbv(0)[TAGMEM_WAY_WIDTH:] if flush_we else tag_in[i]
+                tfp_we[i].next     = wr_we
             # connect to the LRU memory
             tag_lru_flush_port.clk.next    = clk_i
-            tag_lru_flush_port.addr.next   = flush_addr
-            tag_lru_flush_port.data_i.next = modbv(0)[TAG_LRU_WIDTH:]
-            tag_lru_flush_port.we.next     = flush_we
+            tag_lru_flush_port.addr.next   = wr_addr
+            tag_lru_flush_port.data_i.next = modbv(0)[TAG_LRU_WIDTH:] if flush_we else lru_in
+            tag_lru_flush_port.we.next     = wr_we
 
         @always_comb
         def cpu_data_assign():
@@ -346,7 +490,7 @@ def ICache(clk_i,
         def cache_mem_r():
             for i in range(0, WAYS):
                 crp_clk[i].next    = clk_i
-                crp_addr[i].next   = cpu_wbs.addr_i[WAY_WIDTH:2]
+                crp_addr[i].next   = ram_addr[WAY_WIDTH - 2:]
                 crp_data_i[i].next = 0xAABBCCDD
                 crp_we[i].next     = False
 
@@ -363,12 +507,12 @@ def ICache(clk_i,
                 cup_clk[i].next    = clk_i
                 cup_addr[i].next   = refill_addr[WAY_WIDTH - 2:]
                 cup_data_i[i].next = mem_wbm.dat_i
-                cup_we[i].next     = lru_select[i] & mem_wbm.ack_i
+                cup_we[i].next     = refill_way[i] & mem_wbm.ack_i
 
         @always_comb
         def wbs_cpu_flags():
             cpu_err.next  = mem_wbm.err_i
-            cpu_wait.next = miss_w_and or state != ic_states.READ
+            cpu_wait.next = miss_w_and or not lookup_valid
             cpu_busy.next = busy
 
         @always_comb
@@ -395,7 +539,7 @@ def ICache(clk_i,
         cache_mem = [RAM_DP(cache_read_port[i], cache_update_port[i], A_WIDTH=WAY_WIDTH - 2, D_WIDTH=D_WIDTH) for i in range(0, WAYS)]  # noqa
 
         # LRU unit.
-        lru_m = CacheLRU(current_lru, access_lru, update_lru, lru_pre, None, NUMWAYS=WAYS)  # noqa
+        lru_m = REPLACEMENT_POLICIES[REPLACEMENT](current_lru, access_lru, update_lru, lru_pre, None, NUMWAYS=WAYS)  # noqa
 
         return instances()
     else:
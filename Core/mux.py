@@ -73,6 +73,52 @@ def Mux4(sel,
 
     return rtl
 
+
+def Mux8(sel,
+         in1,
+         in2,
+         in3,
+         in4,
+         in5,
+         in6,
+         in7,
+         in8,
+         out):
+    """
+    Defines a multiplexor 8 to 1.
+
+    :param sel:  Data selector
+    :param int1: Data input
+    :param int2: Data input
+    :param int3: Data input
+    :param int4: Data input
+    :param int5: Data input
+    :param int6: Data input
+    :param int7: Data input
+    :param int8: Data input
+    :param out:  Data output
+    """
+    @always_comb
+    def rtl():
+        if sel == 0:
+            out.next = in1
+        elif sel == 1:
+            out.next = in2
+        elif sel == 2:
+            out.next = in3
+        elif sel == 3:
+            out.next = in4
+        elif sel == 4:
+            out.next = in5
+        elif sel == 5:
+            out.next = in6
+        elif sel == 6:
+            out.next = in7
+        else:
+            out.next = in8
+
+    return rtl
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 120
 # flycheck-flake8rc: ".flake8rc"
@@ -19,9 +19,12 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+from array import array
 from myhdl import Signal
 from myhdl import always
 from myhdl import modbv
+from myhdl import _simulator
+from Core.conversion import converting
 
 
 class RAMIOPort:
@@ -47,6 +50,49 @@ class RAMIOPort:
         self.we     = Signal(False)
 
 
+class RAMArray(object):
+    """
+    Storage for the simulation model of the RAM: one array of words.
+
+    A write is stored immediately, but a read in the same time step (the same
+    clock edge) returns the value before the write: the read-during-write
+    behavior of a RAM built with signals.
+    """
+    def __init__(self,
+                 A_WIDTH=10,
+                 D_WIDTH=8):
+        """
+        Allocate the array, using the smallest integer type for the data width.
+        """
+        typecode = [code for code in 'BHILQ' if array(code).itemsize * 8 >= D_WIDTH]
+        self.data  = array(typecode[0], [0]) * 2**A_WIDTH if typecode else [0] * 2**A_WIDTH
+        self.width = D_WIDTH
+        self._time = -1
+        self._old  = {}
+
+    def read(self, addr):
+        if self._time == _simulator._time:
+            return self._old.get(addr, self.data[addr])
+        return self.data[addr]
+
+    def write(self, addr, value):
+        if self._time != _simulator._time:
+            self._time = _simulator._time
+            self._old.clear()
+        if addr not in self._old:
+            self._old[addr] = self.data[addr]
+        self.data[addr] = value
+
+    def clear(self):
+        """
+        Set all the words to zero.
+        """
+        for ii in range(len(self.data)):
+            self.data[ii] = 0
+        self._time = -1
+        self._old.clear()
+
+
 def RAM_DP(portA,
            portB,
            A_WIDTH=10,
@@ -54,6 +100,9 @@ def RAM_DP(portA,
     """
     A dual-port RAM module.
 
+    The simulation uses RAM_DP_SIM (an array instead of a list of signals). The
+    list of signals is used only for conversion.
+
     :param portA:  IO bundle (port A)
     :param portB:  IO bundle (port B)
     :param A_WITH: Address width
@@ -65,6 +114,9 @@ def RAM_DP(portA,
     if portB.data_o is not None:
         assert len(portB.data_i) == len(portB.data_o) == D_WIDTH, "Error: Data width mismatch in portB."
 
+    if not converting():
+        return RAM_DP_SIM(portA, portB, A_WIDTH, D_WIDTH)
+
     _ram = [Signal(modbv(0)[D_WIDTH:]) for ii in range(0, 2**A_WIDTH)]
 
     # Check if the output port is being used
@@ -95,6 +147,42 @@ def RAM_DP(portA,
 
     return rtl_port_a, rtl_port_b
 
+
+def RAM_DP_SIM(portA,
+               portB,
+               A_WIDTH=10,
+               D_WIDTH=8):
+    """
+    Simulation model of the dual-port RAM, with the interface and the
+    read-during-write behavior of RAM_DP. Not convertible.
+
+    :param portA:  IO bundle (port A)
+    :param portB:  IO bundle (port B)
+    :param A_WITH: Address width
+    :param D_WITH: Data width
+    """
+    _ram = RAMArray(A_WIDTH, D_WIDTH)
+
+    def port_rtl(port):
+        if port.data_o is not None:
+            @always(port.clk.posedge)
+            def rtl_port():
+                addr = int(port.addr)
+                if port.we:
+                    _ram.write(addr, int(port.data_i))
+                port.data_o.next = _ram.read(addr)
+        else:
+            @always(port.clk.posedge)
+            def rtl_port():
+                if port.we:
+                    _ram.write(int(port.addr), int(port.data_i))
+        return rtl_port
+
+    rtl_port_a = port_rtl(portA)
+    rtl_port_b = port_rtl(portB)
+
+    return rtl_port_a, rtl_port_b
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 120
 # flycheck-flake8rc: ".flake8rc"
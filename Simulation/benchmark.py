@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import pytest
+import myhdl
+from myhdl import Signal
+from myhdl import Simulation
+from myhdl import modbv
+from myhdl import now
+from Simulation.core.cycle_sim import CycleSimulation
+from Simulation.core.testbench import core_system
+from Simulation.core.testbench import core_testbench
+from Simulation.core.testbench import RESET_TIME
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.testbench import TIMEOUT
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.core.programs import PROGRAM_ARRAY
+
+# Core benchmarks: hand-assembled programs (always available), and a fixed set
+# of RV32 tests (skipped if not compiled, and reported as missing if the baseline
+# executed them).
+CORE_PROGRAMS  = [('loop', PROGRAM_LOOP), ('array', PROGRAM_ARRAY)]
+CORE_HEX_FILES = ['Simulation/tests/rv32ui-p-add.hex',
+                  'Simulation/tests/rv32ui-p-lw.hex',
+                  'Simulation/tests/rv32ui-p-sw.hex',
+                  'Simulation/tests/rv32ui-p-beq.hex',
+                  'Simulation/tests/rv32ui-p-jal.hex',
+                  'Simulation/tests/rv32mi-p-csr.hex']
+MODULE_TESTS   = 'Simulation/modules/test_*.py'
+ENGINES        = ['event', 'cycle']
+HISTORY_FILE   = 'benchmarks.json'
+THRESHOLD      = 10.0  # Max throughput drop (%), against the baseline
+LINE_WIDTH     = 80
+
+
+def _peak_rss():
+    """
+    Peak resident set size of the process, in MB (ru_maxrss: KB on Linux, bytes on OS X).
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def _bench_core(hex_file, engine):
+    """
+    Elaborate the core and run a program: elaboration time, run time and simulated cycles.
+    """
+    start = time.time()
+    if engine == 'cycle':
+        clk        = Signal(True)
+        rst        = Signal(False)
+        toHost     = Signal(modbv(0)[32:])
+        sim        = CycleSimulation(clk, core_system(clk, rst, toHost, hex_file))
+        elaborated = time.time()
+        rst.next = True
+        sim.run(RESET_TIME - 1)
+        rst.next = False
+        sim.run(TIMEOUT + 1, stop=lambda: toHost != 0)
+        assert toHost == 1, "Test failed. MTOHOST = {0}".format(int(toHost))
+        cycles = sim.cycle
+    else:
+        bench      = core_testbench(hex_file)
+        elaborated = time.time()
+        Simulation(bench).run(quiet=1)
+        cycles     = now() // TICK_PERIOD
+    return dict(elaboration=elaborated - start, wall=time.time() - start, cycles=cycles)
+
+
+def _bench_module(test_file):
+    """
+    Run the unit tests of a module (pytest session).
+    """
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        status = pytest.main([test_file, '-q', '-p', 'no:cacheprovider', '--rootdir', os.getcwd()])
+    assert status == 0, "Test failed: {0}".format(test_file)
+    return dict(wall=time.time() - start)
+
+
+def _run_job(job):
+    """
+    Worker: execute a benchmark in a fresh process (the MyHDL simulator keeps
+    global state, and the peak RSS is the one of the benchmark).
+    """
+    name, function, args = job
+    try:
+        result = function(*args)
+    except (AssertionError, myhdl.Error) as error:
+        return name, dict(error=str(error).splitlines()[0])
+    result['rss'] = _peak_rss()
+    if 'cycles' in result:
+        result['throughput'] = result['cycles'] / (result['wall'] - result['elaboration'])
+    else:
+        result['throughput'] = 1.0 / result['wall']
+    return name, result
+
+
+def benchmark_jobs(engines, workdir):
+    """
+    List of benchmarks: (name, function, arguments). The hand-assembled programs
+    are written to workdir.
+    """
+    hex_files = []
+    for name, program in CORE_PROGRAMS:
+        hex_files.append(os.path.join(workdir, '{0}.hex'.format(name)))
+        write_hex(hex_files[-1], program)
+    hex_files += [hex_file for hex_file in CORE_HEX_FILES if os.path.isfile(hex_file)]
+
+    jobs = [('core/{0}/{1}'.format(engine, os.path.splitext(os.path.basename(hex_file))[0]), _bench_core, (hex_file, engine))
+            for engine in engines for hex_file in hex_files]
+    jobs += [('module/{0}'.format(os.path.splitext(os.path.basename(test))[0]), _bench_module, (test,))
+             for test in sorted(glob.glob(MODULE_TESTS))]
+    return jobs
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the throughput of each benchmark with the baseline.
+
+    :returns: List of (name, change in %, regression), for the benchmarks in both sets
+    """
+    changes = []
+    for name in sorted(results):
+        if name not in baseline or 'throughput' not in results[name] or 'throughput' not in baseline[name]:
+            continue
+        change = 100.0 * (results[name]['throughput'] / baseline[name]['throughput'] - 1)
+        changes.append((name, change, change < -threshold))
+    return changes
+
+
+def missing_benchmarks(results, baseline, engines=ENGINES):
+    """
+    Benchmarks of the baseline without a result: a HEX file of CORE_HEX_FILES that
+    is not compiled any more, or a removed module test. The core benchmarks of the
+    engines that were not executed are ignored.
+    """
+    missing = []
+    for name in sorted(baseline):
+        engine = name.split('/')[1] if name.startswith('core/') else None
+        if name not in results and (engine is None or engine in engines):
+            missing.append(name)
+    return missing
+
+
+def format_results(results, changes):
+    lines = ['{0:<32} {1:>9} {2:>8} {3:>12} {4:>8} {5:>8}'.format('Benchmark', 'Wall (s)', 'Elab (s)', 'Throughput',
+                                                                  'RSS (MB)', 'Change')]
+    changes = dict((name, (change, regression)) for name, change, regression in changes)
+    for name, result in sorted(results.items()):
+        if 'error' in result:
+            lines.append('{0:<32} ERROR: {1}'.format(name, result['error']))
+            continue
+        unit   = 'cyc/s' if 'cycles' in result else 'run/s'
+        change = changes.get(name)
+        lines.append('{0:<32} {1:9.2f} {2:>8} {3:>12} {4:8.1f} {5:>8}'.format(
+            name, result['wall'], '{0:.2f}'.format(result['elaboration']) if 'elaboration' in result else '-',
+            '{0:.1f} {1}'.format(result['throughput'], unit), result['rss'],
+            '-' if change is None else '{0:+.1f}%{1}'.format(change[0], ' !' if change[1] else '')))
+    return '\n'.join(lines)
+
+
+def run_benchmarks(engines=ENGINES, history_file=HISTORY_FILE, threshold=THRESHOLD, update_baseline=False, repeat=1):
+    """
+    Execute the benchmarks, one at a time (stable timings), and append the results
+    to the history file. The first run is the baseline, unless update_baseline is set.
+    With repeat > 1, each benchmark is executed several times, and the best
+    throughput is kept (less noise).
+
+    :returns: The names of the benchmarks with a throughput drop above the threshold
+              (in %), that failed, or that are in the baseline but were not executed
+    """
+    try:
+        with open(history_file) as f:
+            history = json.load(f)
+    except (IOError, ValueError):
+        history = dict(baseline=None, history=[])
+
+    workdir = tempfile.mkdtemp()
+    results = {}
+    print(' benchmarks '.center(LINE_WIDTH, '='))
+    try:
+        jobs = [job for job in benchmark_jobs(engines, workdir) for _ in range(repeat)]
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            for name, result in pool.imap(_run_job, jobs):
+                if name in results and results[name].get('throughput', 0) >= result.get('throughput', 0):
+                    continue
+                results[name] = result
+                print('{0} {1}'.format(name, 'ERROR' if 'error' in result else 'done ({0:.2f}s)'.format(result['wall'])))
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    finally:
+        shutil.rmtree(workdir)
+
+    baseline = history['baseline']
+    if baseline is not None:
+        for name in missing_benchmarks(results, baseline['results'], engines):
+            results[name] = dict(error='Missing: executed in the baseline, but not in this run')
+
+    run = dict(date=time.strftime('%Y-%m-%d %H:%M:%S'), python=platform.python_version(), myhdl=myhdl.__version__,
+               host=platform.node(), results=results)
+    changes  = compare(results, baseline['results'], threshold) if baseline else []
+    history['history'].append(run)
+    if baseline is None or update_baseline:
+        history['baseline'] = run
+    with open(history_file, 'w') as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+
+    print('\n' + format_results(results, changes))
+    if baseline is not None:
+        print('\nBaseline: {0}. Threshold: -{1}%'.format(baseline['date'], threshold))
+    failed = [name for name, _, regression in changes if regression] + [name for name in results if 'error' in results[name]]
+    return sorted(failed)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import pytest
+from Simulation.profiler import Profiler
+
+# Profiles of the tests in the session (test id, Profiler), for the summary.
+PROFILES = []
+
+
+def pytest_addoption(parser):
+    parser.addoption('--profile', action='store_true', default=False,
+                     help='Profile the generators of the simulations (time, activations, signal updates)')
+    parser.addoption('--profile_top', type=int, default=20,
+                     help='Number of generators and instances in the profile reports (0: all)')
+
+
+@pytest.fixture(autouse=True)
+def profiler(request):
+    """
+    With '--profile', attach a profiler to each simulation created by the test.
+    The testbench can attach the design first, with its hierarchy (instance names).
+    """
+    if not request.config.getoption('profile'):
+        yield None
+        return
+    profiler = Profiler().install()
+    try:
+        yield profiler
+    finally:
+        profiler.uninstall()
+    if profiler.stats:
+        PROFILES.append((request.node.nodeid, profiler))
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    Print the profile of each test at the end of the run.
+    """
+    if not PROFILES:
+        return
+    top = terminalreporter.config.getoption('profile_top')
+    terminalreporter.section('Profiles')
+    for nodeid, profiler in PROFILES:
+        terminalreporter.write_line(profiler.report(nodeid, top))
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.commit_log import COMMIT_MAGIC
+from Simulation.core.commit_log import read_commit_log
+from Simulation.core.monitor import find_object
+from collections import namedtuple
+import struct
+
+# Cache trace format: header (with the misses counted by the RTL caches), and one
+# record per cache lookup (cache, address).
+TRACE_MAGIC   = b'ALGOLCAT'
+TRACE_VERSION = 1
+HEADER        = struct.Struct('<8sIII')
+RECORD        = struct.Struct('<BI')
+ICACHE        = 0
+DCACHE        = 1
+
+CacheResult  = namedtuple('CacheResult', 'block_width set_width ways accesses misses')
+CacheStreams = namedtuple('CacheStreams', 'icache dcache misses')
+
+
+class CacheTrace(object):
+    """
+    Cache trace: the address of each tag lookup of the I$ and the D$, in the cycles
+    where the performance counter events (hit or miss) are asserted. The lookup
+    repeated after a refill is not an access. Both caches must be enabled.
+
+    Call update() once per cycle, between clock edges (see RetireMonitor).
+
+    :ivar icache:  I$ addresses
+    :ivar dcache:  D$ addresses
+    :ivar misses:  Misses counted by the RTL caches: [I$, D$]
+    """
+    def __init__(self, blocks):
+        """
+        :param blocks: The elaborated core (flattened)
+        """
+        try:
+            self.ic_addr = find_object(blocks, 'ICache', 'cpu_wbs').addr_i
+            self.dc_addr = find_object(blocks, 'DCache', 'cpu_wbs').addr_i
+        except KeyError:
+            raise AssertionError("Error: the cache trace needs the I$ and the D$ enabled")
+        self.events = find_object(blocks, 'Datapath', 'ctrlIO').csr_counters
+        self.icache = []
+        self.dcache = []
+        self.misses = [0, 0]
+
+    def update(self):
+        events = self.events
+        if events.ic_hit or events.ic_miss:
+            self.icache.append(int(self.ic_addr))
+            self.misses[ICACHE] += bool(events.ic_miss)
+        if events.dc_hit or events.dc_miss:
+            self.dcache.append(int(self.dc_addr))
+            self.misses[DCACHE] += bool(events.dc_miss)
+
+    def save(self, trace_file):
+        with open(trace_file, 'wb') as f:
+            f.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, self.misses[ICACHE], self.misses[DCACHE]))
+            f.write(b''.join(RECORD.pack(ICACHE, addr) for addr in self.icache))
+            f.write(b''.join(RECORD.pack(DCACHE, addr) for addr in self.dcache))
+
+
+def read_cache_trace(trace_file):
+    """
+    Read the address streams of a cache trace. A commit trace is also accepted: the
+    streams are the PC and the memory address of the retired instructions (no
+    wrong-path fetches).
+
+    :returns: CacheStreams: I$ addresses, D$ addresses, and the RTL misses ([I$, D$],
+              None for a commit trace)
+    """
+    with open(trace_file, 'rb') as f:
+        data = f.read()
+    if data.startswith(COMMIT_MAGIC):
+        commits = list(read_commit_log(trace_file))
+        return CacheStreams([commit.pc for commit in commits],
+                            [commit.mem_addr for commit in commits if commit.mem_addr is not None],
+                            None)
+    magic, version, ic_misses, dc_misses = HEADER.unpack_from(data)
+    assert magic == TRACE_MAGIC, "Error, invalid cache trace: {0}".format(trace_file)
+    assert version == TRACE_VERSION, "Error, unsupported cache trace version: {0}".format(version)
+    streams = CacheStreams([], [], [ic_misses, dc_misses])
+    for offset in range(HEADER.size, len(data), RECORD.size):
+        cache, addr = RECORD.unpack_from(data, offset)
+        streams[cache].append(addr)
+    return streams
+
+
+def stack_distances(addresses, block_widths, set_widths, max_ways):
+    """
+    Per-set LRU stack distances, for all the cache geometries in one pass over the
+    trace. Each set keeps its blocks in LRU order (most recent first), up to
+    max_ways blocks: a block at depth d hits in any cache with more than d ways.
+
+    :param addresses:    Byte addresses
+    :param block_widths: Address widths of the byte inside a line (line size: 2**width)
+    :param set_widths:   Address widths of the set (number of sets: 2**width)
+    :param max_ways:     Max associativity
+    :returns:            {(block_width, set_width): histogram}. Entry d is the number of
+                         accesses at depth d. The last entry: depth >= max_ways, or first access
+    """
+    geometries = [(block_width, set_width, (1 << set_width) - 1, {}, [0] * (max_ways + 1))
+                  for block_width in block_widths for set_width in set_widths]
+    for addr in addresses:
+        for block_width, _, mask, stacks, histogram in geometries:
+            block = addr >> block_width
+            stack = stacks.setdefault(block & mask, [])
+            if block in stack:
+                depth = stack.index(block)
+                del stack[depth]
+            else:
+                depth = max_ways
+                if len(stack) == max_ways:
+                    stack.pop()
+            stack.insert(0, block)
+            histogram[depth] += 1
+    return dict(((block_width, set_width), histogram) for block_width, set_width, _, _, histogram in geometries)
+
+
+def sweep(addresses, block_widths, set_widths, ways):
+    """
+    Misses of a LRU cache for each line size, number of sets and associativity.
+
+    :returns: List of CacheResult, sorted by geometry
+    """
+    histograms = stack_distances(addresses, block_widths, set_widths, max(ways))
+    results    = []
+    for (block_width, set_width), histogram in sorted(histograms.items()):
+        for n_ways in sorted(ways):
+            results.append(CacheResult(block_width, set_width, n_ways, len(addresses), sum(histogram[n_ways:])))
+    return results
+
+
+def format_results(results):
+    """
+    Text format: one line per cache configuration (algol.ini keys, size, misses).
+    """
+    lines = ['BlockWidth SetWidth Ways  Size(B)   Accesses     Misses  MissRate']
+    for result in results:
+        size = result.ways << (result.block_width + result.set_width)
+        rate = 100.0 * result.misses / result.accesses if result.accesses else 0.0
+        lines.append('{0:10d} {1:8d} {2:4d} {3:8d} {4:10d} {5:10d} {6:8.2f}%'.format(result.block_width, result.set_width,
+                                                                                     result.ways, size, result.accesses,
+                                                                                     result.misses, rate))
+    return '\n'.join(lines)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.ram_dp import RAMArray
+from Simulation.core.memory import PagedMemory
+from Simulation.core.memory import PAGE_WORDS
+from Simulation.core.memory import StoreWords
+from Simulation.core.monitor import find_object
+from myhdl import EnumItemType
+from array import array
+import struct
+import zlib
+
+# File format (zlib compressed): header, signals (widths and values), RAMs, memory.
+# The values of the signals and the RAMs use (width + 7) // 8 bytes each.
+CHECKPOINT_MAGIC   = b'ALGOLCKP'
+CHECKPOINT_VERSION = 2
+HEADER             = struct.Struct('<8sIQIIB')
+
+
+def _words(data):
+    return struct.pack('<{0}Q'.format(len(data)), *data)
+
+
+def _unwords(data, offset, count):
+    return list(struct.unpack_from('<{0}Q'.format(count), data, offset)), offset + 8 * count
+
+
+def _nbytes(width):
+    """
+    Bytes used by a value of 'width' bits. A signal without width (int) uses 8 bytes.
+    """
+    return (width + 7) // 8 if width else 8
+
+
+def _values(values, width):
+    """
+    Pack values of 'width' bits (little-endian, two's complement).
+    """
+    nbytes = _nbytes(width)
+    mask   = (1 << (8 * nbytes)) - 1
+    data   = bytearray()
+    for value in values:
+        value &= mask
+        data.extend((value >> shift) & 0xff for shift in range(0, 8 * nbytes, 8))
+    return bytes(data)
+
+
+def _unvalues(data, offset, width, count, signed=False):
+    """
+    Unpack 'count' values of 'width' bits. Signed values are sign-extended.
+    """
+    nbytes = _nbytes(width)
+    sign   = 1 << (8 * nbytes - 1)
+    values = []
+    for _ in range(count):
+        value = 0
+        for byte in reversed(bytearray(data[offset:offset + nbytes])):
+            value = (value << 8) | byte
+        values.append(value - (sign << 1) if signed and value & sign else value)
+        offset += nbytes
+    return values, offset
+
+
+def _signed(sig):
+    return sig._nrbits == 0 or (sig._min is not None and sig._min < 0)
+
+
+def _rams(blocks):
+    """
+    The RAM models of the design, in elaboration order.
+    """
+    rams = []
+    for block in blocks:
+        for value in block.symdict.values():
+            if isinstance(value, RAMArray) and not any(ram is value for ram in rams):
+                rams.append(value)
+    return rams
+
+
+def save_checkpoint(filename, sim, signals, blocks):
+    """
+    Save the state of a cycle-based simulation of the core: the cycle counter,
+    the value of all the signals, the RAMs of the caches, and the memory.
+
+    :param filename: Checkpoint file
+    :param sim:      The simulator (between cycles)
+    :param signals:  Signals created by the elaboration, in creation order
+    :param blocks:   The elaborated design (flattened)
+    """
+    values = [sig._val._index if isinstance(sig._val, EnumItemType) else int(sig._val) for sig in signals]
+    rams   = _rams(blocks)
+    memory = find_object(blocks, 'Memory', '_memory')
+    if isinstance(memory, PagedMemory):
+        pages = sorted(memory.pages.items())
+    else:
+        pages = [(index, memory[index * PAGE_WORDS:(index + 1) * PAGE_WORDS]) for index in range(-(-len(memory) // PAGE_WORDS))]
+        pages = [(index, page) for index, page in pages if any(page)]
+    pages = [(index, page[:len(memory) - index * PAGE_WORDS]) for index, page in pages]
+
+    data = [HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, sim.cycle, len(signals), len(rams), isinstance(memory, PagedMemory)),
+            _words([sig._nrbits for sig in signals])]
+    data.extend(_values([value], sig._nrbits) for sig, value in zip(signals, values))
+    for ram in rams:
+        data.append(_words([len(ram.data), ram.width]) + _values(ram.data, ram.width))
+    data.append(_words([len(memory), len(pages)]))
+    for index, page in pages:
+        data.append(_words([index, len(page)]) + struct.pack('<{0}I'.format(len(page)), *page))
+
+    with open(filename, 'wb') as f:
+        f.write(zlib.compress(b''.join(data)))
+
+
+def restore_checkpoint(filename, sim, signals, blocks):
+    """
+    Restore a checkpoint in a freshly elaborated design, with the same
+    configuration. The next call to sim.step() continues the saved simulation.
+
+    :param filename: Checkpoint file
+    :param sim:      The simulator
+    :param signals:  Signals created by the elaboration, in creation order
+    :param blocks:   The elaborated design (flattened)
+    """
+    with open(filename, 'rb') as f:
+        data = zlib.decompress(f.read())
+
+    magic, version, cycle, n_signals, n_rams, paged = HEADER.unpack_from(data)
+    assert magic == CHECKPOINT_MAGIC, "Error, invalid checkpoint file: {0}".format(filename)
+    assert version == CHECKPOINT_VERSION, "Error, unsupported checkpoint version: {0}".format(version)
+    rams   = _rams(blocks)
+    memory = find_object(blocks, 'Memory', '_memory')
+    widths, offset = _unwords(data, HEADER.size, n_signals)
+    assert widths == [sig._nrbits for sig in signals] and n_rams == len(rams), "Error, the checkpoint was saved with a different configuration"
+    assert paged == isinstance(memory, PagedMemory), "Error, the checkpoint was saved with a different memory model"
+
+    sim.reset(cycle)
+    for sig in signals:
+        (value,), offset = _unvalues(data, offset, sig._nrbits, 1, _signed(sig))
+        if isinstance(sig._val, EnumItemType):
+            value = getattr(sig._val._type, sig._val._type._names[value])
+        elif isinstance(sig._val, bool):
+            value = bool(value)
+        sig.next = value
+
+    for ram in rams:
+        (size, width), offset = _unwords(data, offset, 2)
+        assert size == len(ram.data) and width == ram.width, "Error, the checkpoint was saved with a different configuration"
+        words, offset = _unvalues(data, offset, width, size)
+        ram.clear()
+        ram.data[:] = array(ram.data.typecode, words) if isinstance(ram.data, array) else words
+
+    (size, n_pages), offset = _unwords(data, offset, 2)
+    assert size == len(memory), "Error, the checkpoint was saved with a different memory size"
+    segments = []
+    for _ in range(n_pages):
+        (index, length), offset = _unwords(data, offset, 2)
+        segments.append((index * PAGE_WORDS, list(struct.unpack_from('<{0}I'.format(length), data, offset))))
+        offset += 4 * length
+    if paged:
+        # Keep the mapped image: the saved pages are the modified ones.
+        memory.pages.clear()
+        for addr, words in segments:
+            memory.load(addr, words)
+    else:
+        StoreWords(size << 2, memory, segments)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 200
+# flycheck-flake8rc: ".flake8rc"
+# End:
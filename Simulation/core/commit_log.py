@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.consts import Consts
+from Simulation.core.monitor import find_object
+from Simulation.core.monitor import RetireMonitor
+from collections import namedtuple
+import struct
+
+# File format: header, and one record per retired instruction. A record has
+# a fixed part (cycles since the previous record, PC, instruction, flags),
+# followed by the optional write-back and memory access fields.
+COMMIT_MAGIC   = b'ALGOLCMT'
+COMMIT_VERSION = 1
+HEADER         = struct.Struct('<8sI')
+RECORD         = struct.Struct('<IIIB')
+RECORD_WB      = struct.Struct('<BI')
+RECORD_MEM     = struct.Struct('<II')
+FLAG_WB        = 0x01
+FLAG_MEM       = 0x02
+FLAG_STORE     = 0x04
+BUFFER_SIZE    = 1 << 16
+
+Commit = namedtuple('Commit', 'cycle pc instruction rd rd_data mem_addr mem_data store')
+
+
+class CommitLog(object):
+    """
+    Commit trace: write a record for each instruction retired by the core (the
+    cycles where csr_retire is asserted): cycle, PC, instruction, register
+    write-back, and memory access. The records are buffered, and written in
+    blocks.
+
+    Call update() once per cycle, between clock edges (see RetireMonitor).
+    """
+    def __init__(self, log_file, blocks):
+        """
+        :param log_file: Output file
+        :param blocks:   The elaborated core (flattened)
+        """
+        self.monitor   = RetireMonitor(blocks)
+        self.wb_addr   = find_object(blocks, 'Datapath', 'mem_wb_addr')
+        self.wb_wdata  = find_object(blocks, 'Datapath', 'mem_wb_wdata')
+        self.wb_we     = find_object(blocks, 'Datapath', 'mem_wb_we')
+        self.mem_addr  = find_object(blocks, 'Datapath', 'mem_alu_out')
+        self.mem_wdata = find_object(blocks, 'Datapath', 'mem_mem_wdata')
+        self.mem_rdata = find_object(blocks, 'Datapath', 'mem_mem_data')
+        self.mem_valid = find_object(blocks, 'Datapath', 'mem_mem_valid')
+        self.mem_funct = find_object(blocks, 'Datapath', 'mem_mem_funct')
+        self._file     = open(log_file, 'wb')
+        self._buffer   = bytearray(HEADER.pack(COMMIT_MAGIC, COMMIT_VERSION))
+        self._cycle    = 0
+
+    def update(self, cycle):
+        """
+        Log the instruction retired at the next clock edge.
+
+        :param cycle: Number of the next clock edge
+        """
+        retired = self.monitor.update()
+        if retired is None:
+            return
+        pc, instruction = retired
+        flags = 0
+        if self.wb_we and self.wb_addr != 0:
+            flags |= FLAG_WB
+        if self.mem_valid:
+            flags |= FLAG_MEM | (FLAG_STORE if self.mem_funct == Consts.M_WR else 0)
+        buffer = self._buffer
+        buffer += RECORD.pack(cycle - self._cycle, pc, instruction, flags)
+        if flags & FLAG_WB:
+            buffer += RECORD_WB.pack(int(self.wb_addr), int(self.wb_wdata))
+        if flags & FLAG_MEM:
+            buffer += RECORD_MEM.pack(int(self.mem_addr), int(self.mem_wdata if flags & FLAG_STORE else self.mem_rdata))
+        self._cycle = cycle
+        if len(buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        self._file.write(self._buffer)
+        del self._buffer[:]
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def read_commit_log(log_file):
+    """
+    Decode a commit trace.
+
+    :returns: Generator of Commit tuples. rd and mem_addr are None if the
+              instruction does not write a register or access the memory
+    """
+    with open(log_file, 'rb') as f:
+        data = f.read()
+    magic, version = HEADER.unpack_from(data)
+    assert magic == COMMIT_MAGIC, "Error, invalid commit trace: {0}".format(log_file)
+    assert version == COMMIT_VERSION, "Error, unsupported commit trace version: {0}".format(version)
+    offset = HEADER.size
+    cycle  = 0
+    while offset < len(data):
+        delta, pc, instruction, flags = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        cycle  += delta
+        rd = rd_data = mem_addr = mem_data = None
+        if flags & FLAG_WB:
+            rd, rd_data = RECORD_WB.unpack_from(data, offset)
+            offset     += RECORD_WB.size
+        if flags & FLAG_MEM:
+            mem_addr, mem_data = RECORD_MEM.unpack_from(data, offset)
+            offset            += RECORD_MEM.size
+        yield Commit(cycle, pc, instruction, rd, rd_data, mem_addr, mem_data, bool(flags & FLAG_STORE))
+
+
+def format_commit(commit):
+    """
+    Text format of a record: cycle, PC, instruction, write-back, memory access.
+    """
+    text = '{0:10d} 0x{1:08x} (0x{2:08x})'.format(commit.cycle, commit.pc, commit.instruction)
+    if commit.rd is not None:
+        text += ' x{0:<2d} 0x{1:08x}'.format(commit.rd, commit.rd_data)
+    if commit.mem_addr is not None:
+        text += ' mem{0} 0x{1:08x} 0x{2:08x}'.format('W' if commit.store else 'R', commit.mem_addr, commit.mem_data)
+    return text
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
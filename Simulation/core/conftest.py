@@ -19,6 +19,19 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 import glob
+from Simulation.core.testbench import CPI_STACKS
+
+# RV32 tests, for the '--all' option.
+HEX_PATTERNS = ['Simulation/tests/rv32mi-p-*.hex',
+                'Simulation/tests/rv32ui-p-*.hex',
+                'Simulation/tests/rv32ui-pt-*.hex']
+
+
+def list_hex_files():
+    """
+    Return the list of RV32 tests (HEX files).
+    """
+    return [hex_file for pattern in HEX_PATTERNS for hex_file in glob.glob(pattern)]
 
 
 def auto_int(value):
@@ -29,20 +42,69 @@ def pytest_addoption(parser):
     parser.addoption('--hex_file', type=str, action='append', default=[],
                      help='Memory image in HEX format')
     parser.addoption('--all', action='store_true', default=False, help='Run all RV32 tests')
+    parser.addoption('--suite', action='store_true', default=False,
+                     help='Run the tests as a program suite: elaborate the core once')
     parser.addoption('--vcd', action='store_true', default=False, help='Generate VCD files')
+    parser.addoption('--engine', choices=['event', 'cycle'], default='event',
+                     help='Simulation engine for the core: event-driven (MyHDL) or cycle-based')
+    parser.addoption('--trace_scope', type=str, action='append', default=[],
+                     help='Trace only the signals of an instance (name or dotted path)')
+    parser.addoption('--trace_start', type=int, default=0, help='First traced cycle')
+    parser.addoption('--trace_stop', type=int, default=None, help='Last traced cycle')
+    parser.addoption('--trace_trigger', type=str, default=None,
+                     help="Start tracing on the write to toHost ('tohost'), or when the decode PC reaches an address")
+    parser.addoption('--trace_before', type=int, default=0, help='Cycles traced before the trigger')
+    parser.addoption('--commit_log', type=str, default=None, help='Write a commit trace of the retired instructions')
+    parser.addoption('--cpi_stack', action='store_true', default=False,
+                     help='Classify the cycles of the core, and print a CPI stack per test')
+    parser.addoption('--cache_trace', type=str, default=None,
+                     help='Write the address streams of the I$ and the D$ (cycle-based engine)')
+    parser.addoption('--checkpoint', type=int, default=0,
+                     help='Save a checkpoint every N cycles (cycle-based engine)')
+    parser.addoption('--restore', type=str, default=None,
+                     help='Continue the simulation from a checkpoint file (cycle-based engine)')
+
+
+def trace_options(config):
+    """
+    Return the options of the selective tracer, or None if not used.
+    """
+    options = dict(scopes=config.getoption('trace_scope') or None,
+                   start=config.getoption('trace_start'),
+                   stop=config.getoption('trace_stop'),
+                   trigger=config.getoption('trace_trigger'),
+                   before=config.getoption('trace_before'))
+    used    = options['scopes'] or options['start'] or options['before']
+    return options if used or options['stop'] is not None or options['trigger'] is not None else None
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    Print the CPI stack of each test at the end of the run.
+    """
+    if not CPI_STACKS:
+        return
+    terminalreporter.section('CPI stacks')
+    for hex_file, stack in CPI_STACKS:
+        terminalreporter.write_line(stack.report(hex_file))
 
 
 def pytest_generate_tests(metafunc):
     if 'hex_file' in metafunc.fixturenames:
         if metafunc.config.option.all:
-            list_hex = glob.glob("Simulation/tests/rv32mi-p-*.hex")
-            list_hex = list_hex + glob.glob("Simulation/tests/rv32ui-p-*.hex")
-            list_hex = list_hex + glob.glob("Simulation/tests/rv32ui-pt-*.hex")
-            metafunc.parametrize('hex_file', list_hex)
+            metafunc.parametrize('hex_file', list_hex_files())
         else:
             metafunc.parametrize('hex_file', metafunc.config.option.hex_file)
+    if 'hex_suite' in metafunc.fixturenames:
+        if metafunc.config.option.suite:
+            hex_suite = list_hex_files() if metafunc.config.option.all else metafunc.config.option.hex_file
+            metafunc.parametrize('hex_suite', [hex_suite] if hex_suite else [])
+        else:
+            metafunc.parametrize('hex_suite', [])
     if 'vcd' in metafunc.fixturenames:
         metafunc.parametrize('vcd', [metafunc.config.option.vcd])
+    if 'engine' in metafunc.fixturenames:
+        metafunc.parametrize('engine', [metafunc.config.option.engine])
 
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 120
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.consts import Consts
+from Simulation.core.monitor import find_object
+from collections import OrderedDict
+
+# Categories of the CPI stack, in report order. A cycle retires an instruction,
+# or it is charged to the event that stalled the pipeline, or to the event that
+# created the bubble found at the MEM stage (the retire point).
+RETIRE      = 'retire'
+IMEM_STALL  = 'imem'
+DMEM_STALL  = 'dmem'
+EX_STALL    = 'ex'
+HAZARD      = 'hazard'
+FENCE_I     = 'fence_i'
+FLUSH       = 'flush'
+OTHER       = 'other'
+CATEGORIES  = OrderedDict([(RETIRE,     'Retire'),
+                           (IMEM_STALL, 'I-fetch stall'),
+                           (DMEM_STALL, 'D-memory stall'),
+                           (EX_STALL,   'EX long-op stall'),
+                           (HAZARD,     'Load-use/CSR hazard'),
+                           (FENCE_I,    'FENCE.I drain'),
+                           (FLUSH,      'Branch/jump flush'),
+                           (OTHER,      'Other')])
+
+
+class CPIStack(object):
+    """
+    CPI stack: classify each clock cycle of the core, using the control signals.
+    No hardware is added to the core.
+
+    - Full pipeline stalls (full_stall) are charged to the stalled stage: D-memory,
+      EX (multiplier/divider), or I-fetch, in that order.
+    - Otherwise, the cycle retires the instruction at MEM, or it is charged to the
+      bubble at MEM. A shadow pipeline tracks the origin of each bubble: a hazard
+      at ID (id_stall, FENCE.I when waiting for the stores), or a flush (if_kill,
+      and the exceptions). The remaining bubbles (pipeline fill after reset) are
+      charged to 'other'.
+
+    Call update() once per cycle, between clock edges (see RetireMonitor).
+
+    :ivar cycles: Cycles per category
+    """
+    def __init__(self, blocks):
+        """
+        :param blocks: The elaborated core (flattened)
+        """
+        self.ctrl       = find_object(blocks, 'Datapath', 'ctrlIO')
+        self.id_fence_i = find_object(blocks, 'Ctrlpath', 'id_fence_i')
+        self.cycles     = OrderedDict((category, 0) for category in CATEGORIES)
+        self._id        = OTHER
+        self._ex        = OTHER
+        self._mem       = OTHER
+
+    def update(self):
+        """
+        Classify the cycle, and advance the shadow pipeline. A stage holds an
+        instruction (RETIRE), or the category of a bubble.
+        """
+        ctrl = self.ctrl
+        if ctrl.full_stall:
+            events   = ctrl.csr_counters
+            category = DMEM_STALL if events.dmem_stall else (EX_STALL if events.ex_stall else IMEM_STALL)
+        elif self._mem == RETIRE:
+            category = RETIRE if ctrl.csr_retire else FLUSH
+        else:
+            category = self._mem
+        self.cycles[category] += 1
+
+        if ctrl.full_stall:
+            return
+        self._mem = FLUSH if ctrl.pipeline_kill else self._ex
+        if ctrl.pipeline_kill or ctrl.id_kill:
+            self._ex = FLUSH
+        elif ctrl.id_stall:
+            self._ex = FENCE_I if self.id_fence_i else HAZARD
+        elif ctrl.id_instruction == Consts.BUBBLE:
+            self._ex = self._id
+        else:
+            self._ex = RETIRE
+        if not ctrl.id_stall:
+            self._id = FLUSH if ctrl.pipeline_kill or ctrl.if_kill else OTHER
+
+    @property
+    def total(self):
+        return sum(self.cycles.values())
+
+    @property
+    def retired(self):
+        return self.cycles[RETIRE]
+
+    def report(self, title=''):
+        """
+        Text format: cycles, CPI and percentage of each category.
+        """
+        retired = max(self.retired, 1)
+        total   = max(self.total, 1)
+        lines   = ['CPI stack{0}: {1} cycles, {2} instructions, CPI = {3:.3f}'.format(
+            ' ({0})'.format(title) if title else '', self.total, self.retired, self.total / float(retired))]
+        for category, label in CATEGORIES.items():
+            cycles = self.cycles[category]
+            lines.append('  {0:<20} {1:10d} {2:8.3f} {3:6.1f}%'.format(label, cycles, cycles / float(retired),
+                                                                       100.0 * cycles / total))
+        return '\n'.join(lines)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from myhdl import SimulationError
+from myhdl import _simulator
+from myhdl._Simulation import _flatten
+from myhdl._always_comb import _AlwaysComb
+from myhdl._always import _Always
+from myhdl._Signal import _Signal
+from myhdl._Signal import _PosedgeWaiterList
+from myhdl._simulator import _siglist
+from myhdl._util import _makeAST
+import ast
+
+# Max number of passes for a combinational loop (blocks depending on each other).
+MAX_ITERATIONS = 100
+
+
+def _signals_of(block, names):
+    """
+    Return the signals referenced by a block (signals, or list of signals).
+    """
+    signals = []
+    for name in names:
+        obj = block.symdict.get(name)
+        if isinstance(obj, _Signal):
+            signals.append(obj)
+        elif isinstance(obj, list):
+            signals.extend(s for s in obj if isinstance(s, _Signal))
+    return signals
+
+
+def _target_signals(block, target):
+    """
+    Return the signals of an assignment target: 'x.next', 'x[i].next' (all the signals
+    of the list), or an attribute of an interface ('port.clk.next').
+    """
+    def resolve(node):
+        if isinstance(node, ast.Name):
+            return block.symdict.get(node.id)
+        if isinstance(node, ast.Attribute):
+            return getattr(resolve(node.value), node.attr, None)
+        if isinstance(node, ast.Subscript):
+            return resolve(node.value)
+        return None
+
+    if not (isinstance(target, ast.Attribute) and target.attr == 'next'):
+        return []
+    obj = resolve(target.value)
+    if isinstance(obj, _Signal):
+        return [obj]
+    if isinstance(obj, list):
+        return [s for s in obj if isinstance(s, _Signal)]
+    return []
+
+
+def _strongly_connected(graph):
+    """
+    Tarjan's algorithm. Return the SCCs of the graph, in reverse topological order.
+    """
+    index    = {}
+    lowlink  = {}
+    stack    = []
+    on_stack = set()
+    sccs     = []
+    counter  = [0]
+
+    for root in range(len(graph)):
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = lowlink[root] = counter[0]
+        counter[0] += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = counter[0]
+                    counter[0] += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(graph[child])))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    sccs.append(sorted(scc))
+    return sccs
+
+
+def restart(blocks, signals, memories=()):
+    """
+    Restore an elaborated design to its initial state, to run it again without a
+    new elaboration (a suite of programs). Works with both engines:
+
+    - The signals take their initial values, and the pending updates are dropped.
+    - The memories (objects with a clear() method, like RAMArray) are cleared.
+    - The generators of the blocks are restarted (event-driven simulation).
+
+    With the cycle-based engine, call CycleSimulation.reset() after it.
+
+    :param blocks:   The elaborated design (flattened)
+    :param signals:  Signals created by the elaboration
+    :param memories: Memories of the design, cleared in place
+    """
+    for signal in signals:
+        signal._clear()
+    del _siglist[:]
+    for memory in memories:
+        memory.clear()
+    for block in blocks:
+        block.gen = block.genfunc()
+
+
+class CycleSimulation(object):
+    """
+    Cycle-based simulator for synchronous designs.
+
+    The elaborated design is split in sequential blocks (@always on a positive edge
+    of the clock, or of a clock derived from it by a combinational assignment) and
+    combinational blocks (@always_comb). The combinational blocks are levelized once,
+    and a settle function is generated with a static evaluation order. Each cycle:
+
+    - Execute all the sequential blocks (they read the values before the edge).
+    - Commit the new values.
+    - Settle the combinational logic: a single pass, in topological order. A block
+      is evaluated only if one of its inputs changed. Combinational loops between
+      blocks are iterated until convergence.
+
+    Testbench processes (delays, generators) are not supported: the caller drives the
+    inputs between cycles (with the 'next' attribute), and checks the outputs. The
+    simulation time (now()) is the number of executed cycles.
+
+    :ivar cycle: Number of executed clock cycles
+    """
+    def __init__(self, clk, *args):
+        """
+        Elaborate the design, and generate the settle function.
+
+        :param clk:  The clock signal
+        :param args: The design instances
+        """
+        self.clk   = clk
+        self.cycle = 0
+        _simulator._time = 0
+
+        self._seq  = []
+        comb       = []
+        for block in _flatten(*args):
+            if isinstance(block, _AlwaysComb):
+                comb.append(block)
+            elif isinstance(block, _Always) and all(isinstance(s, _PosedgeWaiterList) for s in block.senslist):
+                self._seq.append(block)
+            else:
+                raise SimulationError("Cycle-based simulation: unsupported block '{0}' in '{1}'".format(block.name, block.callername))
+
+        inputs  = [_signals_of(block, block.inputs) for block in comb]
+        outputs = [_signals_of(block, block.outputs) for block in comb]
+        self._check_clocks(comb, inputs, outputs)
+
+        # Readers: signal -> combinational blocks. Dependency graph: driver -> readers.
+        self._readers = {}
+        for ii, signals in enumerate(inputs):
+            for signal in signals:
+                self._readers.setdefault(id(signal), set()).add(ii)
+        graph = []
+        for signals in outputs:
+            graph.append(sorted(set(reader for signal in signals for reader in self._readers.get(id(signal), ()))))
+        self._readers = dict((key, tuple(sorted(value))) for key, value in self._readers.items())
+
+        sccs          = list(reversed(_strongly_connected(graph)))
+        self.levels   = [[comb[ii] for ii in scc] for scc in sccs]
+        self._dirty   = [True] * len(comb)
+        self._settle  = self._generate(comb, sccs, graph)
+        self._seq_fns = [block.func for block in self._seq]
+
+    def _check_clocks(self, comb, inputs, outputs):
+        """
+        Sequential blocks must be triggered by the clock, or by a copy of the clock:
+        a signal assigned with the clock ('x.next = clk') by a combinational block.
+        Any other use of the clock in a combinational block (gated or derived clock)
+        is rejected.
+        """
+        clocks = {id(self.clk._posedgeWaiters)}
+        for ii, block in enumerate(comb):
+            if any(s is self.clk for s in inputs[ii]):
+                clocks.update(id(s._posedgeWaiters) for s in self._clock_copies(block))
+        for block in self._seq:
+            for edge in block.senslist:
+                if id(edge) not in clocks:
+                    raise SimulationError("Cycle-based simulation: block '{0}' in '{1}' is not synchronous with the clock".format(
+                        block.name, block.callername))
+
+    def _clock_copies(self, block):
+        """
+        Return the signals assigned with the clock by a combinational block (unconditional
+        assignments, or in a for loop). Raise an error if the block reads the clock in any
+        other way. The source of a wrapped function (profiler) is the one of the original.
+        """
+        func = block.func
+        while hasattr(func, '__wrapped__'):
+            func = func.__wrapped__
+        tree       = _makeAST(func)
+        copies     = []
+        direct     = set()
+        statements = list(tree.body[0].body)
+        while statements:
+            node = statements.pop()
+            if isinstance(node, ast.For):
+                statements.extend(node.body)
+            elif isinstance(node, ast.Assign) and self._is_clock(block, node.value):
+                direct.add(id(node.value))
+                for target in node.targets:
+                    copies.extend(_target_signals(block, target))
+        for node in ast.walk(tree):
+            if self._is_clock(block, node) and id(node) not in direct:
+                raise SimulationError("Cycle-based simulation: gated or derived clock in block '{0}' in '{1}'".format(
+                    block.name, block.callername))
+        if not copies:
+            raise SimulationError("Cycle-based simulation: block '{0}' in '{1}' reads the clock, but does not copy it".format(
+                block.name, block.callername))
+        return copies
+
+    def _is_clock(self, block, node):
+        return isinstance(node, ast.Name) and block.symdict.get(node.id) is self.clk
+
+    def _generate(self, comb, sccs, graph):
+        """
+        Generate the settle function: one pass over the levelized blocks.
+        """
+        lines = ['def _settle():', '    pass']
+        for scc in sccs:
+            loop = len(scc) > 1 or scc[0] in graph[scc[0]]
+            if loop:
+                lines.append('    _n = 0')
+                lines.append('    while {0}:'.format(' or '.join('_d[{0}]'.format(ii) for ii in scc)))
+                lines.append('        _n += 1')
+                lines.append('        if _n > {0}:'.format(MAX_ITERATIONS))
+                lines.append('            _loop_error({0})'.format(scc))
+                indent = '        '
+            else:
+                indent = '    '
+            for ii in scc:
+                lines.append('{0}if _d[{1}]:'.format(indent, ii))
+                lines.append('{0}    _d[{1}] = False'.format(indent, ii))
+                lines.append('{0}    _c{1}()'.format(indent, ii))
+                lines.append('{0}    _commit()'.format(indent))
+
+        namespace = dict(('_c{0}'.format(ii), block.func) for ii, block in enumerate(comb))
+        namespace['_d']          = self._dirty
+        namespace['_commit']     = self._commit
+        namespace['_loop_error'] = lambda scc: self._loop_error([comb[ii] for ii in scc])
+        exec(compile('\n'.join(lines), '<cycle_sim>', 'exec'), namespace)
+        return namespace['_settle']
+
+    @staticmethod
+    def _loop_error(blocks):
+        raise SimulationError("Cycle-based simulation: combinational loop does not converge: {0}".format(
+            ', '.join('{0}.{1}'.format(block.callername, block.name) for block in blocks)))
+
+    def _commit(self):
+        """
+        Update the signals, and mark the readers of the modified signals.
+        """
+        readers = self._readers
+        dirty   = self._dirty
+        for signal in _siglist:
+            if signal._val != signal._next:
+                signal._update()
+                for ii in readers.get(id(signal), ()):
+                    dirty[ii] = True
+        del _siglist[:]
+
+    def reset(self, cycle=0):
+        """
+        Restart the simulation: evaluate all the combinational blocks in the next
+        cycle, and set the cycle counter. The state of the design (signals and
+        memories) must be restored by the caller.
+
+        :param cycle: Initial value of the cycle counter
+        """
+        del _siglist[:]
+        self._dirty[:]   = [True] * len(self._dirty)
+        self.cycle       = cycle
+        _simulator._time = cycle
+
+    def step(self):
+        """
+        Execute one clock cycle.
+        """
+        self._commit()
+        self._settle()
+        for func in self._seq_fns:
+            func()
+        self._commit()
+        self._settle()
+        self.cycle += 1
+        _simulator._time = self.cycle
+
+    def run(self, cycles, stop=None):
+        """
+        Execute a number of cycles.
+
+        :param cycles: Max number of cycles
+        :param stop:   Optional function, called after each cycle. Return True to stop the simulation.
+        :returns:      The number of executed cycles
+        """
+        for n in range(cycles):
+            self.step()
+            if stop is not None and stop():
+                return n + 1
+        return cycles
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 200
+# flycheck-flake8rc: ".flake8rc"
+# End:
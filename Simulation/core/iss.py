@@ -0,0 +1,543 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.consts import Consts
+from Core.csr import CSRAddressMap
+from Core.csr import CSRExceptionCode
+from Core.csr import CSRModes
+from Core.csr import CSRCounterEvent
+from Core.instructions import Opcodes
+from Core.instructions import BranchFunct3
+from Core.instructions import LoadFunct3
+from Core.instructions import StoreFunct3
+from Core.instructions import ArithmeticFunct3
+from Core.instructions import FenceFunct3
+from Core.instructions import SystemFunct3
+from Core.instructions import PrivFunct12
+from Core.instructions import MulDivFunct
+from Simulation.core.memory import LoadImage
+
+MASK32 = 0xFFFFFFFF
+
+
+def _signed(value):
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
+def _sext(value, nbits):
+    sign = 1 << (nbits - 1)
+    return ((value & (sign - 1)) - (value & sign)) & MASK32
+
+
+class ISSTrap(Exception):
+    """
+    Raised by the instruction handlers to take a synchronous exception.
+    """
+    def __init__(self, code, badaddr=None):
+        Exception.__init__(self, code)
+        self.code    = code
+        self.badaddr = badaddr
+
+
+class ISS:
+    """
+    Functional (instruction-accurate) simulator for the RV32IM core.
+
+    Execute one instruction per step, with the same decoding rules, CSR map,
+    exception codes and trap behavior of the RTL (Priviledge mode v1.7).
+    There is no pipeline, cache or bus timing: the cycle, time and
+    mtime counters advance one unit per executed instruction, and the
+    performance counters (hpmcounter) only keep the written values.
+
+    :ivar pc:      Program counter
+    :ivar regs:    Register file (32 unsigned words)
+    :ivar memory:  Memory (list of words)
+    :ivar toHost:  The mtohost register
+    :ivar instret: Number of executed instructions
+    """
+    def __init__(self, size_mem, hex_file, bytes_x_line):
+        """
+        Load the memory image and reset the model.
+
+        :param size_mem:     Memory size (bytes)
+        :param hex_file:     HEX or ELF file to load
+        :param bytes_x_line: Data width in bytes (HEX file)
+        """
+        assert not (size_mem & (size_mem - 1)), "Memory size must be a power of 2"
+        self.memory    = [0] * (size_mem >> 2)
+        self.addr_mask = (size_mem >> 2) - 1
+        LoadImage(size_mem, hex_file, bytes_x_line, self.memory)
+        self._decoded  = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Same state of the CSR file and the PC after a reset.
+        """
+        self.pc           = Consts.START_ADDR
+        self.regs         = [0] * 32
+        self.priv_stack   = 0b000110
+        self.mtvec        = Consts.MTVEC
+        self.mtimecmp     = 0
+        self.mscratch     = 0
+        self.mepc         = 0
+        self.mecode       = 0
+        self.mint         = 0
+        self.mbadaddr     = 0
+        self.mtip         = 0
+        self.msip         = 0
+        self.mtie         = 0
+        self.msie         = 0
+        self.mcie         = 0
+        self.hpmcounter   = [0] * CSRCounterEvent.N_EVENTS
+        self.hpm_overflow = 0
+        self.toHost       = 0
+        self.fromHost     = 0
+        self.cycle        = 0
+        self.time         = 0
+        self.mtime        = 0
+        self.instret      = 0
+
+    # ----------------------------------------------------------------------
+    # Memory
+    def load_word(self, addr):
+        return self.memory[(addr >> 2) & self.addr_mask]
+
+    def store_word(self, addr, data, sel):
+        index = (addr >> 2) & self.addr_mask
+        mask  = sum(0xFF << (8 * byte) for byte in range(4) if sel & (1 << byte))
+        self.memory[index] = (self.memory[index] & ~mask & MASK32) | (data & mask)
+
+    # ----------------------------------------------------------------------
+    # CSR file
+    @property
+    def prv(self):
+        return (self.priv_stack >> 1) & 0x03
+
+    def _csr_table(self):
+        m = CSRAddressMap
+        cycle, time, instret, mtime = self.cycle, self.time, self.instret, self.mtime
+        table = {m.CSR_ADDR_CYCLE:     cycle & MASK32,
+                 m.CSR_ADDR_TIME:      time & MASK32,
+                 m.CSR_ADDR_INSTRET:   instret & MASK32,
+                 m.CSR_ADDR_CYCLEH:    cycle >> 32,
+                 m.CSR_ADDR_TIMEH:     time >> 32,
+                 m.CSR_ADDR_INSTRETH:  instret >> 32,
+                 m.CSR_ADDR_MCPUID:    (1 << 20) | (1 << 8),
+                 m.CSR_ADDR_MIMPID:    0x8000,
+                 m.CSR_ADDR_MHARTID:   0,
+                 m.CSR_ADDR_MSTATUS:   self.priv_stack,
+                 m.CSR_ADDR_MTVEC:     self.mtvec,
+                 m.CSR_ADDR_MTDELEG:   0,
+                 m.CSR_ADDR_MIE:       (self.mcie << 11) | (self.mtie << 7) | (self.msie << 3),
+                 m.CSR_ADDR_MTIMECMP:  self.mtimecmp,
+                 m.CSR_ADDR_MTIME:     mtime & MASK32,
+                 m.CSR_ADDR_MTIMEH:    mtime >> 32,
+                 m.CSR_ADDR_MSCRATCH:  self.mscratch,
+                 m.CSR_ADDR_MEPC:      self.mepc,
+                 m.CSR_ADDR_MCAUSE:    (self.mint << 31) | self.mecode,
+                 m.CSR_ADDR_MBADADDR:  self.mbadaddr,
+                 m.CSR_ADDR_MIP:       ((self.hpm_overflow != 0) << 11) | (self.mtip << 7) | (self.msip << 3),
+                 m.CSR_ADDR_CYCLEW:    cycle & MASK32,
+                 m.CSR_ADDR_TIMEW:     time & MASK32,
+                 m.CSR_ADDR_INSTRETW:  instret & MASK32,
+                 m.CSR_ADDR_CYCLEHW:   cycle >> 32,
+                 m.CSR_ADDR_TIMEHW:    time >> 32,
+                 m.CSR_ADDR_INSTRETHW: instret >> 32,
+                 m.CSR_ADDR_TO_HOST:   self.toHost,
+                 m.CSR_ADDR_FROM_HOST: self.fromHost}
+        table[m.CSR_ADDR_MHPMOVF] = self.hpm_overflow
+        for ii, value in enumerate(self.hpmcounter, CSRCounterEvent.FIRST_COUNTER):
+            table[m.CSR_ADDR_HPMCOUNT + ii]  = value
+            table[m.CSR_ADDR_MHPMCOUNT + ii] = value
+        return table
+
+    def read_csr(self, addr):
+        """
+        Return the CSR value, or None for undefined addresses.
+        """
+        return self._csr_table().get(addr)
+
+    def write_csr(self, addr, data):
+        """
+        Write a CSR. Read-only and undefined addresses are ignored.
+        """
+        m = CSRAddressMap
+        if addr == m.CSR_ADDR_MSTATUS:
+            self.priv_stack = data & 0x3F
+        elif addr == m.CSR_ADDR_MTVEC:
+            self.mtvec = data & ~0x03
+        elif addr == m.CSR_ADDR_MTIMECMP:
+            self.mtimecmp = data
+            self.mtip     = 0
+        elif addr == m.CSR_ADDR_MTIME:
+            self.mtime = (self.mtime & ~MASK32) | data
+        elif addr == m.CSR_ADDR_MTIMEH:
+            self.mtime = (self.mtime & MASK32) | (data << 32)
+        elif addr == m.CSR_ADDR_MSCRATCH:
+            self.mscratch = data
+        elif addr == m.CSR_ADDR_MEPC:
+            self.mepc = data & ~0x03
+        elif addr == m.CSR_ADDR_MCAUSE:
+            self.mecode = data & 0x0F
+            self.mint   = data >> 31
+        elif addr == m.CSR_ADDR_MBADADDR:
+            self.mbadaddr = data
+        elif addr == m.CSR_ADDR_MIP:
+            self.mtip = (data >> 7) & 0x01
+            self.msip = (data >> 3) & 0x01
+        elif addr == m.CSR_ADDR_MIE:
+            self.mcie = (data >> 11) & 0x01
+            self.mtie = (data >> 7) & 0x01
+            self.msie = (data >> 3) & 0x01
+        elif addr in (m.CSR_ADDR_CYCLE, m.CSR_ADDR_CYCLEW):
+            self.cycle = (self.cycle & ~MASK32) | data
+        elif addr in (m.CSR_ADDR_CYCLEH, m.CSR_ADDR_CYCLEHW):
+            self.cycle = (self.cycle & MASK32) | (data << 32)
+        elif addr in (m.CSR_ADDR_TIME, m.CSR_ADDR_TIMEW):
+            self.time = (self.time & ~MASK32) | data
+        elif addr in (m.CSR_ADDR_TIMEH, m.CSR_ADDR_TIMEHW):
+            self.time = (self.time & MASK32) | (data << 32)
+        elif addr in (m.CSR_ADDR_INSTRET, m.CSR_ADDR_INSTRETW):
+            self.instret = (self.instret & ~MASK32) | data
+        elif addr in (m.CSR_ADDR_INSTRETH, m.CSR_ADDR_INSTRETHW):
+            self.instret = (self.instret & MASK32) | (data << 32)
+        elif addr == m.CSR_ADDR_TO_HOST:
+            self.toHost = data
+        elif addr == m.CSR_ADDR_FROM_HOST:
+            self.fromHost = data
+        elif addr == m.CSR_ADDR_MHPMOVF:
+            self.hpm_overflow = data & ((1 << CSRCounterEvent.N_EVENTS) - 1)
+        elif 0 <= addr - m.CSR_ADDR_MHPMCOUNT - CSRCounterEvent.FIRST_COUNTER < CSRCounterEvent.N_EVENTS:
+            self.hpmcounter[addr - m.CSR_ADDR_MHPMCOUNT - CSRCounterEvent.FIRST_COUNTER] = data
+
+    # ----------------------------------------------------------------------
+    # Traps
+    def _trap(self, code, badaddr):
+        """
+        All exceptions to machine mode. Push the priviledge stack.
+        """
+        handler         = (self.mtvec + (self.prv << 6)) & MASK32
+        self.mepc       = self.pc & ~0x03
+        self.mecode     = code
+        self.mint       = 0
+        if badaddr is not None:
+            self.mbadaddr = badaddr & MASK32
+        self.priv_stack = ((self.priv_stack << 3) & 0x38) | (CSRModes.PRV_M << 1)
+        self.pc         = handler
+
+    def _interrupt(self, code):
+        """
+        Timer or counter interrupt. Taken if enabled, and the core is in user mode or interrupts are enabled.
+        """
+        handler         = (self.mtvec + (self.prv << 6)) & MASK32
+        self.mepc       = self.pc & ~0x03
+        self.mecode     = code
+        self.mint       = 1
+        self.priv_stack = ((self.priv_stack << 3) & 0x38) | (CSRModes.PRV_M << 1)
+        self.pc         = handler
+
+    # ----------------------------------------------------------------------
+    # Decoder
+    def decode(self, instruction):
+        """
+        Decode an instruction.
+
+        Return a tuple (handler, rd, rs1, rs2, imm). The decoding follows the
+        same rules of the control unit (check DECODE_TABLE in Core.cpath).
+        """
+        opcode = instruction & 0x7F
+        rd     = (instruction >> 7) & 0x1F
+        funct3 = (instruction >> 12) & 0x07
+        rs1    = (instruction >> 15) & 0x1F
+        rs2    = (instruction >> 20) & 0x1F
+        funct7 = instruction >> 25
+        imm_i  = _sext(instruction >> 20, 12)
+        imm_s  = _sext(((instruction >> 20) & 0xFE0) | rd, 12)
+        imm_sb = _sext(((instruction >> 19) & 0x1000) | ((instruction << 4) & 0x800) | ((instruction >> 20) & 0x7E0) | ((instruction >> 7) & 0x1E), 13)
+        imm_u  = instruction & 0xFFFFF000
+        imm_uj = _sext(((instruction >> 11) & 0x100000) | (instruction & 0xFF000) | ((instruction >> 9) & 0x800) | ((instruction >> 20) & 0x7FE), 21)
+
+        if opcode == Opcodes.RV32_LUI:
+            return (self._lui, rd, rs1, rs2, imm_u)
+        elif opcode == Opcodes.RV32_AUIPC:
+            return (self._auipc, rd, rs1, rs2, imm_u)
+        elif opcode == Opcodes.RV32_JAL:
+            return (self._jal, rd, rs1, rs2, imm_uj)
+        elif opcode == Opcodes.RV32_JALR:
+            return (self._jalr, rd, rs1, rs2, imm_i)
+        elif opcode == Opcodes.RV32_BRANCH:
+            branches = {BranchFunct3.RV32_F3_BEQ: lambda a, b: a == b,
+                        BranchFunct3.RV32_F3_BNE: lambda a, b: a != b,
+                        BranchFunct3.RV32_F3_BLT: lambda a, b: _signed(a) < _signed(b),
+                        BranchFunct3.RV32_F3_BGE: lambda a, b: _signed(a) >= _signed(b),
+                        BranchFunct3.RV32_F3_BLTU: lambda a, b: a < b,
+                        BranchFunct3.RV32_F3_BGEU: lambda a, b: a >= b}
+            if funct3 in branches:
+                return (self._branch, branches[funct3], rs1, rs2, imm_sb)
+        elif opcode == Opcodes.RV32_LOAD:
+            loads = {LoadFunct3.RV32_F3_LB:  (Consts.MT_B, 8),
+                     LoadFunct3.RV32_F3_LH:  (Consts.MT_H, 16),
+                     LoadFunct3.RV32_F3_LW:  (Consts.MT_W, 0),
+                     LoadFunct3.RV32_F3_LBU: (Consts.MT_BU, 0),
+                     LoadFunct3.RV32_F3_LHU: (Consts.MT_HU, 0)}
+            if funct3 in loads:
+                return (self._load, rd, rs1, loads[funct3], imm_i)
+        elif opcode == Opcodes.RV32_STORE:
+            if funct3 in (StoreFunct3.RV32_F3_SB, StoreFunct3.RV32_F3_SH, StoreFunct3.RV32_F3_SW):
+                return (self._store, funct3, rs1, rs2, imm_s)
+        elif opcode == Opcodes.RV32_IMM:
+            return (self._alu_imm, rd, rs1, self._alu_function(funct3, instruction), imm_i)
+        elif opcode == Opcodes.RV32_OP:
+            if funct7 == MulDivFunct.RV32_F7_MUL_DIV:
+                return (self._alu_reg, rd, rs1, rs2, self._muldiv_function(funct3))
+            return (self._alu_reg, rd, rs1, rs2, self._alu_function(funct3, instruction, True))
+        elif opcode == Opcodes.RV32_FENCE:
+            if funct3 in (FenceFunct3.RV32_F3_FENCE, FenceFunct3.RV32_F3_FENCE_I):
+                return (self._nop, rd, rs1, rs2, 0)
+        elif opcode == Opcodes.RV32_SYSTEM:
+            funct12 = instruction >> 20
+            if funct3 == SystemFunct3.RV32_F3_PRIV:
+                if funct12 == PrivFunct12.RV32_F12_ECALL:
+                    return (self._ecall, rd, rs1, rs2, 0)
+                elif funct12 == PrivFunct12.RV32_F12_EBREAK:
+                    return (self._ebreak, rd, rs1, rs2, 0)
+                elif funct12 == PrivFunct12.RV32_F12_ERET:
+                    return (self._eret, rd, rs1, rs2, 0)
+            elif funct3 in (SystemFunct3.RV32_F3_CSRRW, SystemFunct3.RV32_F3_CSRRS, SystemFunct3.RV32_F3_CSRRC,
+                            SystemFunct3.RV32_F3_CSRRWI, SystemFunct3.RV32_F3_CSRRSI, SystemFunct3.RV32_F3_CSRRCI):
+                return (self._csr, rd, rs1, funct3, funct12)
+        return (self._illegal, rd, rs1, rs2, 0)
+
+    @staticmethod
+    def _alu_function(funct3, instruction, reg=False):
+        """
+        Only bit 30 selects SUB/SRA (same as the control unit).
+        """
+        alt = (instruction >> 30) & 0x01
+        if funct3 == ArithmeticFunct3.RV32_F3_ADD_SUB:
+            if reg and alt:
+                return lambda a, b: (a - b) & MASK32
+            return lambda a, b: (a + b) & MASK32
+        elif funct3 == ArithmeticFunct3.RV32_F3_SLL:
+            return lambda a, b: (a << (b & 0x1F)) & MASK32
+        elif funct3 == ArithmeticFunct3.RV32_F3_SLT:
+            return lambda a, b: int(_signed(a) < _signed(b))
+        elif funct3 == ArithmeticFunct3.RV32_F3_SLTU:
+            return lambda a, b: int(a < b)
+        elif funct3 == ArithmeticFunct3.RV32_F3_XOR:
+            return lambda a, b: a ^ b
+        elif funct3 == ArithmeticFunct3.RV32_F3_SRL_SRA:
+            if alt:
+                return lambda a, b: (_signed(a) >> (b & 0x1F)) & MASK32
+            return lambda a, b: a >> (b & 0x1F)
+        elif funct3 == ArithmeticFunct3.RV32_F3_OR:
+            return lambda a, b: a | b
+        return lambda a, b: a & b
+
+    @staticmethod
+    def _muldiv_function(funct3):
+        def div(a, b):
+            if b == 0:
+                return MASK32
+            if a == -2**31 and b == -1:
+                return a & MASK32
+            q = abs(a) // abs(b)
+            return (-q if (a < 0) != (b < 0) else q) & MASK32
+
+        def rem(a, b):
+            if b == 0:
+                return a & MASK32
+            if a == -2**31 and b == -1:
+                return 0
+            r = abs(a) % abs(b)
+            return (-r if a < 0 else r) & MASK32
+
+        functions = {MulDivFunct.RV32_F3_MUL: lambda a, b: (a * b) & MASK32,
+                     MulDivFunct.RV32_F3_MULH: lambda a, b: ((_signed(a) * _signed(b)) >> 32) & MASK32,
+                     MulDivFunct.RV32_F3_MULHSU: lambda a, b: ((_signed(a) * b) >> 32) & MASK32,
+                     MulDivFunct.RV32_F3_MULHU: lambda a, b: (a * b) >> 32,
+                     MulDivFunct.RV32_F3_DIV: lambda a, b: div(_signed(a), _signed(b)),
+                     MulDivFunct.RV32_F3_DIVU: lambda a, b: (a // b) if b else MASK32,
+                     MulDivFunct.RV32_F3_REM: lambda a, b: rem(_signed(a), _signed(b)),
+                     MulDivFunct.RV32_F3_REMU: lambda a, b: (a % b) if b else a}
+        return functions[funct3]
+
+    # ----------------------------------------------------------------------
+    # Instruction handlers: update the register file, and return the next PC.
+    def _write_rd(self, rd, value):
+        if rd != 0:
+            self.regs[rd] = value
+
+    def _jump(self, target):
+        if target & 0x03:
+            # Misaligned target: the jump instruction takes the trap.
+            raise ISSTrap(CSRExceptionCode.E_INST_ADDR_MISALIGNED, self.pc)
+        return target
+
+    def _nop(self, rd, rs1, rs2, imm):
+        return self.pc + 4
+
+    def _illegal(self, rd, rs1, rs2, imm):
+        raise ISSTrap(CSRExceptionCode.E_ILLEGAL_INST)
+
+    def _lui(self, rd, rs1, rs2, imm):
+        self._write_rd(rd, imm)
+        return self.pc + 4
+
+    def _auipc(self, rd, rs1, rs2, imm):
+        self._write_rd(rd, (self.pc + imm) & MASK32)
+        return self.pc + 4
+
+    def _jal(self, rd, rs1, rs2, imm):
+        target = self._jump((self.pc + imm) & MASK32)
+        self._write_rd(rd, (self.pc + 4) & MASK32)
+        return target
+
+    def _jalr(self, rd, rs1, rs2, imm):
+        target = self._jump((self.regs[rs1] + imm) & MASK32 & ~0x01)
+        self._write_rd(rd, (self.pc + 4) & MASK32)
+        return target
+
+    def _branch(self, condition, rs1, rs2, imm):
+        if condition(self.regs[rs1], self.regs[rs2]):
+            return self._jump((self.pc + imm) & MASK32)
+        return self.pc + 4
+
+    def _load(self, rd, rs1, typ, imm):
+        mem_type, sign_bits = typ
+        addr = (self.regs[rs1] + imm) & MASK32
+        half = mem_type in (Consts.MT_H, Consts.MT_HU) and addr & 0x01
+        word = mem_type == Consts.MT_W and addr & 0x03
+        if half or word:
+            raise ISSTrap(CSRExceptionCode.E_LOAD_ADDR_MISALIGNED, addr)
+        data = self.load_word(addr)
+        if mem_type in (Consts.MT_B, Consts.MT_BU):
+            data = (data >> (8 * (addr & 0x03))) & 0xFF
+        elif mem_type in (Consts.MT_H, Consts.MT_HU):
+            data = (data >> (16 * ((addr >> 1) & 0x01))) & 0xFFFF
+        if sign_bits:
+            data = _sext(data, sign_bits)
+        self._write_rd(rd, data)
+        return self.pc + 4
+
+    def _store(self, funct3, rs1, rs2, imm):
+        addr = (self.regs[rs1] + imm) & MASK32
+        data = self.regs[rs2]
+        if funct3 == StoreFunct3.RV32_F3_SB:
+            self.store_word(addr, (data & 0xFF) * 0x01010101, 1 << (addr & 0x03))
+        elif funct3 == StoreFunct3.RV32_F3_SH:
+            if addr & 0x01:
+                raise ISSTrap(CSRExceptionCode.E_AMO_ADDR_MISALIGNED, addr)
+            self.store_word(addr, (data & 0xFFFF) * 0x00010001, 0b1100 if addr & 0x02 else 0b0011)
+        else:
+            if addr & 0x03:
+                raise ISSTrap(CSRExceptionCode.E_AMO_ADDR_MISALIGNED, addr)
+            self.store_word(addr, data, 0b1111)
+        return self.pc + 4
+
+    def _alu_imm(self, rd, rs1, function, imm):
+        self._write_rd(rd, function(self.regs[rs1], imm))
+        return self.pc + 4
+
+    def _alu_reg(self, rd, rs1, rs2, function):
+        self._write_rd(rd, function(self.regs[rs1], self.regs[rs2]))
+        return self.pc + 4
+
+    def _ecall(self, rd, rs1, rs2, imm):
+        raise ISSTrap(CSRExceptionCode.E_ECALL_FROM_U + self.prv)
+
+    def _ebreak(self, rd, rs1, rs2, imm):
+        raise ISSTrap(CSRExceptionCode.E_BREAKPOINT)
+
+    def _eret(self, rd, rs1, rs2, imm):
+        if self.prv == CSRModes.PRV_U:
+            # ERET is ignored in user mode.
+            return self.pc + 4
+        self.priv_stack = (1 << 3) | (self.priv_stack >> 3)
+        return self.mepc
+
+    def _csr(self, rd, rs1, funct3, addr):
+        """
+        CSR access. Same checks of the CSR file: read-only region,
+        priviledge level, and undefined registers.
+        """
+        immediate = funct3 & 0b100
+        cmd       = funct3 & 0b011
+        wdata     = rs1 if immediate else self.regs[rs1]
+        write     = not (funct3 != SystemFunct3.RV32_F3_CSRRW and rs1 == 0)
+        rdata     = self.read_csr(addr)
+        if rdata is None or (write and (addr >> 10) == 0b11) or ((addr >> 8) & 0x03) > self.prv:
+            raise ISSTrap(CSRExceptionCode.E_ILLEGAL_INST)
+        if write:
+            if cmd == SystemFunct3.RV32_F3_CSRRS:
+                wdata = rdata | wdata
+            elif cmd == SystemFunct3.RV32_F3_CSRRC:
+                wdata = rdata & ~wdata & MASK32
+            self.write_csr(addr, wdata)
+        self._write_rd(rd, rdata)
+        return self.pc + 4
+
+    # ----------------------------------------------------------------------
+    def step(self):
+        """
+        Execute one instruction.
+        """
+        self.cycle   += 1
+        self.time    += 1
+        self.mtime   += 1
+        self.instret += 1
+        expired = (self.mtime & MASK32) == self.mtimecmp
+        if expired:
+            self.mtip = 1
+        timer   = self.mtie and self.mtip
+        counter = self.mcie and self.hpm_overflow
+        if (timer or counter) and (self.prv == CSRModes.PRV_U or (self.priv_stack & 0x01)):
+            self._interrupt(CSRExceptionCode.I_TIMER if timer else CSRExceptionCode.I_COUNTER)
+            return
+
+        instruction = self.load_word(self.pc)
+        decoded     = self._decoded.get(instruction)
+        if decoded is None:
+            decoded = self.decode(instruction)
+            self._decoded[instruction] = decoded
+        handler, a, b, c, d = decoded
+        try:
+            self.pc = handler(a, b, c, d) & MASK32
+        except ISSTrap as trap:
+            self._trap(trap.code, trap.badaddr)
+
+    def run(self, max_instructions):
+        """
+        Execute until a write to toHost, or after max_instructions.
+
+        Return the value written to toHost, or None in case of timeout.
+        """
+        for _ in range(max_instructions):
+            self.step()
+            if self.toHost != 0:
+                return self.toHost
+        return None
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 200
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -20,7 +20,11 @@
 # THE SOFTWARE.
 from math import ceil
 from math import log
+from array import array
+import mmap
 import os.path
+import struct
+import sys
 from myhdl import Signal
 from myhdl import modbv
 from myhdl import always_comb
@@ -29,6 +33,115 @@ from myhdl import instances
 from myhdl import enum
 from Core.wishbone import WishboneSlave
 from Core.wishbone import WishboneSlaveGenerator
+from Core.consts import Consts
+
+
+# Paged memory: 4 KiB pages (1024 words).
+PAGE_SHIFT = 10
+PAGE_WORDS = 1 << PAGE_SHIFT
+PAGE_MASK  = PAGE_WORDS - 1
+WORD_CODE  = 'I' if array('I').itemsize == 4 else 'L'
+
+
+class PagedMemory(object):
+    """
+    Sparse memory, addressed by word. The pages are allocated on the first
+    write: unallocated pages read as zero, or from a binary image mapped in
+    memory (mmap). Use it instead of a list, for large address spaces.
+
+    :ivar pages: Allocated pages: {page number: array of words}
+    """
+    def __init__(self, n_words):
+        """
+        :param n_words: Size of the address space (words)
+        """
+        self.n_words = n_words
+        self.pages   = {}
+        self._image  = None
+
+    def __len__(self):
+        return self.n_words
+
+    def __getitem__(self, addr):
+        addr = int(addr)
+        page = self.pages.get(addr >> PAGE_SHIFT)
+        if page is None:
+            if self._image is None:
+                return 0
+            page = self._allocate(addr >> PAGE_SHIFT)
+        return page[addr & PAGE_MASK]
+
+    def __setitem__(self, addr, value):
+        addr = int(addr)
+        page = self.pages.get(addr >> PAGE_SHIFT)
+        if page is None:
+            page = self._allocate(addr >> PAGE_SHIFT)
+        page[addr & PAGE_MASK] = int(value)
+
+    def _allocate(self, index):
+        """
+        New page: zero, or a copy of the image.
+        """
+        assert 0 <= index < -(-self.n_words // PAGE_WORDS), "Error, address out of memory: page {0:#x}".format(index)
+        page = array(WORD_CODE)
+        if self._image is not None:
+            page.frombytes(self._image[index << (PAGE_SHIFT + 2):(index + 1) << (PAGE_SHIFT + 2)])
+            if sys.byteorder == 'big':
+                page.byteswap()
+        page.extend([0] * (PAGE_WORDS - len(page)))
+        self.pages[index] = page
+        return page
+
+    def clear(self):
+        """
+        Release all the pages, and the image.
+        """
+        self.pages.clear()
+        if self._image is not None:
+            self._image.close()
+        self._image = None
+
+    def load(self, addr, words):
+        """
+        Store a list of words, starting at a word address. Pages of zeros are
+        allocated only if they exist.
+        """
+        start = addr
+        end   = addr + len(words)
+        assert end <= self.n_words, "Error, image out of memory: {0:#x} > {1:#x}".format(end << 2, self.n_words << 2)
+        while addr < end:
+            index = addr >> PAGE_SHIFT
+            size  = min(end, (index + 1) << PAGE_SHIFT) - addr
+            chunk = words[addr - start:addr - start + size]
+            if index in self.pages or self._image is not None or any(chunk):
+                page = self.pages.get(index)
+                if page is None:
+                    page = self._allocate(index)
+                page[addr & PAGE_MASK:(addr & PAGE_MASK) + size] = array(WORD_CODE, chunk)
+            addr += size
+
+    def map(self, bin_file):
+        """
+        Use a binary image (little-endian words, starting at address 0) as the
+        initial content of the memory. The file is not modified.
+        """
+        self.clear()
+        with open(bin_file, 'rb') as f:
+            self._image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def StoreWords(size_mem, memory, segments):
+    """
+    Clear the memory, and store a list of segments: (word address, words).
+    """
+    if isinstance(memory, PagedMemory):
+        memory.clear()
+        for addr, words in segments:
+            memory.load(addr, words)
+    else:
+        memory[:] = [0] * (size_mem >> 2)
+        for addr, words in segments:
+            memory[addr:addr + len(words)] = words
 
 
 def LoadMemory(size_mem,
@@ -47,11 +160,107 @@ def LoadMemory(size_mem,
         lines_f = [line.strip() for line in f]
         lines = [line[8 * i:8 * (i + 1)] for line in lines_f for i in range(word_x_line - 1, -1, -1)]
 
-    for addr in range(size_mem >> 2):
-        if addr < len(lines):
-            memory[addr] = int(lines[addr], 16)
-        else:
-            memory[addr] = 0
+    StoreWords(size_mem, memory, [(0, [int(line, 16) for line in lines])])
+
+
+# ELF32 (little-endian) structures.
+ELF_MAGIC      = b'\x7fELF'
+ELF_HEADER     = struct.Struct('<16sHHIIIIIHHHHHH')
+ELF_PHEADER    = struct.Struct('<IIIIIIII')
+ELF_SHEADER    = struct.Struct('<IIIIIIIIII')
+ELF_SYMBOL     = struct.Struct('<IIIBBH')
+ELF_PT_LOAD    = 1
+ELF_SHT_SYMTAB = 2
+ELF_EM_RISCV   = 243
+
+
+def IsELF(image_file):
+    """
+    Check the magic number of the file.
+    """
+    with open(image_file, 'rb') as f:
+        return f.read(4) == ELF_MAGIC
+
+
+def LoadELF(size_mem,
+            elf_file,
+            memory):
+    """
+    Load an ELF file (RV32, little-endian). The PT_LOAD segments are copied to
+    the memory at their physical address. The rest of the memory is set to zero.
+
+    The core starts at Consts.START_ADDR, and reports the end of the test with the
+    mtohost CSR: the entry point ('_start' symbol, or the header's entry) must be
+    Consts.START_ADDR, and a 'tohost' symbol (memory-mapped tohost) is rejected.
+    """
+    with open(elf_file, 'rb') as f:
+        elf = f.read()
+
+    (ident, e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags, e_ehsize,
+     e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx) = ELF_HEADER.unpack_from(elf)
+    assert ident[:4] == ELF_MAGIC, "Error, not an ELF file: {0}".format(elf_file)
+    assert ident[4] == 1 and ident[5] == 1, "Error, ELF file is not 32-bit little-endian: {0}".format(elf_file)
+    assert e_machine == ELF_EM_RISCV, "Error, ELF file is not for RISC-V: {0}".format(elf_file)
+
+    segments = []
+    for ii in range(e_phnum):
+        p_type, p_offset, _, p_paddr, p_filesz, p_memsz, _, _ = ELF_PHEADER.unpack_from(elf, e_phoff + ii * e_phentsize)
+        if p_type != ELF_PT_LOAD or p_memsz == 0:
+            continue
+        assert p_paddr % 4 == 0, "Error, unaligned segment: {0:#x}".format(p_paddr)
+        assert p_paddr + p_memsz <= size_mem, "Error, ELF segment out of memory: {0:#x} + {1:#x} > {2:#x}".format(p_paddr, p_memsz, size_mem)
+        data  = elf[p_offset:p_offset + p_filesz] + b'\x00' * (-p_filesz % 4)
+        segments.append((p_paddr >> 2, list(struct.unpack('<{0}I'.format(len(data) >> 2), data))))
+    StoreWords(size_mem, memory, segments)
+
+    symbols = {}
+    for ii in range(e_shnum):
+        sh_header = ELF_SHEADER.unpack_from(elf, e_shoff + ii * e_shentsize)
+        if sh_header[1] != ELF_SHT_SYMTAB:
+            continue
+        sh_offset, sh_size, sh_link = sh_header[4], sh_header[5], sh_header[6]
+        str_offset = ELF_SHEADER.unpack_from(elf, e_shoff + sh_link * e_shentsize)[4]
+        for offset in range(sh_offset, sh_offset + sh_size, ELF_SYMBOL.size):
+            st_name, st_value = ELF_SYMBOL.unpack_from(elf, offset)[:2]
+            name = elf[str_offset + st_name:elf.index(b'\x00', str_offset + st_name)]
+            if name in (b'_start', b'tohost'):
+                symbols[name.decode()] = st_value
+
+    entry = symbols.get('_start', e_entry)
+    assert entry == Consts.START_ADDR, "Error, ELF entry point {0:#x} is not the start address of the core ({1:#x}): {2}".format(entry, Consts.START_ADDR, elf_file)
+    assert 'tohost' not in symbols, "Error, ELF file uses a memory-mapped tohost ({0:#x}), not the mtohost CSR: {1}".format(symbols.get('tohost', 0), elf_file)
+
+
+def LoadBinary(size_mem,
+               bin_file,
+               memory):
+    """
+    Load a binary file (little-endian words, starting at address 0). A paged
+    memory maps the file, instead of reading it.
+    """
+    assert os.path.getsize(bin_file) <= size_mem, "Error, binary file is to big: {0} < {1}".format(size_mem, os.path.getsize(bin_file))
+    if isinstance(memory, PagedMemory):
+        memory.map(bin_file)
+        return
+    with open(bin_file, 'rb') as f:
+        data = f.read()
+    data += b'\x00' * (-len(data) % 4)
+    StoreWords(size_mem, memory, [(0, list(struct.unpack('<{0}I'.format(len(data) >> 2), data)))])
+
+
+def LoadImage(size_mem,
+              image_file,
+              bytes_x_line,
+              memory):
+    """
+    Load a memory image: ELF, binary ('.bin' extension) or HEX file.
+    """
+    if IsELF(image_file):
+        LoadELF(size_mem, image_file, memory)
+    elif image_file.endswith('.bin'):
+        LoadBinary(size_mem, image_file, memory)
+    else:
+        LoadMemory(size_mem, image_file, bytes_x_line, memory)
 
 
 def Memory(clka_i,
@@ -62,15 +271,17 @@ def Memory(clka_i,
            dmem,
            SIZE,
            HEX,
-           BYTES_X_LINE):
+           BYTES_X_LINE,
+           PAGED=False):
     """
     Test memory.
 
     :param imem:         Instruction memory wishbone Interconnect
     :param dmem:         Data memory wishbone Interconnect
     :param SIZE:         Mmeory size (bytes)
-    :param HEX:          Hex file to load
+    :param HEX:          Hex, ELF or binary file to load
     :param BYTES_X_LINE: Data width in bytes
+    :param PAGED:        Use a sparse memory (pages allocated on demand). Allows a 4 GB memory.
     """
     assert SIZE >= 2**12, "Memory depth must be a positive number. Min value= 4 KB."
     assert not (SIZE & (SIZE - 1)), "Memory size must be a power of 2"
@@ -83,7 +294,7 @@ def Memory(clka_i,
     bytes_x_line = BYTES_X_LINE
     i_data_o     = Signal(modbv(0)[32:])
     d_data_o     = Signal(modbv(0)[32:])
-    _memory      = [None for ii in range(0, 2**(aw - 2))]  # WORDS, no bytes
+    _memory      = PagedMemory(2**(aw - 2)) if PAGED else [None for ii in range(0, 2**(aw - 2))]  # WORDS, no bytes
     _imem_addr   = Signal(modbv(0)[30:])
     _dmem_addr   = Signal(modbv(0)[30:])
 
@@ -100,7 +311,7 @@ def Memory(clka_i,
     imem_wbs = WishboneSlaveGenerator(clka_i, rsta_i, imem_s, im_flagbusy, im_flagerr, im_flagwait).gen_wbs()  # NOQA for unused variable
     dmem_wbs = WishboneSlaveGenerator(clkb_i, rstb_i, dmem_s, dm_flagbusy, dm_flagerr, dm_flagwait).gen_wbs()  # NOQA for unused variable
 
-    LoadMemory(SIZE, HEX, bytes_x_line, _memory)
+    LoadImage(SIZE, HEX, bytes_x_line, _memory)
 
     # For state machine
     mem_states_t = enum('IDLE',
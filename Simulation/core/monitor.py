@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.consts import Consts
+
+
+def find_object(blocks, callername, name):
+    """
+    Return an object of the elaborated design (signal, list of signals, memory):
+    a local variable of the function that created the blocks.
+
+    :param blocks:     The elaborated design (flattened)
+    :param callername: Name of the module (function)
+    :param name:       Name of the variable
+    """
+    for block in blocks:
+        if block.callername == callername and name in block.symdict:
+            return block.symdict[name]
+    raise KeyError("Object '{0}' not found in module '{1}'".format(name, callername))
+
+
+class RetireMonitor(object):
+    """
+    Track the instructions in the ID, EX and MEM stages of the pipeline, using
+    the control signals, and detect the instructions retired at MEM.
+
+    Call update() between clock edges (the combinational logic settled): it
+    returns the instruction retired at the next edge.
+
+    :ivar retired: Number of retired instructions
+    """
+    def __init__(self, blocks):
+        """
+        :param blocks: The elaborated core (flattened)
+        """
+        self.ctrl    = find_object(blocks, 'Datapath', 'ctrlIO')
+        self.id_pc   = find_object(blocks, 'Datapath', 'id_pc')
+        self.retired = 0
+        self._ex     = None
+        self._mem    = None
+
+    def update(self):
+        """
+        Advance the shadow pipeline one cycle.
+
+        :returns: (pc, instruction) retired at the next edge, or None
+        """
+        ctrl   = self.ctrl
+        retire = None
+        if self._mem is not None and ctrl.csr_retire:
+            retire        = self._mem
+            self.retired += 1
+        if not ctrl.full_stall:
+            self._mem = None if ctrl.pipeline_kill else self._ex
+            if ctrl.pipeline_kill or ctrl.id_kill or ctrl.id_stall or ctrl.id_instruction == Consts.BUBBLE:
+                self._ex = None
+            else:
+                self._ex = (int(self.id_pc), int(ctrl.id_instruction))
+        return retire
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
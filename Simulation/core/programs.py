@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.memory import ELF_HEADER
+from Simulation.core.memory import ELF_PHEADER
+from Simulation.core.memory import ELF_SHEADER
+from Simulation.core.memory import ELF_SYMBOL
+from Simulation.core.memory import ELF_MAGIC
+from Simulation.core.memory import ELF_PT_LOAD
+from Simulation.core.memory import ELF_SHT_SYMTAB
+from Simulation.core.memory import ELF_EM_RISCV
+import struct
+
+# Memory image of the generated programs.
+MEM_SIZE     = 2**12
+BYTES_X_LINE = 16
+
+# Small programs, hand-assembled.
+PROGRAM_LOOP = {0x200: 0x00500293,   # li   t0, 5
+                0x204: 0xfff28293,   # addi t0, t0, -1
+                0x208: 0xfe029ee3,   # bne  t0, zero, 0x204
+                0x20c: 0x00100313,   # li   t1, 1
+                0x210: 0x78031073,   # csrw mtohost, t1
+                0x214: 0x0000006f}   # j    0x214
+PROGRAM_TRAP = {0x1c0: 0x342022f3,   # csrr t0, mcause (trap vector, machine mode)
+                0x1c4: 0x78029073,   # csrw mtohost, t0
+                0x200: 0x00000073}   # ecall
+PROGRAM_ARRAY = {0x200: 0x40000293,   # li   t0, 0x400
+                 0x204: 0x00000313,   # li   t1, 0
+                 0x208: 0x08000393,   # li   t2, 128
+                 0x20c: 0x0062a023,   # sw   t1, 0(t0)      (store: fill a 512-byte array)
+                 0x210: 0x00428293,   # addi t0, t0, 4
+                 0x214: 0x00130313,   # addi t1, t1, 1
+                 0x218: 0xfe731ae3,   # bne  t1, t2, store
+                 0x21c: 0x40000293,   # li   t0, 0x400
+                 0x220: 0x00000313,   # li   t1, 0
+                 0x224: 0x00000e13,   # li   t3, 0
+                 0x228: 0x0002ae83,   # lw   t4, 0(t0)      (load: sum the array)
+                 0x22c: 0x01de0e33,   # add  t3, t3, t4
+                 0x230: 0x00428293,   # addi t0, t0, 4
+                 0x234: 0x00130313,   # addi t1, t1, 1
+                 0x238: 0xfe7318e3,   # bne  t1, t2, load
+                 0x23c: 0x7f000f13,   # li   t5, 2032
+                 0x240: 0x41ee0e33,   # sub  t3, t3, t5
+                 0x244: 0x41ee0e33,   # sub  t3, t3, t5
+                 0x248: 0x41ee0e33,   # sub  t3, t3, t5
+                 0x24c: 0x41ee0e33,   # sub  t3, t3, t5
+                 0x250: 0x001e0e13,   # addi t3, t3, 1
+                 0x254: 0x780e1073,   # csrw mtohost, t3
+                 0x258: 0x0000006f}   # j    0x258
+
+
+def write_hex(hex_file, program):
+    """
+    Generate a HEX file from a {address: word} dictionary.
+    """
+    words_x_line = BYTES_X_LINE >> 2
+    with open(hex_file, 'w') as f:
+        for line in range(MEM_SIZE // BYTES_X_LINE):
+            for word in range(words_x_line - 1, -1, -1):
+                f.write(format(program.get((line * words_x_line + word) << 2, 0), 'x').zfill(8))
+            f.write('\n')
+
+
+def write_elf(elf_file, program, symbols):
+    """
+    Generate an ELF file from a {address: word} dictionary: one PT_LOAD segment
+    from the lowest to the highest address, and a symbol table.
+    """
+    base    = min(program)
+    words   = [program.get(addr, 0) for addr in range(base, max(program) + 4, 4)]
+    text    = struct.pack('<{0}I'.format(len(words)), *words)
+    strtab  = b'\x00' + b''.join(name.encode() + b'\x00' for name in symbols)
+    symtab  = ELF_SYMBOL.pack(0, 0, 0, 0, 0, 0)
+    st_name = 1
+    for name, value in symbols.items():
+        symtab  += ELF_SYMBOL.pack(st_name, value, 0, 0x10, 0, 1)
+        st_name += len(name) + 1
+
+    phoff   = ELF_HEADER.size
+    offset  = phoff + ELF_PHEADER.size
+    shoff   = offset + len(text) + len(symtab) + len(strtab)
+    ident   = ELF_MAGIC + b'\x01\x01\x01' + b'\x00' * 9
+    with open(elf_file, 'wb') as f:
+        f.write(ELF_HEADER.pack(ident, 2, ELF_EM_RISCV, 1, base, phoff, shoff, 0, ELF_HEADER.size,
+                                ELF_PHEADER.size, 1, ELF_SHEADER.size, 3, 0))
+        f.write(ELF_PHEADER.pack(ELF_PT_LOAD, offset, base, base, len(text), len(text), 5, 4))
+        f.write(text + symtab + strtab)
+        f.write(ELF_SHEADER.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        f.write(ELF_SHEADER.pack(0, ELF_SHT_SYMTAB, 0, 0, offset + len(text), len(symtab), 2, 1, 4, ELF_SYMBOL.size))
+        f.write(ELF_SHEADER.pack(0, 3, 0, 0, offset + len(text) + len(symtab), len(strtab), 0, 0, 1, 0))
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
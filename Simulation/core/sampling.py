@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.cycle_sim import CycleSimulation
+from Simulation.core.memory import StoreWords
+from Simulation.core.monitor import find_object
+from Simulation.core.monitor import RetireMonitor
+from Simulation.core.testbench import core_system
+from Simulation.core.testbench import RESET_TIME
+from Simulation.core.testbench import iss_testbench
+from myhdl import Signal
+from myhdl import modbv
+from myhdl._Simulation import _flatten
+
+# Architectural state: ISS attribute -> CSR register
+CSR_STATE = [('priv_stack',   'priv_stack'),
+             ('mtvec',        'mtvec'),
+             ('mtimecmp',     'mtimecmp'),
+             ('mscratch',     'mscratch'),
+             ('mepc',         'mepc'),
+             ('mecode',       'mecode'),
+             ('mint',         'mint'),
+             ('mbadaddr',     'mbadaddr'),
+             ('mtip',         'mtip'),
+             ('msip',         'msip'),
+             ('mtie',         'mtie'),
+             ('msie',         'msie'),
+             ('mcie',         'mcie'),
+             ('hpm_overflow', 'hpm_overflow'),
+             ('toHost',       'mtohost'),
+             ('fromHost',     'mfromhost'),
+             ('cycle',        'cycle_full'),
+             ('time',         'time_full'),
+             ('mtime',        'mtime_full'),
+             ('instret',      'instret_full')]
+
+
+def inject_state(iss, blocks):
+    """
+    Copy the architectural state of the ISS to the core: register file, CSR
+    file, PC (the next fetch address) and memory. The core must be out of
+    reset, with an empty pipeline. The values are assigned with 'next': they
+    are visible after the next clock edge.
+
+    :param iss:    The functional model
+    :param blocks: The elaborated system: core and memory (flattened)
+    """
+    registers = find_object(blocks, 'RegisterFile', '_registers')
+    for ii in range(1, 32):
+        registers[ii].next = iss.regs[ii]
+    for attr, name in CSR_STATE:
+        find_object(blocks, 'CSR', name).next = getattr(iss, attr)
+    for counter, value in zip(find_object(blocks, 'CSR', 'hpmcounter'), iss.hpmcounter):
+        counter.next = value
+    find_object(blocks, 'Datapath', 'if_pc').next = iss.pc
+    memory = find_object(blocks, 'Memory', '_memory')
+    StoreWords(len(memory) << 2, memory, [(0, iss.memory)])
+
+
+def sampled_simulation(hex_file, skip, window, warmup=0, timeout=100000):
+    """
+    Sampled simulation: execute the first instructions in the ISS, transfer the
+    state to the core, and execute a detailed window with the cycle-based engine.
+    The warm-up instructions fill the caches and the pipeline, and are not
+    measured.
+
+    :param hex_file: Program (HEX or ELF file)
+    :param skip:     Number of instructions executed in the ISS (fast-forward)
+    :param window:   Number of instructions measured in the core
+    :param warmup:   Number of instructions executed in the core, before the window
+    :param timeout:  Max number of cycles in the core
+    :returns:        Dictionary: skipped and measured instructions, cycles, CPI, and toHost
+    """
+    iss = iss_testbench(hex_file)
+    iss.run(skip)
+    if iss.toHost != 0:
+        return dict(skipped=iss.instret, instructions=0, cycles=0, cpi=None, toHost=iss.toHost)
+
+    clk    = Signal(True)
+    rst    = Signal(False)
+    toHost = Signal(modbv(0)[32:])
+    dut    = core_system(clk, rst, toHost, hex_file)
+    blocks = _flatten(dut)
+    sim    = CycleSimulation(clk, dut)
+
+    rst.next = True
+    sim.run(RESET_TIME - 1)
+    rst.next = False
+    inject_state(iss, blocks)
+
+    monitor = RetireMonitor(blocks)
+    start   = [None]
+
+    def stop():
+        if toHost != 0:
+            return True
+        monitor.update()
+        if start[0] is None and monitor.retired >= warmup:
+            start[0] = (sim.cycle, monitor.retired)
+        return toHost != 0 or monitor.retired >= warmup + window
+
+    sim.run(timeout, stop=stop)
+    if start[0] is None:
+        start[0] = (sim.cycle, monitor.retired)
+    instructions = monitor.retired - start[0][1]
+    cycles       = sim.cycle - start[0][0]
+    return dict(skipped=iss.instret,
+                instructions=instructions,
+                cycles=cycles,
+                cpi=float(cycles) / instructions if instructions else None,
+                toHost=int(toHost))
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.benchmark import compare
+from Simulation.benchmark import format_results
+from Simulation.benchmark import missing_benchmarks
+from Simulation.benchmark import _run_job
+from Simulation.benchmark import _bench_core
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.core.programs import PROGRAM_TRAP
+
+
+def test_benchmark_compare():
+    """
+    Benchmark: a throughput drop above the threshold is a regression.
+    """
+    baseline = {'core/cycle/loop': dict(throughput=1000.0), 'module/test_alu': dict(throughput=2.0)}
+    results  = {'core/cycle/loop': dict(throughput=850.0), 'module/test_alu': dict(throughput=1.9),
+                'module/test_new': dict(throughput=1.0)}
+    changes  = compare(results, baseline, 10.0)
+    assert [(name, round(change, 1), regression) for name, change, regression in changes] == [
+        ('core/cycle/loop', -15.0, True), ('module/test_alu', -5.0, False)]
+
+
+def test_benchmark_missing():
+    """
+    Benchmark: a benchmark of the baseline without a result (HEX file not compiled) is
+    missing, unless its engine was not executed.
+    """
+    baseline = {'core/cycle/loop': {}, 'core/cycle/rv32ui-p-add': {}, 'core/event/rv32ui-p-add': {},
+                'module/test_alu': {}, 'module/test_old': {}}
+    results  = {'core/cycle/loop': {}, 'module/test_alu': {}}
+    assert missing_benchmarks(results, baseline) == ['core/cycle/rv32ui-p-add', 'core/event/rv32ui-p-add', 'module/test_old']
+    assert missing_benchmarks(results, baseline, ['cycle']) == ['core/cycle/rv32ui-p-add', 'module/test_old']
+
+
+def test_benchmark_core(tmpdir):
+    """
+    Benchmark: the core benchmark reports the simulated cycles, the throughput and the peak RSS.
+    A failed program is an error.
+    """
+    loop_hex = str(tmpdir.join('loop.hex'))
+    trap_hex = str(tmpdir.join('trap.hex'))
+    write_hex(loop_hex, PROGRAM_LOOP)
+    write_hex(trap_hex, PROGRAM_TRAP)
+
+    name, result = _run_job(('core/cycle/loop', _bench_core, (loop_hex, 'cycle')))
+    assert result['cycles'] == 320 and result['throughput'] > 0 and result['rss'] > 0
+    assert 0 < result['elaboration'] < result['wall']
+    name, error = _run_job(('core/cycle/trap', _bench_core, (trap_hex, 'cycle')))
+    assert 'MTOHOST' in error['error']
+    assert 'ERROR' in format_results({name: error, 'core/cycle/loop': result}, []).splitlines()[2]
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.cache_analyzer import read_cache_trace
+from Simulation.core.cache_analyzer import stack_distances
+from Simulation.core.cache_analyzer import sweep
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import read_config
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_ARRAY
+import pytest
+
+
+def test_stack_distances():
+    """
+    Cache analyzer: LRU stack distances of a small trace, and the misses for each associativity.
+    """
+    trace = [0x000, 0x040, 0x004, 0x010, 0x000]
+    assert stack_distances(trace, [4], [0], 2) == {(4, 0): [0, 2, 3]}
+    assert stack_distances(trace, [4], [1], 2) == {(4, 1): [1, 1, 3]}
+    assert [result.misses for result in sweep(trace, [4], [0], [1, 2, 4])] == [5, 3, 3]
+
+
+@pytest.mark.parametrize('geometry', [{}, dict(ICache=(4, 2, 4), DCache=(4, 2, 2))])
+def test_cache_analyzer(tmpdir, geometry):
+    """
+    Cache analyzer: same misses of the RTL caches, for the trace captured from the core.
+    Configurations: algol.ini, and small caches (the array does not fit in the D$).
+    """
+    hex_file   = str(tmpdir.join('array.hex'))
+    trace_file = str(tmpdir.join('array.cache'))
+    write_hex(hex_file, PROGRAM_ARRAY)
+    config = read_config()
+    for cache, values in geometry.items():
+        for key, value in zip(['BlockWidth', 'SetWidth', 'Ways'], values):
+            config.set(cache, key, str(value))
+    core_cycle_testbench(hex_file, cache_trace=trace_file, config=config)
+    streams = read_cache_trace(trace_file)
+
+    for cache, addresses, rtl_misses in [('ICache', streams.icache, streams.misses[0]),
+                                         ('DCache', streams.dcache, streams.misses[1])]:
+        result = sweep(addresses, [config.getint(cache, 'BlockWidth')], [config.getint(cache, 'SetWidth')],
+                       [config.getint(cache, 'Ways')])
+        assert rtl_misses > 0 and result[0].misses == rtl_misses, cache
+    assert len(streams.dcache) == 2 * 128
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.commit_log import read_commit_log
+from Simulation.core.commit_log import format_commit
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import core_testbench
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from myhdl import Simulation
+
+PROGRAM_MEMORY = {0x200: 0x40000293,   # li   t0, 0x400
+                  0x204: 0x02a00313,   # li   t1, 42
+                  0x208: 0x0062a023,   # sw   t1, 0(t0)
+                  0x20c: 0x0002a383,   # lw   t2, 0(t0)
+                  0x210: 0x00100313,   # li   t1, 1
+                  0x214: 0x78031073,   # csrw mtohost, t1
+                  0x218: 0x0000006f}   # j    0x218
+
+
+def test_commit_log(tmpdir):
+    """
+    Commit trace: the retired instructions, with the write-back and memory access.
+    """
+    hex_file = str(tmpdir.join('memory.hex'))
+    log_file = str(tmpdir.join('memory.commit'))
+    write_hex(hex_file, PROGRAM_MEMORY)
+    time    = core_cycle_testbench(hex_file, commit_log=log_file)
+    commits = list(read_commit_log(log_file))
+
+    assert [(commit.pc, commit.instruction) for commit in commits] == sorted(PROGRAM_MEMORY.items())[:-1]
+    assert [(commit.rd, commit.rd_data) for commit in commits] == [(5, 0x400), (6, 42), (None, None),
+                                                                   (7, 42), (6, 1), (None, None)]
+    assert [(commit.mem_addr, commit.mem_data, commit.store) for commit in commits[2:4]] == [(0x400, 42, True),
+                                                                                             (0x400, 42, False)]
+    assert commits == sorted(commits) and commits[-1].cycle <= time // TICK_PERIOD
+    assert format_commit(commits[3]).split()[1:] == ['0x0000020c', '(0x0002a383)', 'x7', '0x0000002a',
+                                                     'memR', '0x00000400', '0x0000002a']
+
+
+def test_commit_log_engines(tmpdir):
+    """
+    Commit trace: same trace for both engines.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    logs = [str(tmpdir.join('cycle.commit')), str(tmpdir.join('event.commit'))]
+    core_cycle_testbench(hex_file, commit_log=logs[0])
+    Simulation(core_testbench(hex_file, commit_log=logs[1])).run(quiet=1)
+
+    commits = list(read_commit_log(logs[0]))
+    assert len(commits) == 1 + 5 * 2 + 2
+    assert commits == list(read_commit_log(logs[1]))
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -19,9 +19,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from Core.core import Core
-from Simulation.core.memory import Memory
-from Core.wishbone import WishboneIntercon
+from Simulation.core.memory import LoadImage
+from Simulation.core.cycle_sim import CycleSimulation
+from Simulation.core.cycle_sim import restart
+from Simulation.core.conftest import trace_options
+from Simulation.core.testbench import core_system
+from Simulation.core.testbench import core_testbench
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import checkpoint_file
+from Simulation.core.testbench import read_config
+from Simulation.core.testbench import RESET_TIME
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.testbench import TIMEOUT
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.core.programs import PROGRAM_TRAP
+from Simulation.core.programs import PROGRAM_ARRAY
+from Core.csr import CSRExceptionCode
+from Core.ram_dp import RAMArray
 from myhdl import instance
 from myhdl import always
 from myhdl import Signal
@@ -31,95 +46,96 @@ from myhdl import Simulation
 from myhdl import StopSimulation
 from myhdl import traceSignals
 from myhdl import now
-from myhdl import Error
-import sys
+from myhdl._Simulation import _flatten
+from myhdl._simulator import _signals
+import pytest
+import os
 
-if sys.version_info[0] < 3:
-    import ConfigParser as cp
-else:
-    import configparser as cp
+# Time of the programs with the default configuration: the baseline core (no pipelined caches,
+# no branch predictor).
+DEFAULT_TIMES = [('loop', PROGRAM_LOOP, 3200),
+                 ('array', PROGRAM_ARRAY, 42180)]
 
-# Constans for simulation.
-TICK_PERIOD = 10
-TIMEOUT     = 10000
-RESET_TIME  = 5
 
-
-def core_testbench(hex_file):
+def core_suite(hex_files, engine):
     """
-    Connect the Core to the simulation memory, using wishbone interconnects.
-    Assert the core for RESET_TIME.
+    Program suite: elaborate the core once, and execute each program. Before each
+    program, the signals and the cache memories are restored to their initial
+    values, and the memory is loaded with the next HEX file.
 
-    Finish the test after TIMEOUT units of time, or a write to toHost register.
-    If toHost is different of 1, the test failed.
+    Yield (hex_file, toHost, time) for each program. toHost is 0 on timeout.
     """
-    clk = Signal(True)
-    rst = Signal(False)
-    imem = WishboneIntercon()
-    dmem = WishboneIntercon()
-
-    toHost = Signal(modbv(0)[32:])
-
-    config = cp.ConfigParser()
-    config.read('Simulation/core/algol.ini')
-
-    dut_core = Core(clk_i=clk,
-                    rst_i=rst,
-                    imem=imem,
-                    dmem=dmem,
-                    toHost=toHost,
-                    IC_ENABLE=config.getboolean('ICache', 'Enable'),
-                    IC_BLOCK_WIDTH=config.getint('ICache', 'BlockWidth'),
-                    IC_SET_WIDTH=config.getint('ICache', 'SetWidth'),
-                    IC_NUM_WAYS=config.getint('ICache', 'Ways'),
-                    DC_ENABLE=config.getboolean('DCache', 'Enable'),
-                    DC_BLOCK_WIDTH=config.getint('DCache', 'BlockWidth'),
-                    DC_SET_WIDTH=config.getint('DCache', 'SetWidth'),
-                    DC_NUM_WAYS=config.getint('DCache', 'Ways'))
-
-    memory = Memory(clka_i=clk,
-                    rsta_i=rst,
-                    imem=imem,
-                    clkb_i=clk,
-                    rstb_i=rst,
-                    dmem=dmem,
-                    SIZE=int(config.get('Memory', 'Size'), 16),
-                    HEX=hex_file,
-                    BYTES_X_LINE=config.getint('Memory', 'Bytes_x_line'))
-
-    @always(delay(int(TICK_PERIOD / 2)))
-    def gen_clock():
-        clk.next = not clk
-
-    @always(toHost)
-    def toHost_check():
-        """
-        Wait for a write to toHost register.
-        """
-        if toHost != 1:
-            raise Error('Test failed. MTOHOST = {0}. Time = {1}'.format(toHost, now()))
-        print("Time: {0}".format(now()))
-        raise StopSimulation
-
-    @instance
-    def timeout():
-        """
-        Wait until timeout.
-        """
-        rst.next = True
-        yield delay(RESET_TIME * TICK_PERIOD)
-        rst.next = False
-        yield delay(TIMEOUT * TICK_PERIOD)
-        raise Error("Test failed: Timeout")
-
-    return dut_core, memory, gen_clock, timeout, toHost_check
-
-
-def test_core(hex_file, vcd):
+    config = read_config()
+
+    first   = len(_signals)
+    clk     = Signal(True)
+    rst     = Signal(False)
+    toHost  = Signal(modbv(0)[32:])
+    dut     = core_system(clk, rst, toHost, hex_files[0])
+    signals = _signals[first:]
+    blocks  = _flatten(dut)
+    memory  = [block.symdict['_memory'] for block in blocks if block.callername == 'Memory' and '_memory' in block.symdict][0]
+    rams    = dict((id(ram), ram) for block in blocks for ram in block.symdict.values() if isinstance(ram, RAMArray)).values()
+    sim     = CycleSimulation(clk, dut) if engine == 'cycle' else None
+
+    for hex_file in hex_files:
+        restart(blocks, signals, rams)
+        LoadImage(int(config.get('Memory', 'Size'), 16), hex_file, config.getint('Memory', 'Bytes_x_line'), memory)
+
+        if sim is not None:
+            sim.reset()
+            rst.next = True
+            sim.run(RESET_TIME - 1)
+            rst.next = False
+            sim.run(TIMEOUT + 1, stop=lambda: toHost != 0)
+            yield hex_file, int(toHost), sim.cycle * TICK_PERIOD
+            continue
+
+        # Event-driven: use a new testbench.
+        result = [0, now()]
+
+        @always(delay(int(TICK_PERIOD / 2)))
+        def gen_clock():
+            clk.next = not clk
+
+        @always(toHost)
+        def toHost_check():
+            result[:] = [int(toHost), now()]
+            raise StopSimulation
+
+        @instance
+        def timeout():
+            rst.next = True
+            yield delay(RESET_TIME * TICK_PERIOD)
+            rst.next = False
+            yield delay(TIMEOUT * TICK_PERIOD)
+            result[1] = now()
+            raise StopSimulation
+
+        Simulation(dut, gen_clock, toHost_check, timeout).run(quiet=1)
+        yield hex_file, result[0], result[1]
+
+
+def test_core(hex_file, vcd, engine, pytestconfig, profiler):
     """
     Core: Behavioral test for the RISCV core.
     """
-    if vcd:
+    checkpoint = pytestconfig.getoption('checkpoint')
+    restore    = pytestconfig.getoption('restore')
+    trace      = trace_options(pytestconfig)
+    commit_log = pytestconfig.getoption('commit_log')
+    cpi_stack  = pytestconfig.getoption('cpi_stack')
+    caches     = pytestconfig.getoption('cache_trace')
+    if engine == 'cycle':
+        core_cycle_testbench(hex_file, checkpoint, restore, {} if vcd and trace is None else trace, commit_log, cpi_stack,
+                             caches, profiler=profiler)
+        return
+    if checkpoint or restore or caches:
+        print("Ignoring the checkpoint and cache trace flags: only supported by the cycle-based engine")
+
+    if trace is not None or commit_log or cpi_stack or (profiler is not None and not vcd):
+        sim = Simulation(core_testbench(hex_file, trace, commit_log, cpi_stack, profiler))
+    elif vcd:
         vcd = traceSignals(core_testbench, hex_file,)
         sim = Simulation(vcd)
     else:
@@ -127,6 +143,95 @@ def test_core(hex_file, vcd):
 
     sim.run()
 
+
+def test_core_suite(hex_suite, engine):
+    """
+    Core: Behavioral test for the RISCV core, elaborating the core once for all the programs.
+    """
+    failed = []
+    for hex_file, toHost, time in core_suite(hex_suite, engine):
+        if toHost == 1:
+            print("PASSED {0}. Time: {1}".format(hex_file, time))
+        else:
+            print("FAILED {0}. {1}".format(hex_file, 'Timeout' if toHost == 0 else 'MTOHOST = {0}. Time = {1}'.format(toHost, time)))
+            failed.append(hex_file)
+    assert not failed, "Test failed: {0} of {1} programs: {2}".format(len(failed), len(hex_suite), ', '.join(failed))
+
+
+@pytest.mark.parametrize('suite_engine', ['event', 'cycle'])
+def test_core_suite_reset(tmpdir, suite_engine):
+    """
+    Core: the state of a program does not leak into the next one.
+    """
+    loop_hex = str(tmpdir.join('loop.hex'))
+    trap_hex = str(tmpdir.join('trap.hex'))
+    write_hex(loop_hex, PROGRAM_LOOP)
+    write_hex(trap_hex, PROGRAM_TRAP)
+
+    results = list(core_suite([loop_hex, trap_hex, loop_hex], suite_engine))
+    assert [toHost for _, toHost, _ in results] == [1, CSRExceptionCode.E_ECALL_FROM_M, 1]
+    assert results[0][2] == results[2][2]
+
+
+@pytest.mark.parametrize('suite_engine', ['event', 'cycle'])
+def test_core_default_timing(tmpdir, suite_engine):
+    """
+    Core: the opt-in modes are off in algol.ini, and the core keeps the timing of the baseline.
+    """
+    hex_files = []
+    for name, program, _ in DEFAULT_TIMES:
+        hex_files.append(str(tmpdir.join('{0}.hex'.format(name))))
+        write_hex(hex_files[-1], program)
+
+    results = list(core_suite(hex_files, suite_engine))
+    assert [(toHost, time) for _, toHost, time in results] == [(1, time) for _, _, time in DEFAULT_TIMES]
+
+
+@pytest.mark.parametrize('ways', [2, 16])
+def test_core_checkpoint(tmpdir, ways):
+    """
+    Core: a simulation restored from a checkpoint is a cycle-exact continuation.
+    With 16 ways, the LRU history of the caches is 120 bits wide.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+
+    config = read_config()
+    for cache in ['ICache', 'DCache']:
+        config.set(cache, 'Ways', str(ways))
+        config.set(cache, 'Replacement', 'LRU')
+    time        = core_cycle_testbench(hex_file, checkpoint=100, config=config)
+    checkpoints = [checkpoint_file(hex_file, cycle) for cycle in range(100, time // TICK_PERIOD, 100)]
+    assert checkpoints and all(os.path.isfile(ckp_file) for ckp_file in checkpoints)
+    for ckp_file in checkpoints:
+        assert core_cycle_testbench(hex_file, restore=ckp_file, config=config) == time
+
+
+@pytest.mark.parametrize('pipelined', ['no', 'yes'])
+def test_core_redirect_refill(tmpdir, pipelined):
+    """
+    Core: traps redirect the fetch stage in the middle of an I$ refill.
+    """
+    program = {0x1c0: 0x341022f3,   # csrr t0, mepc (trap vector, machine mode)
+               0x1c4: 0x00428293,   # addi t0, t0, 4
+               0x1c8: 0x34129073,   # csrw mepc, t0
+               0x1cc: 0x00130313,   # addi t1, t1, 1
+               0x1d0: 0x10000073,   # eret
+               0x200: 0x00000073,   # ecall
+               0x234: 0x00000073,   # ecall
+               0x238: 0x00000073,   # ecall
+               0x23c: 0x00000073,   # ecall
+               0x240: 0xffd30313,   # addi t1, t1, -3
+               0x244: 0x78031073,   # csrw mtohost, t1
+               0x248: 0x0000006f}   # j    0x248
+    program.update({addr: 0x00000013 for addr in range(0x204, 0x234, 4)})  # nop
+    hex_file = str(tmpdir.join('redirect.hex'))
+    write_hex(hex_file, program)
+
+    config = read_config()
+    config.set('ICache', 'Pipelined', pipelined)
+    core_cycle_testbench(hex_file, config=config)
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 120
 # flycheck-flake8rc: ".flake8rc"
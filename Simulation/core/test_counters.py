@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.programs import write_hex
+
+# Check the counters. toHost: 1 (pass), or the number of the failed check (gp).
+PROGRAM_COUNTERS = {0x200: 0x40000293,   # li   t0, 0x400
+                    0x204: 0x02a00313,   # li   t1, 42
+                    0x208: 0x0062a023,   # sw   t1, 0(t0)
+                    0x20c: 0x0002a383,   # lw   t2, 0(t0)
+                    0x210: 0x00138e13,   # addi t3, t2, 1
+                    0x214: 0x00500293,   # li   t0, 5
+                    0x218: 0xfff28293,   # addi t0, t0, -1
+                    0x21c: 0xfe029ee3,   # bne  t0, zero, 0x218
+                    0x220: 0x094000ef,   # jal  ra, 0x2b4
+                    0x224: 0xc0c02573,   # csrr a0, hpmcounter12
+                    0x228: 0xc0d025f3,   # csrr a1, hpmcounter13
+                    0x22c: 0xc0402673,   # csrr a2, hpmcounter4
+                    0x230: 0xc06026f3,   # csrr a3, hpmcounter6
+                    0x234: 0xc0502773,   # csrr a4, hpmcounter5
+                    0x238: 0xc08027f3,   # csrr a5, hpmcounter8
+                    0x23c: 0x00300193,   # li   gp, 3
+                    0x240: 0x00400313,   # li   t1, 4
+                    0x244: 0x06651463,   # bne  a0, t1, 0x2ac
+                    0x248: 0x00500193,   # li   gp, 5
+                    0x24c: 0x00200313,   # li   t1, 2
+                    0x250: 0x04659e63,   # bne  a1, t1, 0x2ac
+                    0x254: 0x00700193,   # li   gp, 7
+                    0x258: 0x04060a63,   # beq  a2, zero, 0x2ac
+                    0x25c: 0x00900193,   # li   gp, 9
+                    0x260: 0x00100313,   # li   t1, 1
+                    0x264: 0x04669463,   # bne  a3, t1, 0x2ac
+                    0x268: 0x00b00193,   # li   gp, 11
+                    0x26c: 0x04671063,   # bne  a4, t1, 0x2ac
+                    0x270: 0x00d00193,   # li   gp, 13
+                    0x274: 0x02078c63,   # beq  a5, zero, 0x2ac
+                    0x278: 0xfff00313,   # li   t1, -1
+                    0x27c: 0xb0c31073,   # csrw mhpmcounter12, t1
+                    0x280: 0x00000013,   # nop
+                    0x284: 0x00000013,   # nop
+                    0x288: 0x00000013,   # nop
+                    0x28c: 0x00000263,   # beq  zero, zero, 0x290
+                    0x290: 0x7c002573,   # csrr a0, mhpmoverflow
+                    0x294: 0x00f00193,   # li   gp, 15
+                    0x298: 0x20000313,   # li   t1, 0x200
+                    0x29c: 0x00651863,   # bne  a0, t1, 0x2ac
+                    0x2a0: 0x00100313,   # li   t1, 1
+                    0x2a4: 0x78031073,   # csrw mtohost, t1
+                    0x2a8: 0x0000006f,   # j    0x2a8
+                    0x2ac: 0x78019073,   # csrw mtohost, gp
+                    0x2b0: 0x0000006f,   # j    0x2b0
+                    0x2b4: 0x00008067}   # ret
+# Counter overflow interrupt: the trap handler checks mcause.
+PROGRAM_OVERFLOW = {0x200: 0x00700313,   # li   t1, 7
+                    0x204: 0x30031073,   # csrw mstatus, t1
+                    0x208: 0x00001337,   # lui  t1, 1
+                    0x20c: 0x00135313,   # srli t1, t1, 1
+                    0x210: 0x30431073,   # csrw mie, t1
+                    0x214: 0xfff00313,   # li   t1, -1
+                    0x218: 0xb0c31073,   # csrw mhpmcounter12, t1
+                    0x21c: 0x00000013,   # nop
+                    0x220: 0x00000013,   # nop
+                    0x224: 0x00000013,   # nop
+                    0x228: 0x00000263,   # beq  zero, zero, 0x22c
+                    0x22c: 0x0000006f,   # j    0x22c
+                    0x1c0: 0x342022f3,   # csrr t0, mcause
+                    0x1c4: 0x80000337,   # lui  t1, 0x80000
+                    0x1c8: 0x00230313,   # addi t1, t1, 2
+                    0x1cc: 0x00629463,   # bne  t0, t1, 0x1d4
+                    0x1d0: 0x00100293,   # li   t0, 1
+                    0x1d4: 0x78029073,   # csrw mtohost, t0
+                    0x1d8: 0x0000006f}   # j    0x1d8
+# Timer interrupt: mtime reaches mtimecmp. The trap handler checks mcause.
+PROGRAM_TIMER = {0x200: 0x701022f3,   # csrr t0, mtime
+                 0x204: 0x04028293,   # addi t0, t0, 64
+                 0x208: 0x32129073,   # csrw mtimecmp, t0
+                 0x20c: 0x08000313,   # li   t1, 0x80
+                 0x210: 0x30431073,   # csrw mie, t1
+                 0x214: 0x00700313,   # li   t1, 7
+                 0x218: 0x30031073,   # csrw mstatus, t1
+                 0x21c: 0x0000006f,   # j    0x21c
+                 0x1c0: 0x342022f3,   # csrr t0, mcause
+                 0x1c4: 0x80000337,   # lui  t1, 0x80000
+                 0x1c8: 0x00130313,   # addi t1, t1, 1
+                 0x1cc: 0x00629463,   # bne  t0, t1, 0x1d4
+                 0x1d0: 0x00100293,   # li   t0, 1
+                 0x1d4: 0x78029073,   # csrw mtohost, t0
+                 0x1d8: 0x0000006f}   # j    0x1d8
+
+
+def test_counters(tmpdir):
+    """
+    Performance counters: taken branches, jumps, cache hits/misses and load-use stalls.
+    The overflow flag is set when a counter wraps around.
+    """
+    hex_file = str(tmpdir.join('counters.hex'))
+    write_hex(hex_file, PROGRAM_COUNTERS)
+    core_cycle_testbench(hex_file)
+
+
+def test_counters_interrupt(tmpdir):
+    """
+    Performance counters: the overflow raises the counter interrupt, if enabled.
+    """
+    hex_file = str(tmpdir.join('overflow.hex'))
+    write_hex(hex_file, PROGRAM_OVERFLOW)
+    core_cycle_testbench(hex_file)
+
+
+def test_timer_interrupt(tmpdir):
+    """
+    Timer interrupt: mtime reaches mtimecmp, and the trap handler reads the timer cause.
+    """
+    hex_file = str(tmpdir.join('timer.hex'))
+    write_hex(hex_file, PROGRAM_TIMER)
+    core_cycle_testbench(hex_file)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.cpi_stack import CATEGORIES
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import core_testbench
+from Simulation.core.testbench import read_config
+from Simulation.core.testbench import RESET_TIME
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.testbench import CPI_STACKS
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from myhdl import Simulation
+
+PROGRAM_HAZARD = {0x200: 0x40000293,   # li   t0, 0x400
+                  0x204: 0x02a00313,   # li   t1, 42
+                  0x208: 0x0062a023,   # sw   t1, 0(t0)
+                  0x20c: 0x0002a383,   # lw   t2, 0(t0)
+                  0x210: 0x00138313,   # addi t1, t2, 1
+                  0x214: 0x00100313,   # li   t1, 1
+                  0x218: 0x78031073,   # csrw mtohost, t1
+                  0x21c: 0x0000006f}   # j    0x21c
+PROGRAM_CALL   = {0x200: 0x00300293,   # li   t0, 3
+                  0x204: 0x01c000ef,   # jal  ra, 0x220
+                  0x208: 0xfff28293,   # addi t0, t0, -1
+                  0x20c: 0xfe029ce3,   # bne  t0, zero, 0x204
+                  0x210: 0x00100313,   # li   t1, 1
+                  0x214: 0x78031073,   # csrw mtohost, t1
+                  0x218: 0x0000006f,   # j    0x218
+                  0x220: 0x00008067}   # ret
+
+
+def predictor_config():
+    """
+    Core configuration (algol.ini), with the branch predictor enabled.
+    """
+    config = read_config()
+    config.set('BranchPredictor', 'Enable', 'yes')
+    return config
+
+
+def test_cpi_stack(tmpdir):
+    """
+    CPI stack: each cycle after the reset is classified once, and the stalls are
+    charged to their cause.
+    """
+    hex_file = str(tmpdir.join('hazard.hex'))
+    write_hex(hex_file, PROGRAM_HAZARD)
+    del CPI_STACKS[:]
+    time  = core_cycle_testbench(hex_file, cpi_stack=True)
+    stack = CPI_STACKS[-1][1]
+
+    assert stack.total == time // TICK_PERIOD - RESET_TIME
+    assert stack.retired == len(PROGRAM_HAZARD) - 1
+    assert stack.cycles['hazard'] == 1
+    assert stack.cycles['imem'] > 0 and stack.cycles['dmem'] > 0
+    assert stack.cycles['ex'] == stack.cycles['fence_i'] == stack.cycles['flush'] == 0
+    assert [line.split()[0] for line in stack.report().splitlines()[1:]] == [label.split()[0] for label in CATEGORIES.values()]
+    del CPI_STACKS[:]
+
+
+def test_cpi_stack_engines(tmpdir):
+    """
+    CPI stack: same classification for both engines. The taken branches of the loop
+    are charged to the flush category.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    del CPI_STACKS[:]
+    core_cycle_testbench(hex_file, cpi_stack=True)
+    Simulation(core_testbench(hex_file, cpi_stack=True)).run(quiet=1)
+
+    cycle, event = [stack for _, stack in CPI_STACKS]
+    assert cycle.cycles == event.cycles
+    assert cycle.retired == 1 + 5 * 2 + 2
+    assert cycle.cycles['flush'] == 4
+    del CPI_STACKS[:]
+
+
+def test_cpi_stack_predictor(tmpdir):
+    """
+    CPI stack: with the branch predictor, only the mispredicted branches of the loop
+    (first iteration, and the exit) are flushed.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    del CPI_STACKS[:]
+    core_cycle_testbench(hex_file, cpi_stack=True, config=predictor_config())
+    stack = CPI_STACKS[-1][1]
+
+    assert stack.retired == 1 + 5 * 2 + 2
+    assert stack.cycles['flush'] == 2
+    del CPI_STACKS[:]
+
+
+def test_cpi_stack_calls(tmpdir):
+    """
+    CPI stack: the returns are predicted by the return-address stack. Only the first
+    call, and the first iteration and the exit of the loop, are flushed.
+    """
+    hex_file = str(tmpdir.join('call.hex'))
+    write_hex(hex_file, PROGRAM_CALL)
+    del CPI_STACKS[:]
+    core_cycle_testbench(hex_file, cpi_stack=True, config=predictor_config())
+    stack = CPI_STACKS[-1][1]
+
+    assert stack.retired == 1 + 3 * 4 + 2
+    assert stack.cycles['flush'] == 3
+    del CPI_STACKS[:]
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
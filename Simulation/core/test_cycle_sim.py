@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.cycle_sim import CycleSimulation
+from Core.ram_dp import RAM_DP
+from Core.ram_dp import RAMIOPort
+from myhdl import always
+from myhdl import always_comb
+from myhdl import instance
+from myhdl import instances
+from myhdl import delay
+from myhdl import modbv
+from myhdl import Signal
+from myhdl import Simulation
+from myhdl import StopSimulation
+from myhdl import SimulationError
+import pytest
+
+CYCLES = 50
+
+
+def _design(clk, rst, count, data):
+    """
+    Counter, and a RAM (clocked by derived clocks) storing count^2 at address count.
+    """
+    square = Signal(modbv(0)[16:])
+    addr   = Signal(modbv(0)[4:])
+    portA  = RAMIOPort(A_WIDTH=4, D_WIDTH=16)
+    portB  = RAMIOPort(A_WIDTH=4, D_WIDTH=16)
+    ram    = RAM_DP(portA, portB, A_WIDTH=4, D_WIDTH=16)  # noqa
+
+    @always(clk.posedge)
+    def counter():
+        if rst:
+            count.next = 0
+        else:
+            count.next = count + 1
+
+    @always_comb
+    def _square():
+        square.next = count * count
+        addr.next   = count - 1
+
+    @always_comb
+    def _ports():
+        portA.clk.next    = clk
+        portA.addr.next   = count
+        portA.data_i.next = square
+        portA.we.next     = True
+        portB.clk.next    = clk
+        portB.addr.next   = addr
+        portB.data_i.next = 0
+        portB.we.next     = False
+        data.next         = portB.data_o
+
+    return instances()
+
+
+def test_cycle_sim():
+    """
+    Cycle-based engine: same values of the event-driven simulator, at each clock edge.
+    """
+    def event_trace():
+        clk   = Signal(False)
+        rst   = Signal(True)
+        count = Signal(modbv(0)[4:])
+        data  = Signal(modbv(0)[16:])
+        trace = []
+
+        @always(delay(5))
+        def gen_clock():
+            clk.next = not clk
+
+        @instance
+        def stimulus():
+            yield clk.posedge
+            rst.next = False
+            for _ in range(CYCLES):
+                yield clk.posedge
+                yield delay(1)
+                trace.append((int(count), int(data)))
+            raise StopSimulation
+
+        Simulation(_design(clk, rst, count, data), gen_clock, stimulus).run()
+        return trace
+
+    clk   = Signal(False)
+    rst   = Signal(True)
+    count = Signal(modbv(0)[4:])
+    data  = Signal(modbv(0)[16:])
+    sim   = CycleSimulation(clk, _design(clk, rst, count, data))
+    trace = []
+    sim.step()
+    rst.next = False
+    for _ in range(CYCLES):
+        sim.step()
+        trace.append((int(count), int(data)))
+
+    assert trace == event_trace()
+    assert sim.cycle == CYCLES + 1
+
+
+def test_cycle_sim_assertions():
+    """
+    Cycle-based engine: only synchronous designs.
+    """
+    clk = Signal(False)
+    out = Signal(False)
+
+    @always(delay(5))
+    def gen_clock():
+        clk.next = not clk
+
+    with pytest.raises(SimulationError):
+        CycleSimulation(clk, gen_clock)
+
+    @always(out.posedge)
+    def other_clock():
+        out.next = False
+
+    with pytest.raises(SimulationError):
+        CycleSimulation(clk, other_clock)
+
+    with pytest.raises(SimulationError, match='gated or derived clock'):
+        CycleSimulation(clk, _gated_clock(clk, 'gated'))
+    with pytest.raises(SimulationError, match='gated or derived clock'):
+        CycleSimulation(clk, _gated_clock(clk, 'inverted'))
+    with pytest.raises(SimulationError, match='gated or derived clock'):
+        CycleSimulation(clk, _gated_clock(clk, 'conditional'))
+
+
+def _gated_clock(clk, kind):
+    """
+    A register clocked by a combinational function of the clock.
+    """
+    enable = Signal(True)
+    gclk   = Signal(False)
+    out    = Signal(False)
+
+    if kind == 'gated':
+        @always_comb
+        def _clock():
+            gclk.next = clk and enable
+    elif kind == 'inverted':
+        @always_comb
+        def _clock():
+            gclk.next = not clk
+    else:
+        @always_comb
+        def _clock():
+            if enable:
+                gclk.next = clk
+            else:
+                gclk.next = False
+
+    @always(gclk.posedge)
+    def register():
+        out.next = not out
+
+    return instances()
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
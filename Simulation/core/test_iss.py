@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.iss import ISS
+from Simulation.core.testbench import iss_testbench
+from Simulation.core.memory import LoadMemory
+from Simulation.core.memory import LoadImage
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import write_elf
+from Simulation.core.programs import MEM_SIZE
+from Simulation.core.programs import BYTES_X_LINE
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.core.programs import PROGRAM_TRAP
+from Core.csr import CSRExceptionCode
+import pytest
+
+# Constans for simulation.
+TIMEOUT      = 10000  # instructions
+
+
+def test_iss(hex_file):
+    """
+    ISS: Functional test for the RISCV ISA.
+    """
+    iss = iss_testbench(hex_file)
+    toHost = iss.run(TIMEOUT)
+    assert toHost is not None, "Test failed: Timeout"
+    assert toHost == 1, 'Test failed. MTOHOST = {0}. Instructions = {1}'.format(toHost, iss.instret)
+    print("Instructions: {0}".format(iss.instret))
+
+
+def test_iss_loop(tmpdir):
+    """
+    ISS: Execute a small loop, and write to toHost.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    iss = ISS(MEM_SIZE, hex_file, BYTES_X_LINE)
+    assert iss.run(TIMEOUT) == 1
+    assert iss.instret == 1 + 5 * 2 + 2
+    assert iss.regs[5] == 0 and iss.regs[6] == 1
+
+
+def test_iss_trap(tmpdir):
+    """
+    ISS: ECALL from machine mode jumps to the trap vector.
+    """
+    hex_file = str(tmpdir.join('trap.hex'))
+    write_hex(hex_file, PROGRAM_TRAP)
+    iss = ISS(MEM_SIZE, hex_file, BYTES_X_LINE)
+    assert iss.run(TIMEOUT) == CSRExceptionCode.E_ECALL_FROM_M
+    assert iss.mepc == 0x200
+    assert iss.priv_stack == 0b110110
+
+
+def test_iss_elf(tmpdir):
+    """
+    ISS: Load an ELF file. Same memory image of the HEX file.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    elf_file = str(tmpdir.join('loop.elf'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    write_elf(elf_file, PROGRAM_LOOP, dict(_start=0x200))
+
+    hex_memory = [None] * (MEM_SIZE >> 2)
+    elf_memory = [None] * (MEM_SIZE >> 2)
+    LoadMemory(MEM_SIZE, hex_file, BYTES_X_LINE, hex_memory)
+    LoadImage(MEM_SIZE, elf_file, BYTES_X_LINE, elf_memory)
+    assert elf_memory == hex_memory
+
+    iss = ISS(MEM_SIZE, elf_file, BYTES_X_LINE)
+    assert iss.run(TIMEOUT) == 1
+
+
+@pytest.mark.parametrize('symbols, error', [(dict(_start=0x204), 'entry point 0x204'),
+                                            (dict(_start=0x200, tohost=0x1000), 'memory-mapped tohost')])
+def test_iss_elf_symbols(tmpdir, symbols, error):
+    """
+    ISS: an ELF file that does not start at the start address of the core, or uses a
+    memory-mapped tohost, is rejected.
+    """
+    elf_file = str(tmpdir.join('loop.elf'))
+    write_elf(elf_file, PROGRAM_LOOP, symbols)
+    with pytest.raises(AssertionError, match=error):
+        ISS(MEM_SIZE, elf_file, BYTES_X_LINE)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.profiler import Profiler
+from myhdl import always_comb
+from myhdl import delay
+from myhdl import instance
+from myhdl import Signal
+from myhdl import Simulation
+from myhdl import StopSimulation
+from myhdl._Simulation import _flatten
+from myhdl import modbv
+
+
+def incrementer(a, b):
+    @always_comb
+    def rtl():
+        b.next = a + 1
+
+    return rtl
+
+
+def test_profiler_core(tmpdir):
+    """
+    Profiler: the sequential blocks of the core are executed once per cycle (cycle-based
+    engine), and the instances are named by their hierarchical path.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    profiler = Profiler()
+    cycles   = core_cycle_testbench(hex_file, profiler=profiler) // TICK_PERIOD
+
+    assert all(instance.startswith('core.') for instance in profiler.stats)
+    assert profiler.stats['core.memory.imem_rtl'][:3:2] == ['Memory.imem_rtl', cycles]
+    assert profiler.stats['core.dut_core.dpath.reg_file.write'][2] == cycles
+
+    lines = profiler.report(top=5).splitlines()
+    assert len(lines) == 1 + 2 * 6
+    times = [float(line.split()[0]) for line in lines[8:]]
+    assert times == sorted(times, reverse=True)
+
+
+def test_profiler_install():
+    """
+    Profiler: attach the blocks of a new simulation. Without the hierarchy, the
+    instances are numbered. Blocks are never wrapped twice.
+    """
+    a = Signal(modbv(0)[8:])
+    b = Signal(modbv(0)[8:])
+    c = Signal(modbv(0)[8:])
+
+    def testbench():
+        dut = [incrementer(a, b), incrementer(b, c)]
+
+        @instance
+        def stimulus():
+            for value in range(10):
+                a.next = value
+                yield delay(10)
+                assert c == value + 2
+            raise StopSimulation
+
+        return dut, stimulus
+
+    init     = Simulation.__init__
+    profiler = Profiler().install()
+    try:
+        bench = testbench()
+        Simulation(bench).run(quiet=1)
+    finally:
+        profiler.uninstall()
+    assert Simulation.__init__ is init
+
+    assert sorted(profiler.stats) == ['incrementer[0].rtl', 'incrementer[1].rtl']
+    activations, updates = profiler.generators()['incrementer.rtl'][1:]
+    assert activations == updates and activations > 2 * 9
+
+    func = bench[0][0].func
+    profiler.attach(_flatten(bench))
+    assert bench[0][0].func is func and len(profiler.stats) == 2
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.sampling import sampled_simulation
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from Simulation.core.programs import PROGRAM_TRAP
+from Core.csr import CSRExceptionCode
+
+
+def test_sampling_window(tmpdir):
+    """
+    Sampled simulation: fast-forward, warm-up and measured window.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+
+    result = sampled_simulation(hex_file, skip=3, window=4, warmup=2)
+    assert result['skipped'] == 3
+    assert result['instructions'] == 4
+    assert result['cycles'] >= 4 and result['cpi'] == result['cycles'] / 4.0
+    assert result['toHost'] == 0
+
+    # Run to the end: same result of the ISS.
+    result = sampled_simulation(hex_file, skip=3, window=100)
+    assert result['instructions'] == 1 + 5 * 2 + 2 - 3
+    assert result['toHost'] == 1
+
+
+def test_sampling_state(tmpdir):
+    """
+    Sampled simulation: the core continues from the CSR state of the ISS (after a trap).
+    """
+    hex_file = str(tmpdir.join('trap.hex'))
+    write_hex(hex_file, PROGRAM_TRAP)
+
+    result = sampled_simulation(hex_file, skip=1, window=100)
+    assert result['toHost'] == CSRExceptionCode.E_ECALL_FROM_M
+    assert result['instructions'] == 2
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
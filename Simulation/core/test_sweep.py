@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.sweep import configurations
+from Simulation.sweep import config_name
+from Simulation.sweep import run_sweep
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+import json
+
+
+def test_sweep_configurations():
+    """
+    Sweep: the geometry of a disabled cache is not explored. The replacement policy is
+    named if it is not LRU.
+    """
+    configs = configurations({('ICache', 'Ways'): [2, 4], ('DCache', 'Enable'): ['yes', 'no'], ('DCache', 'Ways'): [2, 4]})
+    assert [config_name(config) for config in configs] == ['IC=5/8/2 DC=5/8/2 BP=off', 'IC=5/8/2 DC=5/8/4 BP=off',
+                                                           'IC=5/8/2 DC=off BP=off', 'IC=5/8/4 DC=5/8/2 BP=off',
+                                                           'IC=5/8/4 DC=5/8/4 BP=off', 'IC=5/8/4 DC=off BP=off']
+    configs = configurations({('DCache', 'Ways'): [8], ('DCache', 'Replacement'): ['lru', 'plru', 'random']})
+    assert [config_name(config) for config in configs] == ['IC=5/8/2 DC=5/8/8 BP=off', 'IC=5/8/2 DC=5/8/8/PLRU BP=off',
+                                                           'IC=5/8/2 DC=5/8/8/RANDOM BP=off']
+
+
+def test_sweep_timing_keys():
+    """
+    Sweep: the pipelined caches and the branch predictor are part of the name of a
+    configuration (the key of the results). The predictor is not explored if disabled.
+    """
+    configs = configurations({('ICache', 'Pipelined'): ['no', 'yes'], ('BranchPredictor', 'Enable'): ['no', 'yes'],
+                              ('BranchPredictor', 'History'): ['bimodal', 'gshare']})
+    assert [config_name(config) for config in configs] == ['IC=5/8/2 DC=5/8/2 BP=off', 'IC=5/8/2 DC=5/8/2 BP=6/BIMODAL/8/8',
+                                                           'IC=5/8/2 DC=5/8/2 BP=6/GSHARE/8/8', 'IC=5/8/2/P DC=5/8/2 BP=off',
+                                                           'IC=5/8/2/P DC=5/8/2 BP=6/BIMODAL/8/8',
+                                                           'IC=5/8/2/P DC=5/8/2 BP=6/GSHARE/8/8']
+
+
+def test_sweep(tmpdir):
+    """
+    Sweep: run the configurations in parallel, and resume from the results file.
+    """
+    hex_file     = str(tmpdir.join('loop.hex'))
+    results_file = str(tmpdir.join('sweep.json'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    ranges = {('ICache', 'BlockWidth'): [4, 5]}
+
+    run_sweep(ranges, [hex_file], 2, results_file)
+    with open(results_file) as f:
+        results = json.load(f)
+    assert sorted(results) == ['IC=4/8/2 DC=5/8/2 BP=off', 'IC=5/8/2 DC=5/8/2 BP=off']
+    for result in [runs[hex_file] for runs in results.values()]:
+        assert result['outcome'] == 'passed' and result['instret'] == 1 + 5 * 2 + 2
+        assert result['ic_miss'] > 0 and result['cycles'] == sum(result['cpi_stack'].values()) + 5
+
+    # Completed runs are not executed again.
+    results['IC=4/8/2 DC=5/8/2 BP=off'][hex_file]['cycles'] = 12345
+    with open(results_file, 'w') as f:
+        json.dump(results, f)
+    table = run_sweep(ranges, [hex_file], 2, results_file)
+    assert '12345' in table.splitlines()[1]
+
+
+def test_sweep_error(tmpdir):
+    """
+    Sweep: a workload that raises an unexpected exception is recorded as an error,
+    and the sweep continues.
+    """
+    hex_file     = str(tmpdir.join('loop.hex'))
+    elf_file     = str(tmpdir.join('truncated.elf'))
+    results_file = str(tmpdir.join('sweep.json'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    with open(elf_file, 'wb') as f:
+        f.write(b'\x7fELF')
+
+    run_sweep({}, [elf_file, hex_file], 1, results_file)
+    with open(results_file) as f:
+        results = json.load(f)['IC=5/8/2 DC=5/8/2 BP=off']
+    assert results[elf_file]['outcome'] == 'error' and results[elf_file]['message'].startswith('error: ')
+    assert results[hex_file]['outcome'] == 'passed'
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
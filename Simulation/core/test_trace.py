@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Simulation.core.trace import elaborate
+from Simulation.core.trace import VCDTracer
+from Simulation.core.cycle_sim import CycleSimulation
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import core_testbench
+from Simulation.core.testbench import TICK_PERIOD
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+from myhdl import always
+from myhdl import modbv
+from myhdl import Signal
+from myhdl import Simulation
+
+
+def _read_vcd(vcd_file):
+    """
+    Return the scopes (dotted paths), and the timestamps and values of the
+    vector signals of a VCD file.
+    """
+    scopes = []
+    times  = []
+    values = []
+    path   = []
+    with open(vcd_file) as f:
+        for line in f:
+            if line.startswith('$scope'):
+                path.append(line.split()[2])
+                scopes.append('.'.join(path))
+            elif line.startswith('$upscope'):
+                path.pop()
+            elif line.startswith('#'):
+                times.append(int(line[1:]))
+            elif line.startswith('b'):
+                values.append(int(line.split()[0][1:], 2))
+    return scopes, times, values
+
+
+def _counters(clk, count, other):
+    """
+    Two counters, in two instances.
+    """
+    def counter(clk, count):
+        @always(clk.posedge)
+        def rtl():
+            count.next = count + 1
+        return rtl
+
+    low  = counter(clk, count)  # noqa
+    high = counter(clk, other)  # noqa
+    return low, high
+
+
+def _trace(vcd_file, cycles, **options):
+    clk   = Signal(True)
+    count = Signal(modbv(0)[8:])
+    other = Signal(modbv(0)[8:])
+    dut, hierarchy = elaborate('top', _counters, clk, count, other)
+    if options.get('trigger') is not None:
+        value = options['trigger']
+        options['trigger'] = lambda: count == value
+    tracer = VCDTracer(vcd_file, hierarchy, **options)
+    sim    = CycleSimulation(clk, dut)
+    sim.run(cycles, stop=lambda: tracer.sample(sim.cycle, sim.cycle))
+    tracer.close()
+    return _read_vcd(vcd_file)
+
+
+def test_trace_window(tmpdir):
+    """
+    Tracer: select the scopes, and the window of cycles.
+    """
+    vcd_file = str(tmpdir.join('counter.vcd'))
+    scopes, times, values = _trace(vcd_file, 50, scopes=['low'], start=10, stop=20)
+    assert scopes == ['top', 'top.low']
+    assert times == list(range(10, 21))
+    assert values == list(range(10, 21))
+
+
+def test_trace_trigger(tmpdir):
+    """
+    Tracer: start a number of cycles before the trigger. Without a trigger, dump
+    the last cycles.
+    """
+    vcd_file = str(tmpdir.join('counter.vcd'))
+    scopes, times, values = _trace(vcd_file, 50, scopes=['high'], trigger=30, before=5, stop=35)
+    assert scopes == ['top', 'top.high']
+    assert times == list(range(25, 36))
+    assert values == list(range(25, 36))
+
+    scopes, times, values = _trace(vcd_file, 50, trigger=100, before=5)
+    assert times == list(range(46, 51))
+    assert values == [value for cycle in range(46, 51) for value in (cycle, cycle)]
+
+
+def test_trace_core(tmpdir):
+    """
+    Tracer: same trace for both engines (without the clock: sampled once per cycle).
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    vcd_file = str(tmpdir.join('loop.vcd'))
+    write_hex(hex_file, PROGRAM_LOOP)
+
+    traces = []
+    for testbench in (core_cycle_testbench, lambda hex_file, trace: Simulation(core_testbench(hex_file, trace)).run(quiet=1)):
+        testbench(hex_file, trace=dict(scopes=['cpath', 'dcache.lru_m'], start=100, stop=150))
+        with open(vcd_file) as f:
+            lines = f.read().splitlines()
+        clocks = [line.split()[3] for line in lines if line.startswith('$var') and line.split()[4] in ('clk', 'clk_i')]
+        traces.append([line for line in lines[3:] if line[1:] not in clocks])
+    assert traces[0] == traces[1]
+
+    scopes, times, _ = _read_vcd(vcd_file)
+    assert scopes == ['core', 'core.dut_core', 'core.dut_core.dcache', 'core.dut_core.dcache.lru_m', 'core.dut_core.cpath',
+                      'core.dut_core.cpath.dmem_wbm', 'core.dut_core.cpath.imem_wbm']
+    assert times[0] == 100 * TICK_PERIOD and times[-1] <= 150 * TICK_PERIOD
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
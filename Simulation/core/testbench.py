@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.core import Core
+from Core.csr import CSRCounterEvent
+from Core.wishbone import WishboneIntercon
+from Simulation.core.iss import ISS
+from Simulation.core.memory import Memory
+from Simulation.core.cycle_sim import CycleSimulation
+from Simulation.core.checkpoint import save_checkpoint
+from Simulation.core.checkpoint import restore_checkpoint
+from Simulation.core.commit_log import CommitLog
+from Simulation.core.cpi_stack import CPIStack
+from Simulation.core.cache_analyzer import CacheTrace
+from Simulation.core.monitor import find_object
+from Simulation.core.trace import elaborate
+from Simulation.core.trace import VCDTracer
+from myhdl import instance
+from myhdl import always
+from myhdl import Signal
+from myhdl import delay
+from myhdl import modbv
+from myhdl import StopSimulation
+from myhdl import now
+from myhdl import Error
+from myhdl._Simulation import _flatten
+from myhdl._simulator import _signals
+import os
+import sys
+
+if sys.version_info[0] < 3:
+    import ConfigParser as cp
+else:
+    import configparser as cp
+
+# Constans for simulation.
+TICK_PERIOD = 10
+TIMEOUT     = 10000
+RESET_TIME  = 5
+
+# CPI stacks of the tests in the session (hex_file, CPIStack), for the summary.
+CPI_STACKS = []
+
+
+def read_config(config_file='Simulation/core/algol.ini'):
+    """
+    Parameters of the core (caches) and the simulation memory.
+    """
+    config = cp.ConfigParser()
+    config.read(config_file)
+    return config
+
+
+def core_system(clk, rst, toHost, hex_file, config=None):
+    """
+    Connect the Core to the simulation memory, using wishbone interconnects.
+
+    :param config: Parameters of the core and the memory (ConfigParser). None: algol.ini
+    """
+    imem = WishboneIntercon()
+    dmem = WishboneIntercon()
+
+    if config is None:
+        config = read_config()
+
+    dut_core = Core(clk_i=clk,
+                    rst_i=rst,
+                    imem=imem,
+                    dmem=dmem,
+                    toHost=toHost,
+                    IC_ENABLE=config.getboolean('ICache', 'Enable'),
+                    IC_BLOCK_WIDTH=config.getint('ICache', 'BlockWidth'),
+                    IC_SET_WIDTH=config.getint('ICache', 'SetWidth'),
+                    IC_NUM_WAYS=config.getint('ICache', 'Ways'),
+                    IC_REPLACEMENT=config.get('ICache', 'Replacement').upper(),
+                    IC_PIPELINED=config.getboolean('ICache', 'Pipelined'),
+                    DC_ENABLE=config.getboolean('DCache', 'Enable'),
+                    DC_BLOCK_WIDTH=config.getint('DCache', 'BlockWidth'),
+                    DC_SET_WIDTH=config.getint('DCache', 'SetWidth'),
+                    DC_NUM_WAYS=config.getint('DCache', 'Ways'),
+                    DC_REPLACEMENT=config.get('DCache', 'Replacement').upper(),
+                    DC_PIPELINED=config.getboolean('DCache', 'Pipelined'),
+                    BP_ENABLE=config.getboolean('BranchPredictor', 'Enable'),
+                    BP_BTB_WIDTH=config.getint('BranchPredictor', 'BTBWidth'),
+                    BP_HISTORY=config.get('BranchPredictor', 'History').upper(),
+                    BP_BHT_WIDTH=config.getint('BranchPredictor', 'HistoryWidth'),
+                    BP_RAS_DEPTH=config.getint('BranchPredictor', 'RASDepth'))
+
+    memory = Memory(clka_i=clk,
+                    rsta_i=rst,
+                    imem=imem,
+                    clkb_i=clk,
+                    rstb_i=rst,
+                    dmem=dmem,
+                    SIZE=int(config.get('Memory', 'Size'), 16),
+                    HEX=hex_file,
+                    BYTES_X_LINE=config.getint('Memory', 'Bytes_x_line'),
+                    PAGED=config.getboolean('Memory', 'Paged'))
+
+    return dut_core, memory
+
+
+def core_tracer(hex_file, hierarchy, dut, toHost, trigger=None, **options):
+    """
+    Selective tracer for the core system. The VCD file is saved next to the program.
+
+    :param trigger: 'tohost' (the write to toHost), or an address for the PC of the decode stage
+    :param options: Options of VCDTracer: scopes, start, stop, before
+    """
+    if trigger == 'tohost':
+        trigger = lambda: toHost != 0  # noqa
+    elif trigger is not None:
+        id_pc   = find_object(_flatten(dut), 'Datapath', 'id_pc')
+        address = int(trigger, 0)
+        trigger = lambda: id_pc == address  # noqa
+    vcd_file = '{0}.vcd'.format(os.path.splitext(hex_file)[0])
+    return VCDTracer(vcd_file, hierarchy, trigger=trigger, **options)
+
+
+def core_testbench(hex_file, trace=None, commit_log=None, cpi_stack=False, profiler=None):
+    """
+    Connect the Core to the simulation memory, using wishbone interconnects.
+    Assert the core for RESET_TIME.
+
+    Finish the test after TIMEOUT units of time, or a write to toHost register.
+    If toHost is different of 1, the test failed.
+
+    :param trace:      Options of the selective tracer (see core_tracer). None: disabled
+    :param commit_log: Commit trace file. None: disabled
+    :param cpi_stack:  Classify the cycles, and print the CPI stack at the end of the test
+    :param profiler:   Profile the blocks of the core, by instance (see Simulation.profiler). None: disabled
+    """
+    clk = Signal(True)
+    rst = Signal(False)
+
+    toHost = Signal(modbv(0)[32:])
+
+    if trace is None and profiler is None:
+        dut    = core_system(clk, rst, toHost, hex_file)
+        tracer = None
+    else:
+        dut, hierarchy = elaborate('core', core_system, clk, rst, toHost, hex_file)
+        tracer         = core_tracer(hex_file, hierarchy, dut, toHost, **trace) if trace is not None else None
+    if profiler is not None:
+        profiler.attach(_flatten(dut), hierarchy)
+    log   = CommitLog(commit_log, _flatten(dut)) if commit_log else None
+    stack = CPIStack(_flatten(dut)) if cpi_stack else None
+
+    def finish():
+        if tracer is not None:
+            tracer.close()
+        if log is not None:
+            log.close()
+        if stack is not None:
+            report_cpi_stack(hex_file, stack)
+
+    @always(delay(int(TICK_PERIOD / 2)))
+    def gen_clock():
+        clk.next = not clk
+
+    @always(toHost)
+    def toHost_check():
+        """
+        Wait for a write to toHost register.
+        """
+        finish()
+        if toHost != 1:
+            raise Error('Test failed. MTOHOST = {0}. Time = {1}'.format(toHost, now()))
+        print("Time: {0}".format(now()))
+        raise StopSimulation
+
+    @instance
+    def timeout():
+        """
+        Wait until timeout.
+        """
+        rst.next = True
+        yield delay(RESET_TIME * TICK_PERIOD)
+        rst.next = False
+        yield delay(TIMEOUT * TICK_PERIOD)
+        finish()
+        raise Error("Test failed: Timeout")
+
+    samplers = []
+    if tracer is not None:
+        samplers.append(lambda: tracer.sample(now() // TICK_PERIOD, now() - TICK_PERIOD // 2))
+    if log is not None:
+        samplers.append(lambda: log.update(now() // TICK_PERIOD + 1))
+    if stack is not None:
+        samplers.append(lambda: None if rst else stack.update())
+
+    @always(clk.negedge)
+    def sample():
+        """
+        Tracer, commit trace and CPI stack: sample the signals in the middle of the cycle,
+        after the first edge. The timestamp is the time of the last edge.
+        """
+        if now() > TICK_PERIOD // 2:
+            for sampler in samplers:
+                sampler()
+
+    if not samplers:
+        return dut, gen_clock, timeout, toHost_check
+    return dut, gen_clock, timeout, toHost_check, sample
+
+
+def core_cycle_testbench(hex_file, checkpoint=0, restore=None, trace=None, commit_log=None, cpi_stack=False,
+                         cache_trace=None, config=None, stats=None, profiler=None):
+    """
+    Same testbench, using the cycle-based engine.
+
+    The reset is asserted for the first RESET_TIME - 1 edges of the clock, and
+    the time is reported as the time of the clock edge that writes to toHost:
+    the same values of the event-driven testbench.
+
+    :param checkpoint:  Save a checkpoint every 'checkpoint' cycles (0: disabled)
+    :param restore:     Continue the simulation from a checkpoint file
+    :param trace:       Options of the selective tracer (see core_tracer). None: disabled
+    :param commit_log:  Commit trace file. None: disabled
+    :param cpi_stack:   Classify the cycles, and print the CPI stack at the end of the test
+    :param cache_trace: Write the address streams of the I$ and the D$. None: disabled
+    :param config:      Parameters of the core and the memory (ConfigParser). None: algol.ini
+    :param stats:       Dictionary, updated at the end of the test with the cycles, the retired instructions,
+                        the CPI stack (by category) and the performance counters (see core_statistics).
+                        None: disabled
+    :param profiler:    Profile the blocks of the core, by instance (see Simulation.profiler). None: disabled
+    :returns:           The time of the write to toHost
+    """
+    first = len(_signals)
+    clk   = Signal(True)
+    rst   = Signal(False)
+
+    toHost = Signal(modbv(0)[32:])
+
+    if trace is None and profiler is None:
+        dut    = core_system(clk, rst, toHost, hex_file, config)
+        tracer = None
+    else:
+        dut, hierarchy = elaborate('core', core_system, clk, rst, toHost, hex_file, config)
+        tracer         = core_tracer(hex_file, hierarchy, dut, toHost, **trace) if trace is not None else None
+    if profiler is not None:
+        profiler.attach(_flatten(dut), hierarchy)
+    signals = _signals[first:]
+    sim     = CycleSimulation(clk, dut)
+    end     = RESET_TIME + TIMEOUT
+    log     = CommitLog(commit_log, _flatten(dut)) if commit_log else None
+    stack   = CPIStack(_flatten(dut)) if cpi_stack or stats is not None else None
+    caches  = CacheTrace(_flatten(dut)) if cache_trace else None
+
+    def sample():
+        if tracer is not None:
+            tracer.sample(sim.cycle, sim.cycle * TICK_PERIOD)
+        if log is not None and toHost == 0:
+            log.update(sim.cycle + 1)
+        if not rst and toHost == 0:
+            if stack is not None:
+                stack.update()
+            if caches is not None:
+                caches.update()
+
+    def stop():
+        sample()
+        return toHost != 0
+
+    if restore:
+        restore_checkpoint(restore, sim, signals, _flatten(dut))
+        print("Restored: {0} (cycle {1})".format(restore, sim.cycle))
+    else:
+        rst.next = True
+        sim.run(RESET_TIME - 1, stop=sample)
+        rst.next = False
+
+    while sim.cycle < end and toHost == 0:
+        cycles = end - sim.cycle
+        if checkpoint:
+            cycles = min(cycles, checkpoint - sim.cycle % checkpoint)
+        sim.run(cycles, stop=stop)
+        if checkpoint and sim.cycle < end and toHost == 0:
+            ckp_file = checkpoint_file(hex_file, sim.cycle)
+            save_checkpoint(ckp_file, sim, signals, _flatten(dut))
+            print("Checkpoint: {0}".format(ckp_file))
+
+    if tracer is not None:
+        tracer.close()
+    if log is not None:
+        log.close()
+    if cpi_stack:
+        report_cpi_stack(hex_file, stack)
+    if caches is not None:
+        caches.save(cache_trace)
+    if stats is not None:
+        stats.update(core_statistics(_flatten(dut)), cycles=sim.cycle, instret=stack.retired, cpi_stack=dict(stack.cycles))
+
+    if toHost == 0:
+        raise Error("Test failed: Timeout")
+    time = sim.cycle * TICK_PERIOD
+    if toHost != 1:
+        raise Error('Test failed. MTOHOST = {0}. Time = {1}'.format(toHost, time))
+    print("Time: {0}".format(time))
+    return time
+
+
+def core_statistics(blocks):
+    """
+    Read the performance counters of the core: the events of the hpmcounters
+    (see CSRCounterEvent), by name in lower case.
+    """
+    counters = find_object(blocks, 'CSR', 'hpmcounter')
+    return dict((name.lower(), int(counters[event])) for name, event in vars(CSRCounterEvent).items()
+                if name.isupper() and name not in ('N_EVENTS', 'FIRST_COUNTER'))
+
+
+def report_cpi_stack(hex_file, stack):
+    """
+    Print the CPI stack of a test, and keep it for the summary of the session.
+    """
+    print(stack.report(hex_file))
+    CPI_STACKS.append((hex_file, stack))
+
+
+def checkpoint_file(hex_file, cycle):
+    """
+    Name of the checkpoint file of a program, at a given cycle.
+    """
+    return '{0}.{1}.ckp'.format(os.path.splitext(hex_file)[0], cycle)
+
+
+def iss_testbench(hex_file):
+    """
+    Create the ISS, using the same memory configuration of the core testbench.
+    """
+    config = read_config()
+
+    return ISS(size_mem=int(config.get('Memory', 'Size'), 16),
+               hex_file=hex_file,
+               bytes_x_line=config.getint('Memory', 'Bytes_x_line'))
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
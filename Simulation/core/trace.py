@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from myhdl import EnumItemType
+from myhdl._extractHierarchy import _HierExtr
+from myhdl._simulator import _signals
+from collections import deque
+import time
+
+# Identifier codes: printable ASCII characters.
+VCD_CODES = ''.join(chr(code) for code in range(33, 127))
+
+
+def _code(index):
+    code = VCD_CODES[index % len(VCD_CODES)]
+    while index >= len(VCD_CODES):
+        index = index // len(VCD_CODES) - 1
+        code  = VCD_CODES[index % len(VCD_CODES)] + code
+    return code
+
+
+def elaborate(name, dut, *args):
+    """
+    Elaborate a design, keeping the hierarchy (instance names) for the tracer.
+
+    :returns: (instances, hierarchy)
+    """
+    hierarchy = _HierExtr(name, dut, *args)
+    return hierarchy.top, hierarchy.hierarchy
+
+
+class VCDTracer(object):
+    """
+    Selective VCD writer, sampled once per clock cycle: only the signals of the
+    selected scopes, and only inside a window of cycles.
+
+    The window opens at the 'start' cycle, or when the trigger is true (checked
+    each cycle, from the 'start' cycle), and closes after the 'stop' cycle. The
+    last 'before' cycles before the window are kept in memory, and dumped when
+    it opens. If the trigger never fires, close() dumps the buffered cycles:
+    with a trigger on the write to toHost, the last cycles of the simulation.
+
+    Before the window, and without a buffer, a sample costs a comparison.
+    """
+    def __init__(self, vcd_file, hierarchy, scopes=None, start=0, stop=None, trigger=None, before=0):
+        """
+        :param vcd_file:  Output file
+        :param hierarchy: Hierarchy of the design (from elaborate())
+        :param scopes:    Instance names or dotted paths (for example: 'cpath', 'dcache.lru_m'). None: all
+        :param start:     First cycle of the window
+        :param stop:      Last cycle of the window. None: until the end
+        :param trigger:   Optional function: open the window when it returns True
+        :param before:    Number of cycles kept before the window
+        """
+        assert before >= 0, "Error, invalid number of cycles before the trigger: {0}".format(before)
+        self.vcd_file  = vcd_file
+        self.start     = start
+        self.stop      = stop
+        self.trigger   = trigger
+        self.before    = before
+        self.signals   = []
+        self._scopes   = []
+        self._index    = {}
+        self._select(hierarchy, scopes)
+        assert self.signals, "Error, no signals in the scopes: {0}".format(', '.join(scopes))
+        self._last     = [_value(sig) for sig in self.signals]
+        self._base     = list(self._last)
+        self._buffer   = deque()
+        self._file     = None
+        self._active   = False
+        self._done     = False
+
+    def _select(self, hierarchy, scopes):
+        """
+        Collect the signals of the selected instances, and their children.
+        """
+        patterns = ['.{0}.'.format(scope) for scope in scopes] if scopes else None
+        path     = []
+        for inst in hierarchy:
+            if inst.name is None:
+                continue
+            del path[inst.level - 1:]
+            path.append(inst.name)
+            # A module that returns a single instance repeats its name.
+            if len(path) > 1 and path[-1] == path[-2] and not inst.sigdict and not inst.memdict:
+                path.pop()
+                continue
+            if patterns and not any(pattern in '.{0}.'.format('.'.join(path)) for pattern in patterns):
+                continue
+            variables = []
+            for name, sig in sorted(inst.sigdict.items()):
+                variables.append((name, self._add(sig)))
+            for name, mem in sorted(inst.memdict.items()):
+                if mem.mem is _signals:
+                    continue
+                for ii, sig in enumerate(mem.mem):
+                    variables.append(('{0}({1})'.format(name, ii), self._add(sig)))
+            if variables:
+                self._scopes.append((list(path), variables))
+
+    def _add(self, sig):
+        if id(sig) not in self._index:
+            self._index[id(sig)] = len(self.signals)
+            self.signals.append(sig)
+        return self._index[id(sig)]
+
+    @staticmethod
+    def _format(sig, value, code):
+        if isinstance(value, EnumItemType):
+            return 's{0} {1}'.format(value, code)
+        if sig._nrbits == 1:
+            return '{0:d}{1}'.format(int(value), code)
+        return 'b{0:b} {1}'.format(int(value), code)
+
+    def _changes(self):
+        last    = self._last
+        changes = []
+        for ii, sig in enumerate(self.signals):
+            if sig._val != last[ii]:
+                last[ii] = _value(sig)
+                changes.append((ii, last[ii]))
+        return changes
+
+    def _header(self):
+        """
+        Create the file, and write the declarations of the scopes and signals.
+        """
+        f = self._file = open(self.vcd_file, 'w')
+        f.write('$date\n    {0} UTC\n$end\n$version\n    Algol selective tracer\n$end\n'.format(_now()))
+        f.write('$timescale\n    1ns\n$end\n')
+        opened = []
+        for path, variables in self._scopes:
+            common = 0
+            while common < min(len(opened), len(path)) and opened[common] == path[common]:
+                common += 1
+            for _ in range(len(opened) - common):
+                f.write('$upscope $end\n')
+            for name in path[common:]:
+                f.write('$scope module {0} $end\n'.format(name))
+            opened = path
+            for name, ii in variables:
+                sig = self.signals[ii]
+                f.write('$var {0} {1} {2} {3} $end\n'.format('string' if isinstance(sig._val, EnumItemType) else 'reg',
+                                                             sig._nrbits, _code(ii), name))
+        for _ in opened:
+            f.write('$upscope $end\n')
+        f.write('$enddefinitions $end\n')
+
+    def _open(self, timestamp):
+        """
+        Open the window: write the header, the values at the start of the buffer,
+        and the buffered cycles.
+        """
+        self._header()
+        f = self._file
+        if self._buffer:
+            timestamp, changes = self._buffer.popleft()
+        else:
+            changes = self._changes()
+        for ii, value in changes:
+            self._base[ii] = value
+        f.write('#{0}\n$dumpvars\n'.format(timestamp))
+        for ii, sig in enumerate(self.signals):
+            f.write(self._format(sig, self._base[ii], _code(ii)) + '\n')
+        f.write('$end\n')
+        while self._buffer:
+            self._write(*self._buffer.popleft())
+        self._active = True
+
+    def _write(self, timestamp, changes):
+        if changes:
+            self._file.write('#{0}\n'.format(timestamp))
+            self._file.write(''.join(self._format(self.signals[ii], value, _code(ii)) + '\n' for ii, value in changes))
+
+    def sample(self, cycle, timestamp):
+        """
+        Sample the signals, after a clock edge.
+
+        :param cycle:     Number of the clock cycle
+        :param timestamp: Simulation time (VCD timestamp)
+        """
+        if self._done:
+            return
+        if self.stop is not None and cycle > self.stop:
+            self.close()
+            return
+        if not self._active:
+            if cycle >= self.start and (self.trigger is None or self.trigger()):
+                self._open(timestamp)
+            elif self.before:
+                changes = self._changes()
+                self._buffer.append((timestamp, changes))
+                if len(self._buffer) > self.before:
+                    for ii, value in self._buffer.popleft()[1]:
+                        self._base[ii] = value
+                return
+            else:
+                return
+        self._write(timestamp, self._changes())
+
+    def close(self):
+        """
+        Finish the trace. If the window did not open, dump the buffered cycles
+        (without a buffer, the file only has the declarations).
+        """
+        if self._done:
+            return
+        self._done = True
+        if not self._active and self._buffer:
+            self._open(None)
+        elif not self._active:
+            self._header()
+        self._file.close()
+
+
+def _value(sig):
+    return sig._val if isinstance(sig._val, (bool, EnumItemType)) else int(sig._val)
+
+
+def _now():
+    return time.asctime(time.gmtime())
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
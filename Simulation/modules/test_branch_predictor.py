@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core.branch_predictor import BranchPredictor
+from Core.branch_predictor import BranchPredictorIO
+from Core.branch_predictor import HISTORY_SCHEMES
+from Core.branch_predictor import ReturnAddressStack
+from Core.branch_predictor import ReturnAddressStackIO
+import pytest
+from myhdl import instance
+from myhdl import Signal
+from myhdl import delay
+from myhdl import Simulation
+from myhdl import StopSimulation
+from myhdl import toVerilog
+
+BRANCH_PC = 0x00000240
+TARGET_PC = 0x00000200
+JUMP_PC   = 0x00000300
+CALL      = 0x000000ef  # jal  ra, 0
+RET       = 0x00008067  # jalr zero, 0(ra)
+CO_CALL   = 0x000280e7  # jalr ra, 0(t0): pop and push
+LINK_CALL = 0x000080e7  # jalr ra, 0(ra): push
+JUMP_REG  = 0x00030067  # jalr zero, 0(t1)
+NOP       = 0x00000013
+
+
+def _run(trace, HISTORY='BIMODAL', ENABLE=True):
+    """
+    Lookup each instruction of the trace at IF, and update the predictor with the
+    outcome at ID. Return the predictions: (taken, target).
+
+    :param trace: List of (pc, kind, taken, target). kind: 'branch', 'jump' or 'other'
+    """
+    clk         = Signal(False)
+    rst         = Signal(True)
+    io          = BranchPredictorIO(BHT_WIDTH=8)
+    dut         = BranchPredictor(clk, rst, io, ENABLE=ENABLE, BTB_WIDTH=4, HISTORY=HISTORY, BHT_WIDTH=8)
+    predictions = []
+
+    def cycle():
+        yield delay(1)
+        clk.next = 1
+        yield delay(5)
+        clk.next = 0
+        yield delay(5)
+
+    @instance
+    def stimulus():
+        yield cycle()
+        rst.next = False
+        for pc, kind, taken, target in trace:
+            io.if_pc.next = pc
+            yield delay(1)
+            predictions.append((bool(io.if_taken), int(io.if_target)))
+            io.id_update.next = kind != 'other' or io.if_taken
+            io.id_pc.next     = pc
+            io.id_index.next  = io.if_index
+            io.id_branch.next = kind == 'branch'
+            io.id_jump.next   = kind == 'jump'
+            io.id_taken.next  = taken
+            io.id_target.next = target
+            yield cycle()
+            io.id_update.next = False
+        raise StopSimulation
+
+    Simulation(dut, stimulus).run(quiet=1)
+    return predictions
+
+
+def _mispredictions(trace, predictions):
+    return sum(1 for (pc, kind, taken, target), (p_taken, p_target) in zip(trace, predictions)
+               if p_taken != taken or (taken and p_target != target))
+
+
+def _branch_trace(pattern, repeat):
+    return [(BRANCH_PC, 'branch', outcome, TARGET_PC) for outcome in pattern * repeat]
+
+
+@pytest.mark.parametrize('HISTORY', HISTORY_SCHEMES)
+def test_branch_predictor_loop(HISTORY):
+    """
+    Predictor: a loop branch. After the warm-up, only the exit of the loop is mispredicted
+    (bimodal), or none at all (gshare: the history covers the loop).
+    """
+    pattern     = [True] * 7 + [False]
+    trace       = _branch_trace(pattern, 16)
+    predictions = _run(trace, HISTORY)
+    assert not predictions[0][0]
+    assert all(target == TARGET_PC for taken, target in predictions[8:] if taken)
+    expected = {'BIMODAL': 8, 'GSHARE': 0}[HISTORY]
+    assert _mispredictions(trace[-64:], predictions[-64:]) == expected
+
+
+@pytest.mark.parametrize('HISTORY', HISTORY_SCHEMES)
+def test_branch_predictor_alternate(HISTORY):
+    """
+    Predictor: an alternating branch defeats the bimodal counters, gshare learns it.
+    """
+    trace       = _branch_trace([True, False], 32)
+    predictions = _run(trace, HISTORY)
+    mispredictions = _mispredictions(trace[-32:], predictions[-32:])
+    if HISTORY == 'GSHARE':
+        assert mispredictions == 0
+    else:
+        assert mispredictions >= 16
+
+
+def test_branch_predictor_jump():
+    """
+    Predictor: a jump is predicted taken after the first execution, and a stale entry
+    (the instruction is not a branch anymore) is removed.
+    """
+    trace = [(JUMP_PC, 'jump', True, TARGET_PC)] * 3 + [(JUMP_PC, 'other', False, 0)] * 2
+    assert _run(trace) == [(False, 0), (True, TARGET_PC), (True, TARGET_PC), (True, TARGET_PC), (False, 0)]
+
+
+def test_branch_predictor_disabled():
+    """
+    Predictor: disabled, always predict not taken.
+    """
+    trace = _branch_trace([True], 8) + [(JUMP_PC, 'jump', True, TARGET_PC)] * 2
+    assert not any(taken for taken, target in _run(trace, ENABLE=False))
+
+
+def _run_ras(steps, DEPTH=4, ENABLE=True):
+    """
+    Each cycle: predecode the instruction at IF, and update the stack with the
+    instruction at ID. Return the predictions: (return, target).
+
+    :param steps: List of (IF instruction, ID instruction, ID PC)
+    """
+    clk         = Signal(False)
+    rst         = Signal(True)
+    io          = ReturnAddressStackIO()
+    dut         = ReturnAddressStack(clk, rst, io, ENABLE=ENABLE, DEPTH=DEPTH)
+    predictions = []
+
+    def cycle():
+        yield delay(1)
+        clk.next = 1
+        yield delay(5)
+        clk.next = 0
+        yield delay(5)
+
+    @instance
+    def stimulus():
+        yield cycle()
+        rst.next = False
+        for if_instruction, id_instruction, id_pc in steps:
+            io.if_instruction.next = if_instruction
+            io.id_instruction.next = id_instruction
+            io.id_pc.next          = id_pc
+            io.id_update.next      = True
+            yield delay(1)
+            predictions.append((bool(io.if_return), int(io.if_target)))
+            yield cycle()
+        raise StopSimulation
+
+    Simulation(dut, stimulus).run(quiet=1)
+    return predictions
+
+
+def test_return_address_stack():
+    """
+    RAS: calls push, returns pop, and the operation at ID is forwarded to the prediction.
+    """
+    steps = [(NOP, CALL, 0x100), (NOP, CALL, 0x200), (NOP, CALL, 0x300),
+             (RET, NOP, 0),            # top
+             (RET, RET, 0x600),        # forward the pop
+             (RET, CALL, 0x400),       # forward the push
+             (RET, CO_CALL, 0x500),    # forward the pop and push (0x404 replaced)
+             (RET, RET, 0x600),
+             (RET, RET, 0x600),
+             (LINK_CALL, NOP, 0), (JUMP_REG, NOP, 0), (CALL, NOP, 0)]
+    predictions = _run_ras(steps)
+    assert predictions[3:9] == [(True, 0x304), (True, 0x204), (True, 0x404), (True, 0x504), (True, 0x204),
+                                (True, 0x104)]
+    assert not any(ret for ret, target in predictions[9:])
+
+
+def test_return_address_stack_overflow():
+    """
+    RAS: an overflow overwrites the oldest entries. Disabled: no prediction.
+    """
+    calls       = [(NOP, CALL, pc) for pc in range(0x100, 0x700, 0x100)]
+    returns     = [(RET, NOP, 0)] + [(RET, RET, 0x800)] * 5
+    predictions = _run_ras(calls + returns)
+    assert [target for ret, target in predictions[6:]] == [0x604, 0x504, 0x404, 0x304, 0x604, 0x504]
+    assert not any(ret for ret, target in _run_ras(calls + returns, ENABLE=False))
+
+
+@pytest.mark.parametrize('HISTORY', HISTORY_SCHEMES)
+def test_branch_predictor_convert(HISTORY, tmpdir, monkeypatch):
+    """
+    Predictor: convertible to Verilog.
+    """
+    monkeypatch.chdir(str(tmpdir))
+    toVerilog(BranchPredictor, Signal(False), Signal(False), BranchPredictorIO(BHT_WIDTH=6), BTB_WIDTH=4,
+              HISTORY=HISTORY, BHT_WIDTH=6)
+    assert tmpdir.join('BranchPredictor.v').check()
+
+
+def test_return_address_stack_convert(tmpdir, monkeypatch):
+    """
+    RAS: convertible to Verilog.
+    """
+    monkeypatch.chdir(str(tmpdir))
+    toVerilog(ReturnAddressStack, Signal(False), Signal(False), ReturnAddressStackIO(), DEPTH=4)
+    assert tmpdir.join('ReturnAddressStack.v').check()
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+from Core import cache_lru
+from Core.cache_lru import CacheLRU
+from Core.cache_lru import LRUTable
+from Core.cache_lru import lru_matrix
+import pytest
+from myhdl import instance
+from myhdl import Signal
+from myhdl import modbv
+from myhdl import delay
+from myhdl import Simulation
+from myhdl import StopSimulation
+
+
+def _testbench(monkeypatch, NUMWAYS):
+    """
+    All the histories and accesses: the transition table must return the same
+    values of the matrix algorithm.
+    """
+    WIDTH   = (NUMWAYS * (NUMWAYS - 1)) >> 1
+    current = Signal(modbv(0)[WIDTH:])
+    access  = Signal(modbv(0)[NUMWAYS:])
+    outputs = [[Signal(modbv(0)[WIDTH:]), Signal(modbv(0)[NUMWAYS:]), Signal(modbv(0)[NUMWAYS:])] for _ in range(2)]
+
+    lru_sim = CacheLRU(current, access, *outputs[0], NUMWAYS=NUMWAYS)
+    with monkeypatch.context() as m:
+        m.setattr(cache_lru, 'converting', lambda: True)  # force the matrix
+        lru_ref = CacheLRU(current, access, *outputs[1], NUMWAYS=NUMWAYS)
+
+    @instance
+    def stimulus():
+        for history in range(2**WIDTH):
+            for way in range(2**NUMWAYS):
+                current.next = history
+                access.next  = way
+                yield delay(1)
+                for name, value, ref in zip(('update', 'lru_pre', 'lru_post'), outputs[0], outputs[1]):
+                    assert value == ref, "ERROR {0}: history = {1:#x}, access = {2:#x}. Value = {3}.\tRef = {4}".format(
+                        name, history, way, value, ref)
+        raise StopSimulation
+
+    return lru_sim, lru_ref, stimulus
+
+
+@pytest.mark.parametrize('NUMWAYS', [2, 3, 4])
+def test_cache_lru(monkeypatch, NUMWAYS):
+    """
+    LRU: transition table vs matrix, exhaustive.
+    """
+    sim = Simulation(_testbench(monkeypatch, NUMWAYS))
+    sim.run()
+
+
+def test_cache_lru_table():
+    """
+    LRU: big tables are filled on use. Accessing the LRU way makes the next way
+    (in access order) the LRU.
+    """
+    table = LRUTable(8)
+    assert not table.table
+
+    history = 0
+    order   = [3, 0, 7, 1, 6, 2, 5, 4]
+    for way in order:
+        history = table.lookup(history, 1 << way)[0]
+    for ii, way in enumerate(order):
+        update, lru_pre, lru_post = table.lookup(history, 1 << way)
+        assert (update, lru_pre, lru_post) == lru_matrix(history, 1 << way, 8)
+        assert lru_pre == 1 << way and lru_post == 1 << order[(ii + 1) % 8]
+        history = update
+    assert 0 < len(table.table) <= 2 * len(order)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+from Core.cache_replacement import CachePLRU
+from Core.cache_replacement import CacheRandom
+from Core.cache_replacement import LFSR_WIDTH
+from Core.cache_replacement import REPLACEMENT_POLICIES
+from Core.cache_replacement import history_width
+import pytest
+from myhdl import instance
+from myhdl import Signal
+from myhdl import modbv
+from myhdl import delay
+from myhdl import Simulation
+from myhdl import StopSimulation
+from myhdl import toVerilog
+
+
+def _plru_victim(history, NUMWAYS):
+    node = 0
+    while node < NUMWAYS - 1:
+        node = 2 * node + (2 if (history >> node) & 1 else 1)
+    return node - (NUMWAYS - 1)
+
+
+def _plru_update(history, way, NUMWAYS):
+    node = way + NUMWAYS - 1
+    while node:
+        parent  = (node - 1) >> 1
+        history = (history & ~(1 << parent)) | ((node & 1) << parent)
+        node    = parent
+    return history
+
+
+def _signals(REPLACEMENT, NUMWAYS):
+    WIDTH = history_width(REPLACEMENT, NUMWAYS)
+    return [Signal(modbv(0)[WIDTH:]), Signal(modbv(0)[NUMWAYS:]), Signal(modbv(0)[WIDTH:]),
+            Signal(modbv(0)[NUMWAYS:]), Signal(modbv(0)[NUMWAYS:])]
+
+
+def _run(dut, steps):
+    """
+    Apply (current, access) to the module, and check the outputs.
+    """
+    current, access, update, lru_pre, lru_post = dut
+
+    @instance
+    def stimulus():
+        for history, way, check in steps:
+            current.next = history
+            access.next  = way
+            yield delay(1)
+            check(int(update), int(lru_pre), int(lru_post))
+        raise StopSimulation
+
+    return stimulus
+
+
+@pytest.mark.parametrize('NUMWAYS', [2, 4, 8])
+def test_cache_plru(NUMWAYS):
+    """
+    PLRU: all the histories and accesses, against a model of the tree.
+    """
+    dut   = _signals('PLRU', NUMWAYS)
+    steps = []
+    for history in range(2**(NUMWAYS - 1)):
+        for way in [None] + list(range(NUMWAYS)):
+            update = history if way is None else _plru_update(history, way, NUMWAYS)
+
+            def check(value, pre, post, history=history, update=update):
+                assert (value, pre, post) == (update, 1 << _plru_victim(history, NUMWAYS), 1 << _plru_victim(update, NUMWAYS))
+            steps.append((history, 0 if way is None else 1 << way, check))
+
+    sim = Simulation(CachePLRU(*dut, NUMWAYS=NUMWAYS), _run(dut, steps))
+    sim.run()
+
+
+def test_cache_plru_victim():
+    """
+    PLRU: after accessing all the ways in order, the victim is the first one.
+    The most recently used way is never the victim.
+    """
+    for NUMWAYS in (2, 4, 8, 16):
+        history = 0
+        for way in range(NUMWAYS):
+            history = _plru_update(history, way, NUMWAYS)
+            assert _plru_victim(history, NUMWAYS) != way
+        assert _plru_victim(history, NUMWAYS) == 0
+
+
+def test_cache_random():
+    """
+    Random: the LFSR never reaches zero, has a maximal period, and selects all the ways.
+    """
+    NUMWAYS = 16
+    current, access, update, lru_pre, lru_post = dut = _signals('RANDOM', NUMWAYS)
+    states  = set()
+    victims = set()
+
+    @instance
+    def stimulus():
+        access.next = 1
+        for _ in range(2**LFSR_WIDTH):
+            yield delay(1)
+            assert update != 0 and bin(lru_pre).count('1') == 1 and lru_post == 1 << (update % NUMWAYS)
+            states.add(int(update))
+            victims.add(int(lru_pre))
+            current.next = update
+        raise StopSimulation
+
+    sim = Simulation(CacheRandom(*dut, NUMWAYS=NUMWAYS), stimulus)
+    sim.run()
+    assert len(states) == 2**LFSR_WIDTH - 1 and len(victims) == NUMWAYS
+
+
+@pytest.mark.parametrize('REPLACEMENT', sorted(REPLACEMENT_POLICIES))
+def test_cache_replacement_convert(REPLACEMENT, tmpdir, monkeypatch):
+    """
+    Replacement: the policies are convertible to Verilog.
+    """
+    monkeypatch.chdir(str(tmpdir))
+    dut = _signals(REPLACEMENT, 4)
+    toVerilog(REPLACEMENT_POLICIES[REPLACEMENT], dut[0], dut[1], dut[2], dut[3], dut[4], NUMWAYS=4)
+    assert tmpdir.join('{0}.v'.format(REPLACEMENT_POLICIES[REPLACEMENT].__name__)).check()
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
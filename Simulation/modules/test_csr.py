@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+from Core import csr
+from Core.consts import Consts
+from Core.csr import CSR
+from Core.csr import CSR_TABLE
+from Core.csr import CSRAccess
+from Core.csr import CSRAddressMap
+from Core.csr import CSRCMD
+from Core.csr import CSRCounterIO
+from Core.csr import CSRExceptionIO
+from Core.csr import CSRFileRWIO
+from Core.csr import csr_map
+import random
+import pytest
+from myhdl import instance
+from myhdl import Signal
+from myhdl import modbv
+from myhdl import delay
+from myhdl import Simulation
+from myhdl import StopSimulation
+from myhdl import toVerilog
+
+
+def _csr(clk, rst, addr, cmd, wdata):
+    """
+    CSR file, with shared inputs.
+    """
+    rw        = CSRFileRWIO()
+    rw.addr   = addr
+    rw.cmd    = cmd
+    rw.wdata  = wdata
+    outputs   = dict(rw=rw, illegal_access=Signal(False), toHost=Signal(modbv(0)[32:]))
+    dut       = CSR(clk, rst, rw, CSRExceptionIO(), Signal(False), Signal(modbv(0)[2:]), outputs['illegal_access'],
+                    Signal(False), outputs['toHost'], CSRCounterIO())
+    return dut, outputs
+
+
+def _testbench(monkeypatch):
+    """
+    Read all the addresses, and write the RW registers: the lookup (simulation) and the
+    read bank (conversion) must return the same values.
+    """
+    clk   = Signal(False)
+    rst   = Signal(True)
+    addr  = Signal(modbv(0)[CSRAddressMap.SZ_ADDR:])
+    cmd   = Signal(modbv(0)[CSRCMD.SZ_CMD:])
+    wdata = Signal(modbv(0)[32:])
+
+    csr_sim, out_sim = _csr(clk, rst, addr, cmd, wdata)
+    with monkeypatch.context() as m:
+        m.setattr(csr, 'converting', lambda: True)  # force the read bank
+        csr_ref, out_ref = _csr(clk, rst, addr, cmd, wdata)
+
+    rows = csr_map()
+
+    def check(address):
+        assert out_sim['rw'].rdata == out_ref['rw'].rdata, "ERROR: address {0:#x}. Value = {1:#x}.\tRef = {2:#x}".format(
+            address, int(out_sim['rw'].rdata), int(out_ref['rw'].rdata))
+        assert out_sim['illegal_access'] == out_ref['illegal_access']
+        # Reset: machine mode. Only the undefined addresses are illegal.
+        assert out_sim['illegal_access'] == (address not in rows), "ERROR: address {0:#x}".format(address)
+
+    def cycle():
+        yield delay(1)
+        clk.next = 1
+        yield delay(5)
+        clk.next = 0
+        yield delay(5)
+
+    @instance
+    def stimulus():
+        yield cycle()
+        rst.next = False
+        cmd.next = CSRCMD.CSR_READ
+        for address in range(1 << CSRAddressMap.SZ_ADDR):
+            addr.next = address
+            yield delay(1)
+            check(address)
+        # RW registers: reset value, and write mask.
+        for address, register, access, reset, mask in CSR_TABLE:
+            if access != CSRAccess.RW:
+                continue
+            addr.next = address
+            cmd.next  = CSRCMD.CSR_READ
+            yield delay(1)
+            assert out_sim['rw'].rdata == reset, "ERROR: reset value of {0}".format(register)
+            value      = random.getrandbits(32)
+            cmd.next   = CSRCMD.CSR_WRITE
+            wdata.next = value
+            yield cycle()
+            cmd.next   = CSRCMD.CSR_READ
+            yield delay(1)
+            check(address)
+            assert out_sim['rw'].rdata == value & mask, "ERROR: write {0}".format(register)
+            if address == CSRAddressMap.CSR_ADDR_TO_HOST:
+                assert out_sim['toHost'] == out_ref['toHost'] == value
+        # Read-only: writes are ignored.
+        addr.next  = CSRAddressMap.CSR_ADDR_MTDELEG
+        cmd.next   = CSRCMD.CSR_WRITE
+        wdata.next = 0xFFFFFFFF
+        yield cycle()
+        cmd.next   = CSRCMD.CSR_READ
+        yield delay(1)
+        check(CSRAddressMap.CSR_ADDR_MTDELEG)
+        assert out_sim['rw'].rdata == 0
+        # Machine counter and user alias.
+        addr.next  = CSRAddressMap.CSR_ADDR_MHPMCOUNT + 5
+        cmd.next   = CSRCMD.CSR_WRITE
+        wdata.next = 0x12345678
+        yield cycle()
+        addr.next  = CSRAddressMap.CSR_ADDR_HPMCOUNT + 5
+        cmd.next   = CSRCMD.CSR_READ
+        yield delay(1)
+        check(CSRAddressMap.CSR_ADDR_HPMCOUNT + 5)
+        assert out_sim['rw'].rdata == 0x12345678
+        raise StopSimulation
+
+    return csr_sim, csr_ref, stimulus
+
+
+def test_csr(monkeypatch):
+    """
+    CSR: register lookup vs read bank.
+    """
+    sim = Simulation(_testbench(monkeypatch))
+    sim.run()
+
+
+def test_csr_table():
+    """
+    CSR table: the mtvec reset value, and invalid tables.
+    """
+    rows = csr_map()
+    assert rows[CSRAddressMap.CSR_ADDR_MTVEC][3] == Consts.MTVEC
+    assert rows[CSRAddressMap.CSR_ADDR_CYCLEW][1] == rows[CSRAddressMap.CSR_ADDR_CYCLE][1]
+    with pytest.raises(AssertionError):
+        csr_map(CSR_TABLE + [(CSRAddressMap.CSR_ADDR_MSCRATCH, 'scratch', CSRAccess.RW, 0, 0xFFFFFFFF)])
+    with pytest.raises(AssertionError):
+        csr_map([(0x7C1, 'custom', CSRAccess.RW, 0, 0xFF), (0x7C2, 'custom', CSRAccess.RW, 0, 0xFF)])
+
+
+def test_csr_convert(tmpdir, monkeypatch):
+    """
+    CSR: convertible to Verilog. The read decode is a single block.
+    """
+    monkeypatch.chdir(str(tmpdir))
+    toVerilog(CSR, Signal(False), Signal(False), CSRFileRWIO(), CSRExceptionIO(), Signal(False),
+              Signal(modbv(0)[2:]), Signal(False), Signal(False), Signal(modbv(0)[32:]), CSRCounterIO())
+    verilog = tmpdir.join('CSR.v').read()
+    assert verilog.count('begin: csr__read') == 1
+    assert verilog.count('read_bank[index]') == 1
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
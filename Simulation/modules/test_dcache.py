@@ -21,12 +21,15 @@
 
 from Simulation.core.memory import Memory
 from Core.wishbone import WishboneIntercon
+from Core.consts import Consts
 from Core.dcache import DCache
 from Simulation.modules.ram_bus import RamBus
 import random
 from myhdl import instance
+from myhdl import always
 from myhdl import always_comb
 from myhdl import Signal
+from myhdl import modbv
 from myhdl import Simulation
 from myhdl import StopSimulation
 from myhdl import delay
@@ -37,15 +40,21 @@ import pytest
 
 
 MEM_SIZE      = 2**15  # Bytes
-MEM_TEST_FILE = 'Simulation/modules/mem.hex'
+MEM_TEST_FILE = 'Simulation/modules/mem_dcache.hex'
 BYTES_X_LINE  = 16
 
 
-def _testbench():
+def _testbench(replacement='LRU', ways=4, misses=None, pipelined=False, latency=None):
+    """
+    Read (and write) the memory through the cache. Count the misses in 'misses' (list).
+    Append to 'latency' (list) the cycles of each access.
+    """
     rb         = RamBus(memory_size=MEM_SIZE >> 2)
     cpu        = WishboneIntercon()
     dmem       = WishboneIntercon()
     invalidate = Signal(False)
+    miss_event = Signal(False)
+    next_addr  = Signal(modbv(0)[32:])
     dut = DCache(clk_i=rb.clkb,  # noqa
                  rst_i=False,
                  cpu=rb.dmem_intercon,
@@ -54,8 +63,12 @@ def _testbench():
                  D_WIDTH=32,
                  BLOCK_WIDTH=3,
                  SET_WIDTH=5,
-                 WAYS=4,
-                 LIMIT_WIDTH=32)
+                 WAYS=ways,
+                 REPLACEMENT=replacement,
+                 PIPELINED=pipelined,
+                 LIMIT_WIDTH=32,
+                 miss_event=miss_event,
+                 next_addr=next_addr)
     mem = Memory(clka_i=rb.clka,  # noqa
                  rsta_i=False,
                  imem=rb.imem_intercon,
@@ -80,6 +93,45 @@ def _testbench():
         yield delay(1000000)
         raise Error("Test failed: Timeout")
 
+    latency = latency if latency is not None else []
+    cycles  = [0]  # cycles of the current access
+
+    @always(rb.clkb.posedge)
+    def count_misses():
+        if miss_event and misses is not None:
+            misses[0] += 1
+
+    @always(rb.clkb.posedge)
+    def count_latency():
+        if rb.dmem.cyc_o and rb.dmem.stb_o:
+            cycles[0] += 1
+            if rb.dmem.ack_i:
+                latency.append(cycles[0])
+                cycles[0] = 0
+
+    def burst(accesses, data_read):
+        """
+        Back-to-back accesses: (address, data, sel). A write if 'data' is not None.
+        Append to 'data_read' (list) the data of each access.
+        """
+        yield rb.clkb.posedge
+        for index, (addr, data, sel) in enumerate(accesses):
+            rb.dmem.addr_o.next = addr
+            rb.dmem.dat_o.next  = data if data is not None else 0
+            rb.dmem.sel_o.next  = sel
+            rb.dmem.we_o.next   = Consts.M_WR if data is not None else Consts.M_RD
+            rb.dmem.cyc_o.next  = True
+            rb.dmem.stb_o.next  = True
+            next_addr.next      = accesses[index + 1][0] if index + 1 < len(accesses) else addr
+            yield rb.clkb.negedge
+            while not rb.dmem.ack_i:
+                yield rb.clkb.negedge
+            data_read.append(int(rb.dmem.dat_i))
+            yield rb.clkb.posedge
+        rb.dmem.we_o.next  = Consts.M_RD
+        rb.dmem.cyc_o.next = False
+        rb.dmem.stb_o.next = False
+
     @always_comb
     def port_assign():
         # This assignments are for the purpose of being able to watch this
@@ -98,6 +150,7 @@ def _testbench():
     def stimulus():
         # Read data from memory: first round
         for addr in range(rb.depth >> 5):  # Address in words
+            next_addr.next = addr << 2
             yield rb.read(addr << 2)  # Address in bytes
             data = int(lines[addr], 16)
             assert rb.dmem.dat_i == data, "Data loading (1): Data mismatch! Addr = {0:#x}: {1} != {2:#x}".format(addr << 2,
@@ -108,6 +161,7 @@ def _testbench():
         yield delay(10)
         invalidate.next = False
         for addr in range(rb.depth >> 5):  # Address in words
+            next_addr.next = addr << 2
             yield rb.read(addr << 2)  # Address in bytes
             data = int(lines[addr], 16)
             assert rb.dmem.dat_i == data, "Data loading (2): Data mismatch! Addr = {0:#x}: {1} != {2:#x}".format(addr << 2,
@@ -115,19 +169,47 @@ def _testbench():
                                                                                                                  data)
         # Write the cache: mem[addr] = addr
         for addr in range(rb.depth >> 4):
+            next_addr.next = addr << 2
             yield rb.write(addr << 2, addr)
 
         for addr in range(rb.depth >> 4):
+            next_addr.next = addr << 2
             yield rb.read(addr << 2)
             assert rb.dmem.dat_i == rb.mirror_mem[addr], "R/W: Data mismatch! Addr = {0:#x}".format(addr << 2)
 
         # Read uncached area
         for addr in range(rb.depth >> 4):
+            next_addr.next = (addr << 2) | 0x80000000
             yield rb.read((addr << 2) | 0x80000000)
             assert rb.dmem.dat_i == rb.mirror_mem[addr], "R/W: Data mismatch! Addr = {0:#x}".format(addr << 2)
 
         # TODO: Test write uncached area
 
+        # Back-to-back: store, load, store a byte and load the same word.
+        data_read = []
+        accesses  = []
+        for addr in range(16):
+            accesses += [(addr << 2, 0x11111111 * addr, 0b1111),
+                         (addr << 2, None, 0b0000),
+                         (addr << 2, 0x0000AB00, 0b0010),
+                         (addr << 2, None, 0b0000)]
+        yield burst(accesses, data_read)
+        for addr in range(16):
+            assert data_read[4 * addr + 1] == 0x11111111 * addr, "Back-to-back: Data mismatch! Addr = {0:#x}".format(addr << 2)
+            assert data_read[4 * addr + 3] == (0x11111111 * addr & 0xFFFF00FF) | 0xAB00, "Back-to-back: Data mismatch! Addr = {0:#x}".format(addr << 2)
+
+        # Last round: a loop that fits in the cache (load, store). Only hits after the first iteration.
+        for _ in range(2):
+            for addr in range(32):
+                next_addr.next = addr << 2
+                yield rb.read(addr << 2)
+                yield rb.write(addr << 2, addr + 1)
+        for addr in range(32):
+            next_addr.next = addr << 2
+            yield rb.read(addr << 2)
+            assert rb.dmem.dat_i == addr + 1, "Loop: Data mismatch! Addr = {0:#x}".format(addr << 2)
+        yield rb.clkb.negedge
+
         raise StopSimulation
 
     return instances()
@@ -145,17 +227,35 @@ def gen_test_file():
             f.write('\n')
 
 
-def test_cache():
+@pytest.mark.parametrize('pipelined', [False, True])
+@pytest.mark.parametrize('replacement, ways', [('LRU', 4), ('PLRU', 4), ('RANDOM', 4)])
+def test_cache(replacement, ways, pipelined):
     """
-    Cache: Test loading from memory
+    Cache: Test loading from memory, with each replacement policy
     """
     gen_test_file()
-    trace = False
+    trace  = False
+    misses = [0]
     if trace:
-        sim = Simulation(traceSignals(_testbench))
+        sim = Simulation(traceSignals(_testbench, replacement, ways, misses, pipelined))
     else:
-        sim = Simulation(_testbench())
+        sim = Simulation(_testbench(replacement, ways, misses, pipelined))
     sim.run()
+    print("{0} ({1} ways): {2} misses".format(replacement, ways, misses[0]))
+
+
+@pytest.mark.parametrize('pipelined, cycles', [(False, 2), (True, 1)])
+def test_hit_latency(pipelined, cycles):
+    """
+    Cache: hit latency of loads and stores. The pipelined cache hits in the cycle of the request.
+    """
+    gen_test_file()
+    misses  = [0]
+    latency = []
+    sim = Simulation(_testbench('LRU', 4, misses, pipelined, latency))
+    sim.run()
+    # The second iteration of the loop, and the final loads: only hits.
+    assert set(latency[-96:]) == {cycles}, "Hit latency: {0}".format(latency[-96:])
 
 
 def test_cache_assertions():
@@ -207,6 +307,20 @@ def test_cache_assertions():
                WAYS=3,
                LIMIT_WIDTH=32)
 
+    # Test replacement policy
+    with pytest.raises(AssertionError):
+        DCache(clk,
+               rst,
+               cpu,
+               mem,
+               invalidate,
+               D_WIDTH=32,
+               BLOCK_WIDTH=6,
+               SET_WIDTH=9,
+               WAYS=2,
+               REPLACEMENT='FIFO',
+               LIMIT_WIDTH=32)
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 200
 # flycheck-flake8rc: ".flake8rc"
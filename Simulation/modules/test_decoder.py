@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+from Core.cpath import CtrlSignals
+from Core.cpath import DECODE_ROM
+from Core.cpath import DECODE_TABLE
+from Core.cpath import decode_key
+from Core.cpath import decode_rom
+from Core.instructions import Opcodes
+from Simulation.core.iss import ISS
+from Simulation.core.programs import write_hex
+from Simulation.core.programs import PROGRAM_LOOP
+import random
+import pytest
+
+# Instructions that differ in the fields used by the decoder.
+FUNCT7  = [0b0000000, 0b0100000, 0b0000001, 0b1111111]
+FUNCT12 = [0b000000000000, 0b000000000001, 0b000100000000, 0b001100000010, 0b111111111111]
+
+
+def _instructions():
+    opcodes = [getattr(Opcodes, name) for name in dir(Opcodes) if name.startswith('RV32_')]
+    for opcode in sorted(set(opcodes)) + [0b0110001, 0b1111111]:
+        for funct3 in range(8):
+            for high in set(FUNCT7 + [funct12 >> 5 for funct12 in FUNCT12]):
+                yield opcode | (funct3 << 12) | (high << 25)
+            for funct12 in FUNCT12:
+                yield opcode | (funct3 << 12) | (funct12 << 20)
+    for _ in range(5000):
+        yield random.getrandbits(32)
+
+
+def test_decoder(tmpdir):
+    """
+    Decoder: the ROM and the ISS agree on the illegal instructions.
+    """
+    hex_file = str(tmpdir.join('loop.hex'))
+    write_hex(hex_file, PROGRAM_LOOP)
+    iss = ISS(2**12, hex_file, 16)
+    for instruction in _instructions():
+        illegal = iss.decode(instruction)[0] == iss._illegal
+        control = DECODE_ROM[decode_key(instruction)]
+        assert (control == CtrlSignals.INVALID) == illegal, "Instruction {0:#010x}: illegal = {1}".format(instruction, illegal)
+
+
+def test_decoder_rows():
+    """
+    Decoder: the instructions selected by funct7, bit 30 and funct12.
+    """
+    cases = {0x00208033: CtrlSignals.ADD,     # add  x0, x1, x2
+             0x40208033: CtrlSignals.SUB,     # sub  x0, x1, x2
+             0x02208033: CtrlSignals.MUL,     # mul  x0, x1, x2
+             0x0220e033: CtrlSignals.REM,     # rem  x0, x1, x2
+             0x4020d013: CtrlSignals.SRAI,    # srai x0, x1, 2
+             0x0020d013: CtrlSignals.SRLI,    # srli x0, x1, 2
+             0x00000073: CtrlSignals.ECALL,
+             0x00100073: CtrlSignals.EBREAK,
+             0x10000073: CtrlSignals.ERET,
+             0x10500073: CtrlSignals.INVALID,  # wfi: not supported
+             0x00002073: CtrlSignals.CSRRS,
+             0x00000013: CtrlSignals.ADDI,    # nop
+             0x00000010: CtrlSignals.INVALID}  # 16-bit encoding
+    for instruction, control in cases.items():
+        assert DECODE_ROM[decode_key(instruction)] == control, "Instruction {0:#010x}".format(instruction)
+
+
+def test_decoder_table():
+    """
+    Decoder: an instruction is defined by a single row.
+    """
+    with pytest.raises(AssertionError):
+        decode_rom(DECODE_TABLE + [(CtrlSignals.NOP, Opcodes.RV32_LUI, 0, None)])
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -25,6 +25,7 @@ from Core.wishbone import WishboneIntercon
 from Simulation.modules.ram_bus import RamBus
 import random
 from myhdl import instance
+from myhdl import always
 from myhdl import always_comb
 from myhdl import Signal
 from myhdl import instances
@@ -37,15 +38,20 @@ import pytest
 
 
 MEM_SIZE      = 2**15  # Bytes
-MEM_TEST_FILE = 'Simulation/modules/mem.hex'
+MEM_TEST_FILE = 'Simulation/modules/mem_icache.hex'
 BYTES_X_LINE  = 16
 
 
-def _testbench():
+def _testbench(replacement='LRU', ways=4, misses=None, pipelined=False, latency=None):
+    """
+    Read (and write) the memory through the cache. Count the misses in 'misses' (list).
+    Append to 'latency' (list) the cycles of each access.
+    """
     rb = RamBus(memory_size=MEM_SIZE >> 2)
     cpu = WishboneIntercon()
     dmem = WishboneIntercon()
     invalidate = Signal(False)
+    miss_event = Signal(False)
     dut = ICache(clk_i=rb.clkb,               # noqa
                  rst_i=False,
                  cpu=rb.dmem_intercon,
@@ -54,8 +60,11 @@ def _testbench():
                  D_WIDTH=32,
                  BLOCK_WIDTH=3,
                  SET_WIDTH=5,
-                 WAYS=4,
-                 LIMIT_WIDTH=32)
+                 WAYS=ways,
+                 REPLACEMENT=replacement,
+                 PIPELINED=pipelined,
+                 LIMIT_WIDTH=32,
+                 miss_event=miss_event)
     mem = Memory(clka_i=rb.clka,              # noqa
                  rsta_i=False,
                  imem=rb.imem_intercon,
@@ -80,6 +89,22 @@ def _testbench():
         yield delay(100000)
         raise Error("Test failed: Timeout")
 
+    latency = latency if latency is not None else []
+    cycles  = [0]  # cycles of the current access
+
+    @always(rb.clkb.posedge)
+    def count_misses():
+        if miss_event and misses is not None:
+            misses[0] += 1
+
+    @always(rb.clkb.posedge)
+    def count_latency():
+        if rb.dmem.cyc_o and rb.dmem.stb_o:
+            cycles[0] += 1
+            if rb.dmem.ack_i:
+                latency.append(cycles[0])
+                cycles[0] = 0
+
     @always_comb
     def port_assign():
         # This assignments are for the purpose of being able to watch this
@@ -118,6 +143,86 @@ def _testbench():
             assert rb.dmem.dat_i == data, "Data loading (2): Data mismatch! Addr = {0:#x}: {1} != {2:#x}".format(addr << 2,
                                                                                                                  hex(rb.dmem.dat_i),
                                                                                                                  data)
+        # Last round: a loop that fits in the cache. Only hits after the first iteration.
+        for _ in range(2):
+            for addr in range(64):
+                yield rb.read(addr << 2)
+                assert rb.dmem.dat_i == int(lines[addr], 16), "Data loading (3): Data mismatch! Addr = {0:#x}".format(addr << 2)
+        yield rb.clkb.negedge
+        raise StopSimulation
+
+    return instances()
+
+
+def _redirect_testbench(pipelined=False):
+    """
+    Change the CPU address in the middle of a refill (a redirect in the fetch stage), to a set
+    with a different LRU state. The refilled line must be written to the way of its tag.
+    """
+    rb = RamBus(memory_size=MEM_SIZE >> 2)
+    dmem = WishboneIntercon()
+    invalidate = Signal(False)
+    dut = ICache(clk_i=rb.clkb,               # noqa
+                 rst_i=False,
+                 cpu=rb.dmem_intercon,
+                 mem=dmem,
+                 invalidate=invalidate,
+                 D_WIDTH=32,
+                 BLOCK_WIDTH=3,
+                 SET_WIDTH=5,
+                 WAYS=4,
+                 REPLACEMENT='LRU',
+                 PIPELINED=pipelined,
+                 LIMIT_WIDTH=32)
+    mem = Memory(clka_i=rb.clka,              # noqa
+                 rsta_i=False,
+                 imem=rb.imem_intercon,
+                 clkb_i=rb.clkb,
+                 rstb_i=False,
+                 dmem=dmem,
+                 SIZE=MEM_SIZE,
+                 HEX=MEM_TEST_FILE,
+                 BYTES_X_LINE=BYTES_X_LINE)
+
+    tb_clk = rb.gen_clocks()  # noqa
+
+    with open(MEM_TEST_FILE) as f:
+        words_x_line = BYTES_X_LINE >> 2
+        lines_f = [line.strip() for line in f]
+        lines = [line[8 * i:8 * (i + 1)] for line in lines_f for i in range(words_x_line - 1, -1, -1)]
+
+    @instance
+    def timeout():
+        yield delay(100000)
+        raise Error("Test failed: Timeout")
+
+    @instance
+    def stimulus():
+        # Update the LRU state of set 1
+        yield rb.read(0x008)
+        # Miss in set 0, and redirect to set 1 during the refill
+        yield rb.clkb.posedge
+        rb.dmem.addr_o.next = 0x000
+        rb.dmem.sel_o.next  = 0b0000
+        rb.dmem.we_o.next   = False
+        rb.dmem.cyc_o.next  = True
+        rb.dmem.stb_o.next  = True
+        for _ in range(3):
+            yield rb.clkb.posedge
+        rb.dmem.addr_o.next = 0x008
+        yield delay(1)
+        while not rb.dmem.ack_i:
+            yield rb.dmem.ack_i.posedge
+            yield rb.clkb.negedge
+        yield rb.clkb.posedge
+        rb.dmem.cyc_o.next = False
+        rb.dmem.stb_o.next = False
+        # The refilled line hits, with the memory data
+        for addr in range(4):
+            yield rb.read(addr << 2)
+            data = int(lines[addr], 16)
+            assert rb.dmem.dat_i == data, "Redirect: Data mismatch! Addr = {0:#x}: {1} != {2:#x}".format(addr << 2, hex(rb.dmem.dat_i), data)
+        yield rb.clkb.negedge
         raise StopSimulation
 
     return instances()
@@ -135,16 +240,44 @@ def gen_test_file():
             f.write('\n')
 
 
-def test_cache():
+@pytest.mark.parametrize('pipelined', [False, True])
+@pytest.mark.parametrize('replacement, ways', [('LRU', 4), ('PLRU', 8), ('RANDOM', 8), ('PLRU', 16)])
+def test_cache(replacement, ways, pipelined):
     """
-    Cache: Test loading from memory
+    Cache: Test loading from memory, with each replacement policy
     """
     gen_test_file()
-    trace = False
+    trace  = False
+    misses = [0]
     if trace:
-        sim = Simulation(traceSignals(_testbench))
+        sim = Simulation(traceSignals(_testbench, replacement, ways, misses, pipelined))
     else:
-        sim = Simulation(_testbench())
+        sim = Simulation(_testbench(replacement, ways, misses, pipelined))
+    sim.run()
+    print("{0} ({1} ways): {2} misses".format(replacement, ways, misses[0]))
+
+
+@pytest.mark.parametrize('pipelined, cycles', [(False, 2), (True, 1)])
+def test_hit_latency(pipelined, cycles):
+    """
+    Cache: hit latency. The pipelined cache hits in the cycle of the request.
+    """
+    gen_test_file()
+    misses  = [0]
+    latency = []
+    sim = Simulation(_testbench('LRU', 4, misses, pipelined, latency))
+    sim.run()
+    # Sequential hits: the last iteration, after the jump to the first address.
+    assert set(latency[-63:]) == {cycles}, "Hit latency: {0}".format(latency[-64:])
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_redirect_refill(pipelined):
+    """
+    Cache: the CPU address changes during a refill
+    """
+    gen_test_file()
+    sim = Simulation(_redirect_testbench(pipelined))
     sim.run()
 
 
@@ -197,6 +330,20 @@ def test_cache_assertions():
                WAYS=3,
                LIMIT_WIDTH=32)
 
+    # Test replacement policy
+    with pytest.raises(AssertionError):
+        ICache(clk,
+               rst,
+               cpu,
+               mem,
+               invalidate,
+               D_WIDTH=32,
+               BLOCK_WIDTH=6,
+               SET_WIDTH=9,
+               WAYS=2,
+               REPLACEMENT='FIFO',
+               LIMIT_WIDTH=32)
+
 # Local Variables:
 # flycheck-flake8-maximum-line-length: 200
 # flycheck-flake8rc: ".flake8rc"
@@ -20,6 +20,9 @@
 # THE SOFTWARE.
 
 from Simulation.core.memory import Memory
+from Simulation.core.memory import PagedMemory
+from Simulation.core.memory import LoadImage
+from Simulation.core.memory import PAGE_WORDS
 from Core.wishbone import WishboneIntercon
 from Simulation.modules.ram_bus import RamBus
 import random
@@ -31,6 +34,7 @@ from myhdl import delay
 from myhdl import Signal
 from myhdl import traceSignals
 import pytest
+import struct
 
 
 MEM_SIZE      = 2**15  # Bytes
@@ -111,6 +115,57 @@ def test_memory():
     sim.run()
 
 
+def test_memory_paged(tmpdir):
+    """
+    Memory: sparse memory. 4 GB address space, R/W operations, binary image.
+    """
+    memory = PagedMemory(2**30)
+    memory[2**30 - 1] = 0xDEADBEEF
+    assert memory[2**30 - 1] == 0xDEADBEEF and memory[0] == 0
+    assert list(memory.pages) == [2**30 // PAGE_WORDS - 1]
+
+    # Image: mapped, loaded on the first access to each page.
+    bin_file = str(tmpdir.join('image.bin'))
+    values   = [random.randint(0, 2**32 - 1) for _ in range(PAGE_WORDS + 3)]
+    with open(bin_file, 'wb') as f:
+        f.write(struct.pack('<{0}I'.format(len(values)), *values))
+    LoadImage(2**32, bin_file, BYTES_X_LINE, memory)
+    assert memory.pages == {}
+    memory[1] = 0
+    assert [memory[addr] for addr in range(len(values))] == [values[0], 0] + values[2:]
+    assert memory[len(values)] == 0 and len(memory.pages) == 2
+
+    # Memory module, using the whole address space.
+    rb  = RamBus(memory_size=0)
+    dut = Memory(clka_i=rb.clka,
+                 rsta_i=False,
+                 imem=rb.imem_intercon,
+                 clkb_i=rb.clkb,
+                 rstb_i=False,
+                 dmem=rb.dmem_intercon,
+                 SIZE=2**32,
+                 HEX=bin_file,
+                 BYTES_X_LINE=BYTES_X_LINE,
+                 PAGED=True)
+    tb_clk = rb.gen_clocks()
+    rb.mirror_mem = {}
+    addresses     = [0, 4 * PAGE_WORDS, 0x80000000, 0xFFFFFFFC]
+
+    @instance
+    def stimulus():
+        for addr in addresses:
+            yield rb.read(addr)
+            assert rb.dmem.dat_i == (values[addr >> 2] if addr >> 2 < len(values) else 0), "Data mismatch! Addr = {0:#x}".format(addr)
+        for addr in addresses:
+            yield rb.write(addr, addr ^ 0x5A5A5A5A)
+        for addr in addresses:
+            yield rb.read(addr)
+            assert rb.dmem.dat_i == addr ^ 0x5A5A5A5A, "R/W: Data mismatch! Addr = {0:#x}".format(addr)
+        raise StopSimulation
+
+    Simulation(dut, tb_clk, stimulus).run()
+
+
 def test_memory_assertions():
     """
     Memory: Test assertions
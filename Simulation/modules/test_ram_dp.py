@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from Core import ram_dp
+from Core.ram_dp import RAM_DP
+from Core.ram_dp import RAM_DP_SIM
+from Core.ram_dp import RAMIOPort
+import random
+from myhdl import always_comb
+from myhdl import instance
+from myhdl import instances
+from myhdl import Signal
+from myhdl import modbv
+from myhdl import delay
+from myhdl import Simulation
+from myhdl import StopSimulation
+
+A_WIDTH = 3
+D_WIDTH = 12
+CYCLES  = 500
+
+
+def _ram(clk, ports, RAM):
+    """
+    A RAM, with the port clocks derived from the main clock (as in the caches).
+    """
+    portA = RAMIOPort(A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)
+    portB = RAMIOPort(A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)
+    dut   = RAM(portA, portB, A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)  # noqa
+
+    @always_comb
+    def assign():
+        portA.clk.next    = clk
+        portA.addr.next   = ports[0]
+        portA.data_i.next = ports[1]
+        portA.we.next     = ports[2]
+        portB.clk.next    = clk
+        portB.addr.next   = ports[3]
+        portB.data_i.next = ports[4]
+        portB.we.next     = ports[5]
+        ports[6].next     = portA.data_o
+        ports[7].next     = portB.data_o
+
+    return instances()
+
+
+def _testbench(monkeypatch):
+    """
+    Random accesses to a small RAM, with collisions between ports: the simulation
+    model must return the same data of the signal-based RAM, at each clock edge.
+    """
+    clk   = Signal(False)
+    ports = [Signal(modbv(0)[A_WIDTH:]), Signal(modbv(0)[D_WIDTH:]), Signal(False),
+             Signal(modbv(0)[A_WIDTH:]), Signal(modbv(0)[D_WIDTH:]), Signal(False),
+             Signal(modbv(0)[D_WIDTH:]), Signal(modbv(0)[D_WIDTH:])]
+    model = [Signal(modbv(0)[D_WIDTH:]) for _ in range(2)]
+
+    ram_sim = _ram(clk, ports[:6] + model, RAM_DP_SIM)
+    with monkeypatch.context() as m:
+        m.setattr(ram_dp, 'converting', lambda: True)  # force the signal-based RAM
+        ram_ref = _ram(clk, ports, RAM_DP)
+
+    @instance
+    def stimulus():
+        for _ in range(CYCLES):
+            for port in (0, 3):
+                ports[port].next     = random.randrange(2**A_WIDTH)
+                ports[port + 1].next = random.randrange(2**D_WIDTH)
+                ports[port + 2].next = random.random() < 0.5
+            clk.next = 1
+            yield delay(5)
+            clk.next = 0
+            assert model[0] == ports[6], "ERROR port A: Value = {0}.\tRef = {1}".format(model[0], ports[6])
+            assert model[1] == ports[7], "ERROR port B: Value = {0}.\tRef = {1}".format(model[1], ports[7])
+            yield delay(5)
+
+        raise StopSimulation
+
+    return ram_sim, ram_ref, stimulus
+
+
+def test_ram_dp(monkeypatch):
+    """
+    RAM: simulation model vs signal-based RAM.
+    """
+    sim = Simulation(_testbench(monkeypatch))
+    sim.run()
+
+
+def test_ram_dp_model():
+    """
+    RAM: the simulation model is used when the design is not converted.
+    """
+    portA = RAMIOPort(A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)
+    portB = RAMIOPort(A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)
+    rtl   = RAM_DP(portA, portB, A_WIDTH=A_WIDTH, D_WIDTH=D_WIDTH)
+    assert all(isinstance(block.symdict['_ram'], ram_dp.RAMArray) for block in rtl)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import json
+import multiprocessing
+import os
+import re
+import time
+import pytest
+
+# Wall-clock time of each job, from the last run. Used to schedule the longest jobs first.
+DURATIONS_FILE = '.pytest_cache/v/algol/durations'
+# Simulated time, printed by the core testbench.
+TIME_REGEX     = re.compile(r'^Time: (\d+)', re.MULTILINE)
+LINE_WIDTH     = 80
+
+
+class _ResultCollector(object):
+    """
+    pytest plugin: keep the outcome of each test, in a picklable format.
+    """
+    def __init__(self):
+        self.results = []
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'call':
+            outcome = report.outcome
+        elif report.failed:
+            outcome = 'error'
+        elif report.skipped and report.when == 'setup':
+            outcome = 'skipped'
+        else:
+            return
+        message = ''
+        if report.failed:
+            crash   = getattr(report.longrepr, 'reprcrash', None)
+            message = crash.message if crash is not None else str(report.longrepr)
+        elif report.skipped and isinstance(report.longrepr, tuple):
+            message = report.longrepr[2]
+        sim_time = TIME_REGEX.search(report.capstdout)
+        self.results.append(dict(nodeid=report.nodeid,
+                                 outcome=outcome,
+                                 message=message.splitlines()[0] if message else '',
+                                 time=int(sim_time.group(1)) if sim_time else None))
+
+
+def _run_job(job):
+    """
+    Worker: execute a pytest session, in a fresh process.
+    """
+    key, args = job
+    collector = _ResultCollector()
+    start     = time.time()
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        pytest.main(args + ['-p', 'no:cacheprovider', '-q', '--rootdir', os.getcwd()], plugins=[collector])
+    return key, time.time() - start, collector.results
+
+
+def _load_durations():
+    try:
+        with open(DURATIONS_FILE) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_durations(durations):
+    if not os.path.isdir(os.path.dirname(DURATIONS_FILE)):
+        os.makedirs(os.path.dirname(DURATIONS_FILE))
+    with open(DURATIONS_FILE, 'w') as f:
+        json.dump(durations, f, indent=2, sort_keys=True)
+
+
+def _expected_duration(key, durations):
+    """
+    Duration from the last run. Without history, use the file size
+    (for HEX files: the non-zero lines).
+    """
+    if key in durations:
+        return durations[key]
+    if key.endswith('.hex'):
+        with open(key) as f:
+            return sum(1 for line in f if line.strip('0\n')) * 1e-6
+    return os.path.getsize(key) * 1e-6
+
+
+def _summary(counts, elapsed):
+    outcomes = ['failed', 'passed', 'skipped', 'error']
+    text     = ', '.join('{0} {1}{2}'.format(counts[outcome], outcome, 's' if outcome == 'error' and counts[outcome] > 1 else '')
+                         for outcome in outcomes if counts[outcome])
+    return ' {0} in {1:.2f}s '.format(text or 'no tests ran', elapsed).center(LINE_WIDTH, '=')
+
+
+def run_parallel(jobs, n_jobs):
+    """
+    Execute a list of pytest sessions in a pool of processes, longest-expected-first.
+
+    Each job is executed in a new process (the MyHDL simulator keeps global state).
+    The results are printed as soon as they are available.
+
+    :param jobs:   List of (key, pytest arguments). The key is the file under test.
+    :param n_jobs: Number of worker processes
+    :returns:      The number of failed tests
+    """
+    assert n_jobs > 0, "Invalid number of jobs: {0}".format(n_jobs)
+    durations = _load_durations()
+    jobs      = sorted(jobs, key=lambda job: _expected_duration(job[0], durations), reverse=True)
+    counts    = dict(passed=0, failed=0, skipped=0, error=0)
+    failures  = []
+    start     = time.time()
+
+    print(' test session starts (parallel: {0} workers) '.format(n_jobs).center(LINE_WIDTH, '='))
+    print('scheduled {0} jobs\n'.format(len(jobs)))
+    pool = multiprocessing.Pool(n_jobs, maxtasksperchild=1)
+    try:
+        for done, (key, duration, results) in enumerate(pool.imap_unordered(_run_job, jobs), 1):
+            durations[key] = duration
+            if not results:
+                results = [dict(nodeid=key, outcome='error', message='No tests collected', time=None)]
+            for result in results:
+                counts[result['outcome']] += 1
+                sim_time = '' if result['time'] is None else ' (Time: {0})'.format(result['time'])
+                print('{0} {1}{2} [{3:3d}%]'.format(result['nodeid'], result['outcome'].upper(), sim_time,
+                                                    100 * done // len(jobs)))
+                if result['outcome'] in ('failed', 'error'):
+                    failures.append(result)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    _save_durations(durations)
+
+    if failures:
+        print('\n' + ' short test summary info '.center(LINE_WIDTH, '='))
+        for result in failures:
+            print('{0} {1} - {2}'.format(result['outcome'].upper(), result['nodeid'], result['message']))
+    print(_summary(counts, time.time() - start))
+    return counts['failed'] + counts['error']
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
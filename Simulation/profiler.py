@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+from myhdl._always import _Always
+from myhdl._Simulation import Simulation
+from myhdl._Simulation import _flatten
+from myhdl._simulator import _siglist
+from Simulation.core.cycle_sim import CycleSimulation
+import time
+
+# High-resolution clock (Python 3), or wall time.
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _instance_paths(hierarchy):
+    """
+    Hierarchical name of each block of an elaborated design (see trace.elaborate):
+    {id(block): 'instance.path.block'}.
+    """
+    paths = {}
+    path  = []
+    for inst in hierarchy:
+        if inst.name is None:
+            continue
+        del path[inst.level - 1:]
+        path.append(inst.name)
+        # A module that returns a single instance repeats its name.
+        names = [name for ii, name in enumerate(path) if ii == 0 or name != path[ii - 1]]
+        for name, sub in inst.subs:
+            if isinstance(sub, _Always) and id(sub) not in paths:
+                paths[id(sub)] = '.'.join(names + [name])
+    return paths
+
+
+class Profiler(object):
+    """
+    Profiling of the generators (@always, @always_comb blocks) of a simulation.
+
+    Each block is wrapped: for each activation, measure the time and the number of
+    signal updates it schedules (assignments to 'next'). The results are grouped per
+    generator (module and function) and per instance.
+
+    The instance is the hierarchical path if the hierarchy of the design is known
+    (attach() with the hierarchy from trace.elaborate). Otherwise, the instances of
+    a module are numbered in elaboration order: 'RAM_DP[3].rtl_port_a'.
+
+    Works with both engines. The blocks must be attached before the simulator is
+    created: install() attaches the blocks of every new simulation.
+
+    :ivar stats: {instance: [generator, time, activations, updates]}
+    """
+    def __init__(self):
+        self.stats      = {}
+        self._installed = None
+
+    def attach(self, blocks, hierarchy=None):
+        """
+        Wrap the blocks of a design. Blocks already attached are ignored.
+
+        :param blocks:    The elaborated design (flattened)
+        :param hierarchy: Optional hierarchy of the design (from trace.elaborate)
+        """
+        paths   = _instance_paths(hierarchy) if hierarchy is not None else {}
+        current = {}
+        counter = {}
+        for block in blocks:
+            if not isinstance(block, _Always) or getattr(block.func, 'profiled', False):
+                continue
+            generator = '{0}.{1}'.format(block.callername, block.name)
+            if id(block) in paths:
+                instance = paths[id(block)]
+            else:
+                # A new instance of the module starts when one of its block names repeats.
+                names = current.setdefault(block.callername, set())
+                if block.name in names or not names:
+                    names.clear()
+                    counter[block.callername] = counter.get(block.callername, -1) + 1
+                names.add(block.name)
+                instance = '{0}[{1}].{2}'.format(block.callername, counter[block.callername], block.name)
+            while instance in self.stats:
+                instance += "'"
+            self.stats[instance] = stat = [generator, 0.0, 0, 0]
+            block.func = self._wrap(block.func, stat)
+
+    @staticmethod
+    def _wrap(func, stat):
+        def profiled():
+            updates = len(_siglist)
+            start   = _clock()
+            func()
+            stat[1] += _clock() - start
+            stat[2] += 1
+            stat[3] += len(_siglist) - updates
+        profiled.profiled    = True
+        profiled.__wrapped__ = func
+        return profiled
+
+    def install(self):
+        """
+        Attach the blocks of each simulation created from now on (event-driven or
+        cycle-based), until uninstall().
+        """
+        assert self._installed is None, "Error: profiler already installed"
+        profiler       = self
+        event_init     = Simulation.__init__
+        cycle_init     = CycleSimulation.__init__
+
+        def event_sim(sim, *args):
+            profiler.attach(_flatten(*args))
+            event_init(sim, *args)
+
+        def cycle_sim(sim, clk, *args):
+            profiler.attach(_flatten(*args))
+            cycle_init(sim, clk, *args)
+
+        Simulation.__init__      = event_sim
+        CycleSimulation.__init__ = cycle_sim
+        self._installed          = (event_init, cycle_init)
+        return self
+
+    def uninstall(self):
+        if self._installed is not None:
+            Simulation.__init__, CycleSimulation.__init__ = self._installed
+            self._installed = None
+
+    def generators(self):
+        """
+        Totals per generator: {generator: [time, activations, updates]}.
+        """
+        totals = {}
+        for generator, elapsed, activations, updates in self.stats.values():
+            total     = totals.setdefault(generator, [0.0, 0, 0])
+            total[0] += elapsed
+            total[1] += activations
+            total[2] += updates
+        return totals
+
+    def report(self, title='', top=20):
+        """
+        Text format: the hottest generators and instances (time, share of the total
+        time, activations, signal updates, time per activation).
+
+        :param top: Number of lines of each table. 0: all
+        """
+        generators = self.generators()
+        total      = sum(elapsed for elapsed, _, _ in generators.values())
+        lines      = ['Profile{0}: {1:.3f} s in {2} generators, {3} instances'.format(
+            ' ({0})'.format(title) if title else '', total, len(generators), len(self.stats))]
+        tables     = [('generator', generators.items()),
+                      ('instance', [(instance, stat[1:]) for instance, stat in self.stats.items()])]
+        for label, rows in tables:
+            rows = sorted(rows, key=lambda row: (-row[1][0], row[0]))
+            lines.append('  {0:>9} {1:>6} {2:>11} {3:>11} {4:>9}  Per {5}'.format('Time (s)', '%', 'Activations',
+                                                                                  'Updates', 'us/act', label))
+            for name, (elapsed, activations, updates) in rows[:top or None]:
+                lines.append('  {0:9.3f} {1:5.1f}% {2:11d} {3:11d} {4:9.2f}  {5}'.format(
+                    elapsed, 100.0 * elapsed / total if total else 0.0, activations, updates,
+                    1e6 * elapsed / activations if activations else 0.0, name))
+        return '\n'.join(lines)
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End:
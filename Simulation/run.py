@@ -27,27 +27,146 @@ from myhdl import toVerilog
 from myhdl import Signal
 from myhdl import modbv
 from Core.core import CoreHDL
+from Simulation.parallel import run_parallel
+from Simulation.sweep import run_sweep
+from Simulation.benchmark import run_benchmarks
+from Simulation.benchmark import ENGINES
+from Simulation.benchmark import HISTORY_FILE
+from Simulation.benchmark import THRESHOLD
+from Simulation.core.conftest import list_hex_files
+from Simulation.core.sampling import sampled_simulation
+from Simulation.core.commit_log import read_commit_log
+from Simulation.core.commit_log import format_commit
+from Simulation.core.cache_analyzer import read_cache_trace
+from Simulation.core.cache_analyzer import sweep
+from Simulation.core.cache_analyzer import format_results
 
 
 def run_module(args):
     if args.list:
         list_module_test()
+    elif args.all and args.jobs > 1:
+        if args.profile:
+            print("Ignoring the profile flag: not supported with parallel jobs")
+        tests = sorted(glob.glob('Simulation/modules/test*.py'))
+        run_parallel([(test, [test]) for test in tests], args.jobs)
     elif args.all:
-        pytest.main(['-s', '-v', '-k', 'not test_core'])
+        pytest.main(['-s', '-v', 'Simulation/modules'] + profile_arguments(args))
     else:
-        pytest.main(['-s', '-v', args.file])
+        pytest.main(['-s', '-v', args.file] + profile_arguments(args))
+
+
+def profile_arguments(args):
+    """
+    Options of the profiler, for the tests.
+    """
+    return ['--profile', '--profile_top={0}'.format(args.profile_top)] if args.profile else []
+
+
+def trace_arguments(args):
+    """
+    Options of the selective tracer, for test_core.
+    """
+    options = ['--trace_scope={0}'.format(scope) for scope in args.trace_scope]
+    if args.trace_start:
+        options.append('--trace_start={0}'.format(args.trace_start))
+    if args.trace_stop is not None:
+        options.append('--trace_stop={0}'.format(args.trace_stop))
+    if args.trace_trigger is not None:
+        options.append('--trace_trigger={0}'.format(args.trace_trigger))
+    if args.trace_before:
+        options.append('--trace_before={0}'.format(args.trace_before))
+    return options
 
 
 def run_simulation(args):
-    if args.all:
+    engine  = '--engine={0}'.format(args.engine)
+    reports = (['--cpi_stack'] if args.cpi_stack else []) + profile_arguments(args)
+    if args.suite:
         if args.vcd:
             print("Ignoring the vcd flag")
-        pytest.main(['-v', '--tb=line', 'Simulation/core/test_core.py', '--all'])
+        hex_option = ['--all'] if args.all else ['--hex_file', args.file]
+        pytest.main(['-s', '-v', '--tb=line', 'Simulation/core/test_core.py::test_core_suite', '--suite', engine] + hex_option + profile_arguments(args))
+    elif args.all:
+        if args.vcd:
+            print("Ignoring the vcd flag")
+        if args.jobs > 1:
+            if args.cpi_stack or args.profile:
+                print("Ignoring the cpi-stack and profile flags: not supported with parallel jobs")
+            run_parallel([(hex_file, ['Simulation/core/test_core.py::test_core', '--hex_file', hex_file, engine]) for hex_file in list_hex_files()],
+                         args.jobs)
+            return
+        pytest.main(['-v', '--tb=line', 'Simulation/core/test_core.py::test_core', '--all', engine] + reports)
     else:
+        options = ['--checkpoint={0}'.format(args.checkpoint)] + (['--restore', args.restore] if args.restore else [])
+        options = options + trace_arguments(args) + (['--commit_log', args.commit_log] if args.commit_log else []) + reports
+        options = options + (['--cache_trace', args.cache_trace] if args.cache_trace else [])
         if args.vcd:
-            pytest.main(['-s', '-v', '--tb=short', 'Simulation/core/test_core.py', '--hex_file', args.file, '--vcd'])
+            pytest.main(['-s', '-v', '--tb=short', 'Simulation/core/test_core.py::test_core', '--hex_file', args.file, '--vcd', engine] + options)
         else:
-            pytest.main(['-s', '-v', '--tb=short', 'Simulation/core/test_core.py', '--hex_file', args.file])
+            pytest.main(['-s', '-v', '--tb=short', 'Simulation/core/test_core.py::test_core', '--hex_file', args.file, engine] + options)
+
+
+def run_iss(args):
+    if args.all:
+        pytest.main(['-v', '--tb=line', 'Simulation/core/test_iss.py', '--all'])
+    else:
+        pytest.main(['-s', '-v', '--tb=short', 'Simulation/core/test_iss.py::test_iss', '--hex_file', args.file])
+
+
+def run_sample(args):
+    result = sampled_simulation(args.file, args.skip, args.window, args.warmup)
+    print("Fast-forward (ISS): {0} instructions".format(result['skipped']))
+    print("Warm-up (core):     {0} instructions".format(args.warmup))
+    print("Window (core):      {0} instructions, {1} cycles".format(result['instructions'], result['cycles']))
+    if result['cpi'] is not None:
+        print("CPI:                {0:.3f}".format(result['cpi']))
+    if result['toHost'] != 0:
+        print("Program finished. MTOHOST = {0}".format(result['toHost']))
+
+
+def decode_commits(args):
+    for commit in read_commit_log(args.file):
+        print(format_commit(commit))
+
+
+def int_range(value):
+    """
+    Argument type: a list of values ('2,4,8'), or an inclusive range ('4:10').
+    """
+    if ':' in value:
+        first, last = value.split(':')
+        return list(range(int(first), int(last) + 1))
+    return [int(item) for item in value.split(',')]
+
+
+def analyze_caches(args):
+    streams = read_cache_trace(args.file)
+    for name, addresses, index in (('I$', streams.icache, 0), ('D$', streams.dcache, 1)):
+        rtl = '' if streams.misses is None else '. RTL misses: {0}'.format(streams.misses[index])
+        print("{0}: {1} accesses{2}".format(name, len(addresses), rtl))
+        print(format_results(sweep(addresses, args.block_width, args.set_width, args.ways)))
+        print("")
+
+
+def run_design_sweep(args):
+    ranges = {('ICache', 'Enable'):      args.ic_enable,
+              ('ICache', 'BlockWidth'):  args.ic_block_width,
+              ('ICache', 'SetWidth'):    args.ic_set_width,
+              ('ICache', 'Ways'):        args.ic_ways,
+              ('ICache', 'Replacement'): args.ic_replacement,
+              ('DCache', 'Enable'):      args.dc_enable,
+              ('DCache', 'BlockWidth'):  args.dc_block_width,
+              ('DCache', 'SetWidth'):    args.dc_set_width,
+              ('DCache', 'Ways'):        args.dc_ways,
+              ('DCache', 'Replacement'): args.dc_replacement}
+    run_sweep(ranges, list_hex_files() if args.all else args.file, args.jobs, args.results)
+
+
+def run_benchmark(args):
+    failed = run_benchmarks(args.engine or ENGINES, args.history, args.threshold, args.update_baseline, args.repeat)
+    if failed:
+        raise SystemExit("Benchmark failed: {0}".format(', '.join(failed)))
 
 
 def list_module_test():
@@ -116,16 +235,91 @@ def main():
     group_module.add_argument('-l', '--list', help='List tests', action='store_true')
     group_module.add_argument('-f', '--file', help='Run a specific test')
     group_module.add_argument('-a', '--all', help='Run all tests', action='store_true')
+    parser_module.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs (with -a)')
+    parser_module.add_argument('--profile', action='store_true', help='Profile the generators of each test (time, activations, signal updates)')
+    parser_module.add_argument('--profile-top', type=int, default=20, metavar='N', help='Lines of the profile reports (0: all)')
     parser_module.set_defaults(func=run_module)
 
     # Core simulation
     parser_core = subparsers.add_parser('core', help='Run assembler tests in the RV32 processor')
     group_core1 = parser_core.add_mutually_exclusive_group(required=True)
-    group_core1.add_argument('-f', '--file', help='Run a specific test')
+    group_core1.add_argument('-f', '--file', help='Run a specific test (HEX or ELF file)')
     group_core1.add_argument('-a', '--all', help='Run all tests', action='store_true')
     parser_core.add_argument('--vcd', action='store_true', help='Generate VCD files')
+    parser_core.add_argument('--engine', choices=['event', 'cycle'], default='event', help='Simulation engine')
+    parser_core.add_argument('--suite', action='store_true', help='Elaborate the core once, and run all the tests')
+    parser_core.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs (with -a)')
+    parser_core.add_argument('--checkpoint', type=int, default=0, metavar='N', help='Save a checkpoint every N cycles (with -f, cycle engine)')
+    parser_core.add_argument('--restore', metavar='FILE', help='Continue from a checkpoint file (with -f, cycle engine)')
+    parser_core.add_argument('--cpi-stack', action='store_true', help='Print the CPI stack (stall attribution) of each test')
+    parser_core.add_argument('--profile', action='store_true', help='Profile the generators of each test, by hierarchical instance')
+    parser_core.add_argument('--profile-top', type=int, default=20, metavar='N', help='Lines of the profile reports (0: all)')
+    parser_core.add_argument('--commit-log', metavar='FILE', help='Write a commit trace of the retired instructions (with -f)')
+    parser_core.add_argument('--cache-trace', metavar='FILE', help='Write the address streams of the I$ and the D$ (with -f, cycle engine)')
+    group_trace = parser_core.add_argument_group('selective tracing (with -f)')
+    group_trace.add_argument('--trace-scope', action='append', default=[], metavar='SCOPE',
+                             help='Trace only an instance and its children (name or dotted path, e.g. cpath, dcache.lru_m)')
+    group_trace.add_argument('--trace-start', type=int, default=0, metavar='CYCLE', help='First traced cycle')
+    group_trace.add_argument('--trace-stop', type=int, metavar='CYCLE', help='Last traced cycle')
+    group_trace.add_argument('--trace-trigger', metavar='TRIGGER',
+                             help="Start tracing on the write to toHost ('tohost'), or when the decode PC reaches an address")
+    group_trace.add_argument('--trace-before', type=int, default=0, metavar='CYCLES', help='Cycles traced before the trigger')
     parser_core.set_defaults(func=run_simulation)
 
+    # Functional simulation
+    parser_iss = subparsers.add_parser('iss', help='Run assembler tests in the instruction-set simulator')
+    group_iss = parser_iss.add_mutually_exclusive_group(required=True)
+    group_iss.add_argument('-f', '--file', help='Run a specific test')
+    group_iss.add_argument('-a', '--all', help='Run all tests', action='store_true')
+    parser_iss.set_defaults(func=run_iss)
+
+    # Sampled simulation
+    parser_sample = subparsers.add_parser('sample', help='Fast-forward a program in the ISS, and measure a window in the core')
+    parser_sample.add_argument('-f', '--file', required=True, help='Program (HEX or ELF file)')
+    parser_sample.add_argument('--skip', type=int, required=True, help='Instructions executed in the ISS')
+    parser_sample.add_argument('--window', type=int, required=True, help='Instructions measured in the core')
+    parser_sample.add_argument('--warmup', type=int, default=0, help='Instructions executed in the core before the window (caches warm-up)')
+    parser_sample.set_defaults(func=run_sample)
+
+    parser_commits = subparsers.add_parser('commits', help='Decode a commit trace to text')
+    parser_commits.add_argument('-f', '--file', required=True, help='Commit trace')
+    parser_commits.set_defaults(func=decode_commits)
+
+    parser_caches = subparsers.add_parser('caches', help='Miss rates of the cache configurations, from a cache (or commit) trace')
+    parser_caches.add_argument('-f', '--file', required=True, help='Cache trace, or commit trace')
+    parser_caches.add_argument('--block-width', type=int_range, default=[4, 5, 6], metavar='LIST', help="BlockWidth values (e.g. '4:6')")
+    parser_caches.add_argument('--set-width', type=int_range, default=list(range(4, 11)), metavar='LIST', help="SetWidth values (e.g. '4:10')")
+    parser_caches.add_argument('--ways', type=int_range, default=[1, 2, 4, 8], metavar='LIST', help="Ways values (e.g. '1,2,4,8')")
+    parser_caches.set_defaults(func=analyze_caches)
+
+    # Design-space exploration
+    parser_sweep = subparsers.add_parser('sweep', help='Run the workloads with each configuration of the caches')
+    group_sweep = parser_sweep.add_mutually_exclusive_group(required=True)
+    group_sweep.add_argument('-f', '--file', action='append', help='Workload (HEX or ELF file). Can be repeated')
+    group_sweep.add_argument('-a', '--all', help='All the RV32 tests', action='store_true')
+    parser_sweep.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel jobs')
+    parser_sweep.add_argument('--results', default='sweep.json', metavar='FILE', help='Results file. Completed runs are not executed again')
+    group_range = parser_sweep.add_argument_group("configurations (default: algol.ini). Values: list ('2,4') or inclusive range ('4:8')")
+    for prefix, section in (('ic', 'ICache'), ('dc', 'DCache')):
+        group_range.add_argument('--{0}-enable'.format(prefix), type=lambda value: value.split(','), metavar='LIST',
+                                 help="{0} Enable (e.g. 'yes,no')".format(section))
+        group_range.add_argument('--{0}-block-width'.format(prefix), type=int_range, metavar='LIST', help='{0} BlockWidth'.format(section))
+        group_range.add_argument('--{0}-set-width'.format(prefix), type=int_range, metavar='LIST', help='{0} SetWidth'.format(section))
+        group_range.add_argument('--{0}-ways'.format(prefix), type=int_range, metavar='LIST', help='{0} Ways'.format(section))
+        group_range.add_argument('--{0}-replacement'.format(prefix), type=lambda value: value.split(','), metavar='LIST',
+                                 help="{0} Replacement (e.g. 'lru,plru,random')".format(section))
+    parser_sweep.set_defaults(func=run_design_sweep)
+
+    # Simulation throughput
+    parser_bench = subparsers.add_parser('benchmark', help='Measure the simulation throughput, and compare it with the baseline')
+    parser_bench.add_argument('--engine', action='append', choices=ENGINES, help='Engine for the core benchmarks (default: all). Can be repeated')
+    parser_bench.add_argument('--history', default=HISTORY_FILE, metavar='FILE', help='History of results (JSON). Default: {0}'.format(HISTORY_FILE))
+    parser_bench.add_argument('--threshold', type=float, default=THRESHOLD, metavar='PERCENT',
+                              help='Max throughput drop against the baseline. Default: {0}%%'.format(THRESHOLD))
+    parser_bench.add_argument('--repeat', type=int, default=1, metavar='N', help='Run each benchmark N times, and keep the best result')
+    parser_bench.add_argument('--update-baseline', action='store_true', help='Use this run as the new baseline')
+    parser_bench.set_defaults(func=run_benchmark)
+
     # Compile tests
     parser_compile = subparsers.add_parser('compile_tests', help='Compile all the RISC-V tests')
     parser_compile.set_defaults(func=compile_tests)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Angel Terrones (<angelterrones@gmail.com>)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import itertools
+import json
+import multiprocessing
+import os
+from myhdl import Error
+from Simulation.core.testbench import core_cycle_testbench
+from Simulation.core.testbench import read_config
+
+# Keys of algol.ini explored by the sweep: (section, key). All the keys that change the timing
+# of the core are part of a configuration (and its name).
+SWEEP_KEYS   = [('ICache', 'Enable'),
+                ('ICache', 'BlockWidth'),
+                ('ICache', 'SetWidth'),
+                ('ICache', 'Ways'),
+                ('ICache', 'Replacement'),
+                ('ICache', 'Pipelined'),
+                ('DCache', 'Enable'),
+                ('DCache', 'BlockWidth'),
+                ('DCache', 'SetWidth'),
+                ('DCache', 'Ways'),
+                ('DCache', 'Replacement'),
+                ('DCache', 'Pipelined'),
+                ('BranchPredictor', 'Enable'),
+                ('BranchPredictor', 'BTBWidth'),
+                ('BranchPredictor', 'History'),
+                ('BranchPredictor', 'HistoryWidth'),
+                ('BranchPredictor', 'RASDepth')]
+GEOMETRY     = ['BlockWidth', 'SetWidth', 'Ways', 'Replacement', 'Pipelined']
+PREDICTOR    = ['BTBWidth', 'History', 'HistoryWidth', 'RASDepth']
+SECTIONS     = {'ICache': GEOMETRY, 'DCache': GEOMETRY, 'BranchPredictor': PREDICTOR}
+BOOLEAN_KEYS = ['Enable', 'Pipelined']
+UPPER_KEYS   = ['Replacement', 'History']
+BOOLEANS     = {'yes': 'yes', 'true': 'yes', 'on': 'yes', '1': 'yes', 'no': 'no', 'false': 'no', 'off': 'no', '0': 'no'}
+LINE_WIDTH   = 80
+
+
+def yes_no(value):
+    """
+    Normalize a boolean value of the configuration file: 'yes' or 'no'.
+    """
+    assert str(value).lower() in BOOLEANS, "Invalid boolean value: {0}".format(value)
+    return BOOLEANS[str(value).lower()]
+
+
+def _value(key, value):
+    """
+    Normalize a value of the configuration file: booleans, and names in upper case.
+    """
+    return yes_no(value) if key in BOOLEAN_KEYS else str(value).upper() if key in UPPER_KEYS else str(value)
+
+
+def configurations(ranges):
+    """
+    Cartesian product of the values of each key. The geometry of a disabled
+    cache, and the parameters of a disabled branch predictor, are not explored:
+    they keep the values of algol.ini.
+
+    :param ranges: {(section, key): list of values}. Missing keys: the value of algol.ini
+    :returns:      List of configurations ({(section, key): value}), without duplicates
+    """
+    default = read_config()
+    values  = []
+    for section, key in SWEEP_KEYS:
+        items = ranges.get((section, key)) or [default.get(section, key)]
+        values.append([_value(key, item) for item in items])
+
+    configs = []
+    for product in itertools.product(*values):
+        config = dict(zip(SWEEP_KEYS, product))
+        for section, keys in SECTIONS.items():
+            if config[(section, 'Enable')] == 'no':
+                config.update(((section, key), _value(key, default.get(section, key))) for key in keys)
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def config_name(config):
+    """
+    Short name of a configuration (the key of the results file): enable, BlockWidth, SetWidth
+    and Ways of each cache, the replacement policy if it is not LRU, and 'P' for the pipelined
+    mode. Then, enable, BTBWidth, History, HistoryWidth and RASDepth of the branch predictor.
+    """
+    names = []
+    for section, prefix in (('ICache', 'IC'), ('DCache', 'DC')):
+        if config[(section, 'Enable')] == 'no':
+            names.append('{0}=off'.format(prefix))
+        else:
+            policy    = '' if config[(section, 'Replacement')] == 'LRU' else '/' + config[(section, 'Replacement')]
+            pipelined = '/P' if config[(section, 'Pipelined')] == 'yes' else ''
+            names.append('{0}={1}{2}{3}'.format(prefix, '/'.join(config[(section, key)] for key in GEOMETRY[:3]), policy, pipelined))
+    if config[('BranchPredictor', 'Enable')] == 'no':
+        names.append('BP=off')
+    else:
+        names.append('BP={0}'.format('/'.join(config[('BranchPredictor', key)] for key in PREDICTOR)))
+    return ' '.join(names)
+
+
+def _run_job(job):
+    """
+    Worker: execute a workload with a configuration, in a fresh process (the
+    MyHDL simulator keeps global state).
+    """
+    name, config, hex_file = job
+    parser = read_config()
+    for (section, key), value in config.items():
+        parser.set(section, key, value)
+    stats  = {}
+    result = dict(outcome='passed', message='')
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            core_cycle_testbench(hex_file, config=parser, stats=stats)
+        except Error as error:
+            result.update(outcome='failed', message=str(error))
+        except Exception as error:
+            result.update(outcome='error', message='{0}: {1}'.format(type(error).__name__, error))
+    result.update(stats)
+    return name, hex_file, result
+
+
+def _load_results(results_file):
+    try:
+        with open(results_file) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_results(results, results_file):
+    """
+    Write the results to a temporary file, and rename it: an interrupted sweep
+    does not leave a truncated file.
+    """
+    with open(results_file + '.tmp', 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.rename(results_file + '.tmp', results_file)
+
+
+def _ratio(numerator, denominator):
+    return float(numerator) / denominator if denominator else None
+
+
+def summary(configs, hex_files, results):
+    """
+    Table of results, one line per configuration: passed workloads, cycles to the
+    write to toHost, retired instructions, CPI, and the miss rates of the caches
+    (totals of the passed workloads).
+    """
+    width = max([len('Configuration')] + [len(config_name(config)) for config in configs])
+    lines = ['{0:<{w}} {1:>7} {2:>10} {3:>10} {4:>7} {5:>8} {6:>8}'.format('Configuration', 'Passed', 'Cycles', 'Instret',
+                                                                           'CPI', 'I$ miss', 'D$ miss', w=width)]
+    for config in configs:
+        name    = config_name(config)
+        passed  = [results[name][hex_file] for hex_file in hex_files
+                   if results.get(name, {}).get(hex_file, {}).get('outcome') == 'passed']
+        total   = dict((field, sum(result[field] for result in passed))
+                       for field in ('cycles', 'instret', 'ic_hit', 'ic_miss', 'dc_hit', 'dc_miss'))
+        cpi     = _ratio(total['cycles'], total['instret'])
+        ic_rate = _ratio(total['ic_miss'], total['ic_hit'] + total['ic_miss'])
+        dc_rate = _ratio(total['dc_miss'], total['dc_hit'] + total['dc_miss'])
+        lines.append('{0:<{w}} {1:>7} {2:10d} {3:10d} {4:>7} {5:>8} {6:>8}'.format(
+            name, '{0}/{1}'.format(len(passed), len(hex_files)), total['cycles'], total['instret'],
+            '-' if cpi is None else '{0:.3f}'.format(cpi),
+            '-' if ic_rate is None else '{0:.2f}%'.format(100 * ic_rate),
+            '-' if dc_rate is None else '{0:.2f}%'.format(100 * dc_rate), w=width))
+    return '\n'.join(lines)
+
+
+def run_sweep(ranges, hex_files, n_jobs, results_file):
+    """
+    Design-space exploration: execute each workload with each configuration of the
+    caches, in a pool of processes (cycle-based engine).
+
+    The results are saved after each run, and the runs already in the results file
+    are not executed again: an interrupted sweep can be resumed.
+
+    :param ranges:       {(section, key): list of values} (see configurations)
+    :param hex_files:    Workloads
+    :param n_jobs:       Number of worker processes
+    :param results_file: JSON file: {configuration name: {hex_file: result}}
+    :returns:            The table of results
+    """
+    assert n_jobs > 0, "Invalid number of jobs: {0}".format(n_jobs)
+    assert hex_files, "No workloads"
+    configs = configurations(ranges)
+    results = _load_results(results_file)
+    jobs    = [(config_name(config), config, hex_file) for config in configs for hex_file in hex_files
+               if hex_file not in results.get(config_name(config), {})]
+
+    print(' design-space exploration ({0} workers) '.format(n_jobs).center(LINE_WIDTH, '='))
+    print('{0} configurations x {1} workloads: {2} runs, {3} pending\n'.format(len(configs), len(hex_files),
+                                                                               len(configs) * len(hex_files), len(jobs)))
+    if jobs:
+        pool = multiprocessing.Pool(n_jobs, maxtasksperchild=1)
+        try:
+            for done, (name, hex_file, result) in enumerate(pool.imap_unordered(_run_job, jobs), 1):
+                results.setdefault(name, {})[hex_file] = result
+                _save_results(results, results_file)
+                cycles = ' (Cycles: {0})'.format(result['cycles']) if 'cycles' in result else ''
+                print('{0} {1} {2}{3} [{4:3d}%]'.format(name, hex_file, result['outcome'].upper(), cycles,
+                                                        100 * done // len(jobs)))
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    table = summary(configs, hex_files, results)
+    print('\n' + table)
+    return table
+
+# Local Variables:
+# flycheck-flake8-maximum-line-length: 120
+# flycheck-flake8rc: ".flake8rc"
+# End: